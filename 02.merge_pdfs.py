@@ -1,89 +1,98 @@
 # --- PDF MerGING SCRIPT ---
 # This script lists all PDFs in a specified Google Drive folder,
-# sorts them by the *leading number* in the filename in ascending order, and merges them.
+# sorts them by the *leading number* in the filename in ascending order, validates them
+# in parallel and merges them one file at a time (memory does not grow with the corpus).
 
-from pypdf import PdfWriter, PdfReader
 import pandas as pd
-import glob
 import os
-import re # <-- New import for numerical sorting
+import sys
 from IPython.display import display, HTML
 
+from pdf_extraction import MERGED_PDF_FILENAME, list_source_pdfs
+from pdf_merge import MERGE_MANIFEST_FILENAME, merge_pdfs, validate_pdfs, write_merge_manifest
+
 # ----------------------------------------------------
 # ⚠ USER INPUT REQUIRED: Set the path to your PDFs
 # ----------------------------------------------------
 # Example: '/content/drive/MyDrive/MyProject/Reports'
-PDF_FOLDER_PATH = '/content/drive/MyDrive/Deep Learning/pdf_files'
+PDF_FOLDER_PATH = os.environ.get('PDF_FOLDER_PATH', '/content/drive/MyDrive/Deep Learning/pdf_files')
 # Update the above path to the actual folder in your Drive if different!
 # ----------------------------------------------------
 
-MERGED_PDF_FILENAME = "merged_document_for_analysis.pdf"
 MERGED_PDF_FULLPATH = os.path.join(PDF_FOLDER_PATH, MERGED_PDF_FILENAME)
-
-# --- Custom Sorting Function for Numerical Order ---
-def numerical_sort_key(filepath):
-    """
-    Extracts the leading number from the filename for correct numerical sorting.
-    e.g., "110.pdf" -> 110, "3.pdf" -> 3
-    """
-    filename = os.path.basename(filepath)
-    # Match one or more digits at the start of the filename
-    match = re.match(r'(\d+)', filename)
-    if match:
-        # Convert the matched string (e.g., "10") to an integer (10)
-        return int(match.group(1))
-    # For files without a leading number, push them to the end of the list
-    return float('inf')
+MERGE_MANIFEST_FULLPATH = os.path.join(PDF_FOLDER_PATH, MERGE_MANIFEST_FILENAME)
+# 'pdf' writes the merged PDF, 'manifest' only a manifest of the files and their page ranges
+# (step 1 then extracts the listed files directly), 'both' writes both
+MERGE_OUTPUT = os.environ.get('MERGE_OUTPUT', 'pdf')
+# Worker processes for validating the PDFs (defaults to all cores)
+MERGE_WORKERS = int(os.environ.get('MERGE_WORKERS', os.cpu_count() or 1))
 
 # --- Merging Logic ---
-
-print("--- Starting PDF Merging Process ---")
-
-# 1. List all PDF files in the specified folder
-all_files = glob.glob(os.path.join(PDF_FOLDER_PATH, "*.pdf"))
-
-# 2. Filter out the final merged file if it exists, and get file paths
-pdf_list_paths = [f for f in all_files if os.path.basename(f) != MERGED_PDF_FILENAME]
-
-# 3. Sort files using the custom numerical key
-pdf_list_paths.sort(key=numerical_sort_key)
-
-if not pdf_list_paths:
-    print(f"❌ Error: No individual PDF files found in the directory: {PDF_FOLDER_PATH}")
-    if not os.path.exists(PDF_FOLDER_PATH):
-        print("Tip: The folder path itself does not exist. Check for typos.")
-else:
-    print(f"--- Found {len(pdf_list_paths)} PDF files to merge in folder: {PDF_FOLDER_PATH} ---")
-
-    # Display the order that will be used for merging
-    print("Files will be merged in this *numerical ascending* order:")
-    file_selection_df = pd.DataFrame({
-        'Index': range(1, len(pdf_list_paths) + 1),
-        'Filename': [os.path.basename(f) for f in pdf_list_paths]
-    })
-    display(HTML(file_selection_df.to_html(index=False)))
-
-    # 4. Perform Merging
-    merger = PdfWriter()
-    print(f"\nStarting merge into: {MERGED_PDF_FILENAME}")
-
-    for pdf_path in pdf_list_paths:
-        try:
-            merger.append(pdf_path)
-            print(f"  - Appended: {os.path.basename(pdf_path)}")
-        except Exception as e:
-            print(f"  - ⚠ Warning: Could not append {os.path.basename(pdf_path)}. Skipping. Error: {e}")
-
-    # 5. Write the merged PDF
-    with open(MERGED_PDF_FULLPATH, "wb") as fout:
-        merger.write(fout)
-    merger.close()
-
-    print(f"\n✅ Merging complete. New file saved to: {MERGED_PDF_FULLPATH}")
-    print("------------------------------------------------------------------")
-    print("Now run the 'pdf_analyzer.py' script for theme extraction and summarization.")
-
-# Store the path for the next script to use
-# This variable needs to be accessible globally for the next cell
-global MERGED_FILE_FOR_ANALYSIS
-MERGED_FILE_FOR_ANALYSIS = MERGED_PDF_FULLPATH
+# (Guarded so the validation worker processes can import this file safely)
+if __name__ == "__main__":
+    print("--- Starting PDF Merging Process ---")
+
+    if MERGE_OUTPUT not in ('pdf', 'manifest', 'both'):
+        print(f"❌ Error: Unknown MERGE_OUTPUT '{MERGE_OUTPUT}' (expected 'pdf', 'manifest' or 'both').")
+        sys.exit(1)
+
+    # 1.-3. List all PDF files in the specified folder (without the merged file), in numerical order
+    pdf_list_paths = list_source_pdfs(PDF_FOLDER_PATH)
+
+    if not pdf_list_paths:
+        print(f"❌ Error: No individual PDF files found in the directory: {PDF_FOLDER_PATH}")
+        if not os.path.exists(PDF_FOLDER_PATH):
+            print("Tip: The folder path itself does not exist. Check for typos.")
+        sys.exit(1)
+    else:
+        print(f"--- Found {len(pdf_list_paths)} PDF files to merge in folder: {PDF_FOLDER_PATH} ---")
+
+        # Display the order that will be used for merging
+        print("Files will be merged in this *numerical ascending* order:")
+        file_selection_df = pd.DataFrame({
+            'Index': range(1, len(pdf_list_paths) + 1),
+            'Filename': [os.path.basename(f) for f in pdf_list_paths]
+        })
+        display(HTML(file_selection_df.to_html(index=False)))
+
+        # 4. Validate every PDF up front (in parallel), so damaged files are reported before merging
+        print(f"\nValidating {len(pdf_list_paths)} PDFs with {MERGE_WORKERS} workers...")
+        results = validate_pdfs(pdf_list_paths, MERGE_WORKERS)
+        skipped = [result for result in results if result['error']]
+        for result in skipped:
+            print(f"  - ⚠ Warning: Could not read {os.path.basename(result['path'])}. Skipping. Error: {result['error']}")
+        valid_paths = [result['path'] for result in results if not result['error']]
+        page_counts = [result['pages'] for result in results if not result['error']]
+        if not valid_paths:
+            print("❌ Error: None of the PDF files could be read.")
+            sys.exit(1)
+
+        # 5. Perform Merging, one source PDF at a time straight into the output file
+        if MERGE_OUTPUT in ('pdf', 'both'):
+            print(f"\nStarting merge into: {MERGED_PDF_FILENAME}")
+            try:
+                results = merge_pdfs(
+                    valid_paths, MERGED_PDF_FULLPATH,
+                    lambda pdf_path, pages: print(f"  - Appended: {os.path.basename(pdf_path)} ({pages} pages)"),
+                    lambda pdf_path, error: print(f"  - ⚠ Warning: Could not append {os.path.basename(pdf_path)}. "
+                                                  f"Skipping. Error: {error}")
+                )
+            except ValueError as e:
+                print(f"❌ Error: Merging failed: {e}.")
+                sys.exit(1)
+            # Files that passed validation but failed while being copied are skipped too
+            skipped.extend(result for result in results if result['error'])
+            valid_paths = [result['path'] for result in results if not result['error']]
+            page_counts = [result['pages'] for result in results if not result['error']]
+            print(f"\n✅ Merging complete. New file saved to: {MERGED_PDF_FULLPATH}")
+
+        # 6. Write the manifest (file -> page range in the merged document)
+        if MERGE_OUTPUT in ('manifest', 'both'):
+            write_merge_manifest(MERGE_MANIFEST_FULLPATH, valid_paths, page_counts,
+                                 MERGED_PDF_FILENAME if MERGE_OUTPUT == 'both' else None, skipped)
+            print(f"✅ Manifest of {len(valid_paths)} files ({sum(page_counts):,} pages) saved to: {MERGE_MANIFEST_FULLPATH}")
+        elif os.path.exists(MERGE_MANIFEST_FULLPATH):
+            # A manifest from an earlier manifest-only run would make step 1 skip the new merged PDF
+            os.remove(MERGE_MANIFEST_FULLPATH)
+        print("------------------------------------------------------------------")
+        print("Now run the 'pdf_analyzer.py' script for theme extraction and summarization.")
@@ -1,60 +1,170 @@
 #!/usr/bin/env python3
 """
-STEP 1/3: Extracts text content and calculates metrics from the merged PDF.
-Saves the results to 'analysis_data_step1.pkl'.
+STEP 1/3: Extracts text content and calculates metrics from the source PDFs.
+Streams the extracted pages to the page store 'artifacts/step1/pages.jsonl'
+and saves the metrics to 'artifacts/step1/metadata.json'.
+
+Two extraction modes are available (set EXTRACTION_MODE below):
+  - 'folder' (default): parses each PDF in PDF_FOLDER_PATH directly across a
+    process pool. '02.merge_pdfs.py' does not need to be run first. Unchanged
+    PDFs are served from the content-hash cache in EXTRACTION_CACHE.
+  - 'merged': parses the single merged PDF written by '02.merge_pdfs.py'.
+
+In 'folder' mode every PDF is extracted in a supervised worker process with
+a per-file timeout and memory limit (see extraction_workers.py); every page
+runs under a per-page timeout with fallback across EXTRACTION_ENGINES (see
+pdf_engines.py). PDFs and pages that could not be extracted are listed in
+'artifacts/step1/quarantine.json' instead of failing or stalling the run.
 """
-from pypdf import PdfReader
 import os
-import pickle
+import sys
 import datetime
 
+from artifacts import PAGES_FILE, step_dir, write_metadata
+from extraction_cache import EXTRACTION_CACHE_DIR, EXTRACTOR_VERSION, ExtractionCache
+from extraction_workers import (FILE_TIMEOUT_S, FILES_PER_WORKER, PAGE_TIMEOUT_S, QUARANTINE_FILENAME,
+                                WORKER_MEMORY_MB, QuarantineReport)
+from metrics import finish_step, stage, start_step
+from page_store import write_page_store
+from pdf_extraction import MERGED_PDF_FILENAME, iter_folder_pages, iter_pdf_pages, list_source_pdfs
+from pdf_engines import DEFAULT_ENGINES, available_engines, parse_engines
+from pdf_merge import MERGE_MANIFEST_FILENAME, read_merge_manifest
+
 # --- Global Configuration ---
-# ⚠️ Adjust this path if your merged PDF is located elsewhere!
-PDF_FOLDER_PATH = '/content/drive/MyDrive/Deep Learning/pdf_files'
-MERGED_PDF_FILENAME = "merged_document_for_analysis.pdf"
+# ⚠️ Adjust this path if your PDFs are located elsewhere!
+PDF_FOLDER_PATH = os.environ.get('PDF_FOLDER_PATH', '/content/drive/MyDrive/Deep Learning/pdf_files')
 MERGED_PDF_FULLPATH = os.path.join(PDF_FOLDER_PATH, MERGED_PDF_FILENAME)
-# --- Output File ---
-OUTPUT_DATA_FILE = 'analysis_data_step1.pkl'
-
-print("\n--- Starting Text Extraction (STEP 1/3) ---")
-
-raw_text = ""
-total_pages = 0
-word_count = 0
-char_count = 0
-
-try:
-    # 1. Extract text from the merged PDF
-    with open(MERGED_PDF_FULLPATH, "rb") as f:
-        reader = PdfReader(f)
-        total_pages = len(reader.pages)
-        for page in reader.pages:
-            page_text = page.extract_text()
-            if page_text:
-                raw_text += page_text + " "
-
-    raw_text = raw_text.replace('\n', ' ')
-    char_count = len(raw_text)
-    word_count = len(raw_text.split())
-
-    print(f"✅ Text extracted successfully from {total_pages:,} pages.")
-    print(f"   Total estimated words: {word_count:,}")
-
-    # 2. Save the extracted data
-    analysis_data = {
-        'raw_text': raw_text,
-        'total_pages': total_pages,
-        'word_count': word_count,
-        'char_count': char_count,
-        'timestamp': datetime.datetime.now().strftime("%B %d, %Y at %H:%M %p")
-    }
-
-    with open(OUTPUT_DATA_FILE, 'wb') as f:
-        pickle.dump(analysis_data, f)
-
-    print(f"✅ Data saved successfully to '{OUTPUT_DATA_FILE}' for the next step.")
-
-except FileNotFoundError:
-    print(f"❌ File not found at {MERGED_PDF_FULLPATH}. Ensure the path is correct and the file exists.")
-except Exception as e:
-    print(f"❌ Error during text extraction: {e}")
+MERGE_MANIFEST_FULLPATH = os.path.join(PDF_FOLDER_PATH, MERGE_MANIFEST_FILENAME)
+# 'folder' reads the source PDFs in parallel, 'merged' reads the merged PDF
+# (or, after a manifest-only merge, the files listed in the manifest, in parallel)
+EXTRACTION_MODE = os.environ.get('EXTRACTION_MODE', 'folder')
+# Number of worker processes for 'folder' mode (defaults to all cores)
+EXTRACTION_WORKERS = int(os.environ.get('EXTRACTION_WORKERS', os.cpu_count() or 1))
+# Per-PDF extraction cache for 'folder' mode; set to '' to always re-extract everything
+EXTRACTION_CACHE = os.environ.get('EXTRACTION_CACHE', EXTRACTION_CACHE_DIR)
+# Clean the page text and drop reference/acknowledgement sections ('0' keeps the raw text)
+TEXT_NORMALIZATION = os.environ.get('TEXT_NORMALIZATION', '1') == '1'
+# Text extraction engines in fallback order, e.g. 'pymupdf,pypdf' (pymupdf needs 'pip install pymupdf');
+# engines that are not installed are skipped
+EXTRACTION_ENGINES = available_engines(parse_engines(os.environ.get('EXTRACTION_ENGINES', ','.join(DEFAULT_ENGINES))))
+# Seconds per page before the next engine is tried, and per PDF before its worker is killed ('0' = no limit)
+EXTRACTION_PAGE_TIMEOUT = float(os.environ.get('EXTRACTION_PAGE_TIMEOUT', PAGE_TIMEOUT_S))
+EXTRACTION_FILE_TIMEOUT = float(os.environ.get('EXTRACTION_FILE_TIMEOUT', FILE_TIMEOUT_S))
+# Address-space limit per worker process in MB ('0' = no limit), and PDFs per worker before it is replaced
+EXTRACTION_WORKER_MEMORY_MB = int(os.environ.get('EXTRACTION_WORKER_MEMORY_MB', WORKER_MEMORY_MB))
+EXTRACTION_FILES_PER_WORKER = int(os.environ.get('EXTRACTION_FILES_PER_WORKER', FILES_PER_WORKER))
+# Raw and normalized extractions (and those of other engines) are cached side by side (see extraction_cache.py)
+CACHE_VERSION = EXTRACTOR_VERSION if TEXT_NORMALIZATION else f"{EXTRACTOR_VERSION}-raw"
+if EXTRACTION_ENGINES != DEFAULT_ENGINES:
+    CACHE_VERSION = f"{CACHE_VERSION}-{'+'.join(EXTRACTION_ENGINES)}"
+# --- Output Files ---
+OUTPUT_DIR = step_dir('step1')
+OUTPUT_PAGE_STORE = os.path.join(OUTPUT_DIR, PAGES_FILE)
+OUTPUT_QUARANTINE = os.path.join(OUTPUT_DIR, QUARANTINE_FILENAME)
+
+# --- Main Extraction ---
+# (Guarded so the worker processes can import this file safely)
+if __name__ == "__main__":
+    print("\n--- Starting Text Extraction (STEP 1/3) ---")
+    start_step('step1')
+
+    total_pages = 0
+    word_count = 0
+    char_count = 0
+
+    try:
+        # 1. Stream text from the PDFs straight into the page store
+        page_counter = {'total': 0}
+        cache = None
+        quarantine = QuarantineReport()
+        failed_pages = None
+        limits = {
+            'page_timeout': EXTRACTION_PAGE_TIMEOUT,
+            'file_timeout': EXTRACTION_FILE_TIMEOUT,
+            'memory_mb': EXTRACTION_WORKER_MEMORY_MB,
+            'files_per_worker': EXTRACTION_FILES_PER_WORKER,
+        }
+        manifest = None
+        if EXTRACTION_MODE == 'merged' and os.path.exists(MERGE_MANIFEST_FULLPATH):
+            manifest = read_merge_manifest(MERGE_MANIFEST_FULLPATH)
+        if EXTRACTION_MODE == 'folder':
+            pdf_paths = list_source_pdfs(PDF_FOLDER_PATH)
+            if not pdf_paths:
+                raise FileNotFoundError(PDF_FOLDER_PATH)
+            print(f"Extracting {len(pdf_paths)} PDFs from '{PDF_FOLDER_PATH}' with {EXTRACTION_WORKERS} workers "
+                  f"({', '.join(EXTRACTION_ENGINES)})...")
+            source_description = f"{len(pdf_paths)} source PDFs"
+            if EXTRACTION_CACHE:
+                cache = ExtractionCache(EXTRACTION_CACHE, CACHE_VERSION)
+            records = iter_folder_pages(pdf_paths, EXTRACTION_WORKERS, page_counter, cache, TEXT_NORMALIZATION,
+                                        EXTRACTION_ENGINES, limits, quarantine)
+        elif EXTRACTION_MODE == 'merged' and manifest is not None and manifest['merged_pdf'] is None:
+            pdf_paths = [os.path.join(PDF_FOLDER_PATH, entry['file']) for entry in manifest['files']]
+            print(f"Extracting the {len(pdf_paths)} PDFs listed in '{MERGE_MANIFEST_FILENAME}' with {EXTRACTION_WORKERS} workers...")
+            source_description = f"{len(pdf_paths)} PDFs from {MERGE_MANIFEST_FILENAME}"
+            if EXTRACTION_CACHE:
+                cache = ExtractionCache(EXTRACTION_CACHE, CACHE_VERSION)
+            records = iter_folder_pages(pdf_paths, EXTRACTION_WORKERS, page_counter, cache, TEXT_NORMALIZATION,
+                                        EXTRACTION_ENGINES, limits, quarantine)
+        elif EXTRACTION_MODE == 'merged':
+            # One large document in this process: pages still time out and fall back across the
+            # engines, but there is no worker to kill if a native parser call never returns
+            source_description = MERGED_PDF_FILENAME
+            failed_pages = []
+            # Reference sections must not run on into the next paper: with a manifest (MERGE_OUTPUT=both)
+            # normalization restarts at every paper's first page, without one at every page
+            document_starts = set() if manifest is None else {entry['first_page'] for entry in manifest['files']}
+            records = iter_pdf_pages(MERGED_PDF_FULLPATH, page_counter, TEXT_NORMALIZATION, EXTRACTION_ENGINES,
+                                     EXTRACTION_PAGE_TIMEOUT, failed_pages, document_starts)
+        else:
+            raise ValueError(f"Unknown EXTRACTION_MODE '{EXTRACTION_MODE}' (expected 'folder' or 'merged').")
+
+        with stage('extract') as record:
+            pages_with_text, word_count, char_count = write_page_store(records, OUTPUT_PAGE_STORE)
+            total_pages = page_counter['total']
+            record['items'] = total_pages
+
+        if failed_pages:
+            quarantine.add_pages(MERGED_PDF_FILENAME, failed_pages)
+        quarantine.write(OUTPUT_QUARANTINE)
+        if quarantine.files or quarantine.pages:
+            print(f"⚠ {len(quarantine.files)} PDFs and {len(quarantine.pages)} pages could not be extracted; "
+                  f"see '{OUTPUT_QUARANTINE}'.")
+
+        if cache is not None:
+            evicted = cache.evict_except(cache.seen_keys)
+            print(f"   Cache: {cache.hits} PDFs reused, {cache.misses} extracted, {evicted} stale entries evicted.")
+
+        print(f"✅ Text extracted successfully from {total_pages:,} pages ({pages_with_text:,} with text).")
+        print(f"   Total estimated words: {word_count:,}")
+        print(f"✅ Pages streamed to '{OUTPUT_PAGE_STORE}'.")
+
+        # 2. Save the extraction metrics (the text itself lives in the page store)
+        analysis_data = {
+            'page_store': PAGES_FILE,
+            'source_description': source_description,
+            'total_pages': total_pages,
+            'word_count': word_count,
+            'char_count': char_count,
+            'text_normalization': TEXT_NORMALIZATION,
+            'extraction_engines': list(EXTRACTION_ENGINES),
+            'quarantined_files': len(quarantine.files),
+            'failed_pages': len(quarantine.pages),
+            'timestamp': datetime.datetime.now().strftime("%B %d, %Y at %H:%M %p")
+        }
+
+        metadata_path = write_metadata(OUTPUT_DIR, analysis_data)
+
+        print(f"✅ Data saved successfully to '{metadata_path}' for the next step.")
+
+    except FileNotFoundError:
+        if EXTRACTION_MODE == 'folder':
+            print(f"❌ No PDF files found in {PDF_FOLDER_PATH}. Ensure the path is correct.")
+        else:
+            print(f"❌ File not found at {MERGED_PDF_FULLPATH}. Ensure the path is correct and the file exists.")
+        sys.exit(1)
+    except Exception as e:
+        print(f"❌ Error during text extraction: {e}")
+        sys.exit(1)
+    finally:
+        finish_step()
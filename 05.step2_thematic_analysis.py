@@ -1,115 +1,473 @@
 #!/usr/bin/env python3
 """
-STEP 2/3: Loads extracted text, performs BERTopic neural topic modeling,
-and saves the thematic analysis results to 'analysis_data_step2.pkl'.
+STEP 2/3: Streams the extracted pages, performs BERTopic neural topic modeling,
+and saves the thematic analysis results to 'artifacts/step2/'
+(metadata.json, sentences.parquet, embeddings.npy, paper_topics.npz and the
+evidence index, see evidence_index.py).
 """
-import pickle
-import nltk
-from nltk.tokenize import sent_tokenize
 import os
+import shutil
+import sys
 import datetime
+import numpy as np
 
-# Try to import necessary libraries, installing them if missing
-try:
-    from bertopic import BERTopic
-    from sentence_transformers import SentenceTransformer
-    from sklearn.feature_extraction.text import CountVectorizer
-except ImportError:
-    print("Installing required libraries (bertopic, sentence-transformers, sklearn)...")
-    !pip install bertopic sentence-transformers umap-learn hdbscan
-    from bertopic import BERTopic
-    from sentence_transformers import SentenceTransformer
-    from sklearn.feature_extraction.text import CountVectorizer
-
-# --- Input/Output Files ---
-INPUT_DATA_FILE = 'analysis_data_step1.pkl'
-OUTPUT_DATA_FILE = 'analysis_data_step2.pkl'
-
-print("\n--- Starting Thematic Analysis (STEP 2/3) ---")
-
-# 1. Load data from Step 1
-try:
-    with open(INPUT_DATA_FILE, 'rb') as f:
-        data = pickle.load(f)
-        raw_text = data['raw_text']
-        metadata = data
-    print(f"✅ Extracted data loaded successfully from '{INPUT_DATA_FILE}'.")
-except FileNotFoundError:
-    print(f"❌ Input file '{INPUT_DATA_FILE}' not found. Please run '01_extraction.py' first.")
-    exit()
-except Exception as e:
-    print(f"❌ Error loading data: {e}")
-    exit()
-
-if not raw_text or not raw_text.strip():
-    print("❌ Cannot proceed to theme analysis. Extracted content is empty.")
-    exit()
-
-# --- FIX: Download all required NLTK resources to prevent LookupError ---
-print("Attempting to download required NLTK tokenizers...")
-try:
-    nltk.download('punkt', quiet=True)
-    print("✅ NLTK dependencies installed/verified.")
-except Exception as e:
-    print(f"❌ NLTK download failed: {e}. Cannot proceed with analysis.")
-    exit()
-
-# A. Sentence Tokenization
-sentences = [s.strip() for s in sent_tokenize(raw_text) if len(s.strip()) > 30]
-
-if not sentences:
-    print("\n❌ ERROR: Could not find any meaningful sentences in the text (too short or poorly formatted).")
-    exit()
-
-print(f"Total sentences for modeling: {len(sentences):,}")
-
-# B. BERTopic Theme Extraction
-print("\nInitiating BERTopic Model training (this may take a few minutes for large documents)...")
-vectorizer_model = CountVectorizer(stop_words="english")
-embedding_model = SentenceTransformer("all-MiniLM-L6-v2")
-
-topic_model = BERTopic(
-    embedding_model=embedding_model,
-    vectorizer_model=vectorizer_model,
-    min_topic_size=15,
-    n_gram_range=(1, 2),
-    verbose=False
-)
-
-# Fit model to sentences
-topics, _ = topic_model.fit_transform(sentences)
-topic_info = topic_model.get_topic_info()
-
-# C. Extractive Summarization (for Executive Summary)
-summary_sentences = []
-# Try to grab representative docs from the top 3 NON-OUTLIER topics
-top_topics = topic_info[topic_info['Topic'] != -1]['Topic'].head(3)
-
-if not top_topics.empty:
-    for topic_id in top_topics:
-        rep_docs = topic_model.get_representative_docs(topic_id)
-        summary_sentences.extend(rep_docs[:2])
-
-    executive_summary = " ".join(summary_sentences)
-else:
-    executive_summary = "The analysis could not identify distinct, strong themes to generate a comprehensive extractive summary. The document appears to lack clear, repeating thematic structures, or the content is highly varied."
-
-print("\n" + "="*80)
-print("✅ THEME EXTRACTION COMPLETE - Results Summary:")
-print(f"Identified {len(topic_info) - 1} distinct themes.")
-print(f"Top Theme: {topic_info.iloc[0]['Name']} (Count: {topic_info.iloc[0]['Count']})")
-print("="*80)
-
-# 3. Save the full analysis data for the report
-report_data = {
-    'executive_summary': executive_summary,
-    'topic_info': topic_info,
-    'sentences_analyzed': len(sentences),
-    # Merge metadata from step 1
-    **metadata
-}
-
-with open(OUTPUT_DATA_FILE, 'wb') as f:
-    pickle.dump(report_data, f)
-
-print(f"✅ Analysis results saved successfully to '{OUTPUT_DATA_FILE}' for the final report.")
+from artifacts import (EMBEDDINGS_FILE, PAPER_TOPICS_FILE, SENTENCES_FILE, ArtifactVersionError, read_array,
+                       read_metadata, step_dir, write_array_batches, write_metadata, write_sparse, write_table_batches)
+from dedup import BOILERPLATE_MIN_PAGES, NEAR_DUPLICATE_THRESHOLD, deduplicate_sentences
+from embeddings import (EMBEDDING_CACHE_DIR, EmbeddingCache, cache_model_name, compare_topic_assignments,
+                        load_embedding_backend, make_length_bucketed_encoder, sentence_keys)
+from evidence_index import EVIDENCE_INDEX_DIR, build_evidence_index
+from large_corpus import (ctfidf_keywords, iter_batches, plan_large_corpus, stratified_sample, topic_term_counts,
+                          transform_in_batches)
+from metrics import finish_step, instrument, stage, start_step
+from segmentation import segment_page_store
+from topic_engines import (TOPIC_ENGINES, UMAP_N_COMPONENTS, UMAP_N_NEIGHBORS, engine_models,
+                           engine_stage_names)
+from topic_modeling import (TOPIC_STATE_DIR, fold_in_new_sentences, known_topics_of, load_topic_state,
+                            save_topic_state, topic_info_records)
+from topic_quality import topic_quality
+from topic_stats import (document_topic_matrix, topic_cooccurrence, topic_ids, topic_prevalence,
+                         top_cooccurring_pairs)
+
+# --- Input/Output Artifacts ---
+INPUT_DIR = step_dir('step1', create=False)
+OUTPUT_DIR = step_dir('step2')
+
+# Worker processes for sentence segmentation (defaults to all cores)
+SEGMENTATION_WORKERS = int(os.environ.get('SEGMENTATION_WORKERS', os.cpu_count() or 1))
+
+# Collapse duplicate/near-duplicate sentences and drop boilerplate before embedding ('0' disables)
+DEDUPLICATE = os.environ.get('DEDUPLICATE', '1') == '1'
+BOILERPLATE_PAGES = int(os.environ.get('BOILERPLATE_MIN_PAGES', BOILERPLATE_MIN_PAGES))
+NEAR_DUPLICATE_SIMILARITY = float(os.environ.get('NEAR_DUPLICATE_THRESHOLD', NEAR_DUPLICATE_THRESHOLD))
+
+# --- Embedding Configuration ---
+EMBEDDING_MODEL_NAME = "all-MiniLM-L6-v2"
+# Sentence embeddings are cached here and reused across runs
+EMBEDDING_CACHE = os.environ.get('EMBEDDING_CACHE', EMBEDDING_CACHE_DIR)
+# 'float16' halves the cache size at a negligible cost in precision
+EMBEDDING_CACHE_DTYPE = os.environ.get('EMBEDDING_CACHE_DTYPE', 'float32')
+# Sentences per cache write; each one is embedded in length-sorted model batches
+EMBEDDING_BATCH_SIZE = int(os.environ.get('EMBEDDING_BATCH_SIZE', 1024))
+EMBEDDING_MODEL_BATCH_SIZE = int(os.environ.get('EMBEDDING_MODEL_BATCH_SIZE', 64))
+# CPU backend: 'torch' (fp32 baseline), 'torch-int8', 'onnx' or 'onnx-int8'
+EMBEDDING_BACKEND = os.environ.get('EMBEDDING_BACKEND', 'torch')
+# Intra-op threads for the embedding backend (0 = library default)
+EMBEDDING_THREADS = int(os.environ.get('EMBEDDING_THREADS', 0))
+# Set to 1 to compare topic assignments of a non-fp32 backend against the fp32 baseline
+EMBEDDING_BACKEND_CHECK = os.environ.get('EMBEDDING_BACKEND_CHECK', '0') == '1'
+EMBEDDING_BACKEND_CHECK_SAMPLE = int(os.environ.get('EMBEDDING_BACKEND_CHECK_SAMPLE', 2000))
+
+# --- Topic Model Configuration ---
+# (sweep_topics.py compares settings on the step 2 embeddings without rerunning this step)
+MIN_TOPIC_SIZE = int(os.environ.get('MIN_TOPIC_SIZE', 15))
+N_GRAM_RANGE = tuple(int(n) for n in os.environ.get('N_GRAM_RANGE', '1,2').split(','))
+# Keyword vectorizer (see topic_vocabulary.py): 'count', 'hashing' (bounded memory) or 'auto'
+# (hashing in large-corpus mode); the vocabulary keeps terms found in at least VOCAB_MIN_DF topics
+# and at most VOCAB_MAX_FEATURES terms by frequency (0 = no limit)
+TOPIC_VECTORIZER = os.environ.get('TOPIC_VECTORIZER', 'auto')
+TOPIC_VECTORIZERS = ('auto', 'count', 'hashing')
+VOCAB_MIN_DF = int(os.environ.get('VOCAB_MIN_DF', 1))
+VOCAB_MAX_FEATURES = int(os.environ.get('VOCAB_MAX_FEATURES', 100000))
+UMAP_NEIGHBORS = int(os.environ.get('UMAP_N_NEIGHBORS', UMAP_N_NEIGHBORS))
+UMAP_COMPONENTS = int(os.environ.get('UMAP_N_COMPONENTS', UMAP_N_COMPONENTS))
+# Clustering engine (see topic_engines.py): 'umap-hdbscan' for final reports, 'fast' for quick refreshes
+TOPIC_ENGINE = os.environ.get('TOPIC_ENGINE', 'umap-hdbscan')
+# Number of topics for the 'fast' engine (0 = derived from the sentence count)
+FAST_ENGINE_TOPICS = int(os.environ.get('FAST_ENGINE_TOPICS', 0))
+# 'incremental' folds new sentences into the saved model, 'full' always refits from scratch
+TOPIC_UPDATE_MODE = os.environ.get('TOPIC_UPDATE_MODE', 'incremental')
+TOPIC_STATE = os.environ.get('TOPIC_STATE', TOPIC_STATE_DIR)
+# Minimum cosine similarity for a new sentence to join an existing topic
+INCREMENTAL_MIN_SIMILARITY = float(os.environ.get('INCREMENTAL_MIN_SIMILARITY', 0.5))
+# Minimum cosine similarity between topic embeddings for a topic found among the new sentences
+# to be merged into an existing topic rather than added (BERTopic.merge_models' default)
+TOPIC_MERGE_MIN_SIMILARITY = float(os.environ.get('TOPIC_MERGE_MIN_SIMILARITY', 0.7))
+# Refit from scratch once this share of the corpus did not fit the topics of the last full fit
+DRIFT_THRESHOLD = float(os.environ.get('DRIFT_THRESHOLD', 0.2))
+
+# Build the keyword + vector evidence index over the sentences for the report ('0' disables)
+EVIDENCE_INDEX = os.environ.get('EVIDENCE_INDEX', '1') == '1'
+
+# --- Large-Corpus Mode (see large_corpus.py) ---
+# 'full' fits on every sentence, 'sample' fits on a stratified sample and assigns the rest in batches,
+# 'auto' samples only when a full fit would exceed the memory budget
+TOPIC_FIT_MODE = os.environ.get('TOPIC_FIT_MODE', 'auto')
+TOPIC_FIT_MODES = ('auto', 'full', 'sample')
+TOPIC_MEMORY_BUDGET_MB = int(os.environ.get('TOPIC_MEMORY_BUDGET_MB', 4096))
+# Sentences in the fit sample (0 = as many as the memory budget allows)
+TOPIC_FIT_SAMPLE_SIZE = int(os.environ.get('TOPIC_FIT_SAMPLE_SIZE', 0))
+
+
+def import_topic_libraries():
+    """
+    Imports BERTopic and the keyword vectorizers (scikit-learn). This pulls in
+    torch, UMAP and HDBSCAN and takes seconds, so it only happens once step 2 actually runs.
+    """
+    # (in Colab: !pip install bertopic sentence-transformers umap-learn hdbscan)
+    try:
+        from bertopic import BERTopic
+        from topic_vocabulary import make_vectorizer
+    except ImportError as e:
+        raise ImportError(
+            f"{e}. Install the analysis libraries with 'pip install bertopic sentence-transformers umap-learn hdbscan'."
+        ) from e
+    return BERTopic, make_vectorizer
+
+
+def main():
+    print("\n--- Starting Thematic Analysis (STEP 2/3) ---")
+    start_step('step2')
+
+    if TOPIC_FIT_MODE not in TOPIC_FIT_MODES:
+        print(f"❌ Unknown TOPIC_FIT_MODE '{TOPIC_FIT_MODE}' (expected one of {', '.join(TOPIC_FIT_MODES)}).")
+        sys.exit(1)
+    if TOPIC_ENGINE not in TOPIC_ENGINES:
+        print(f"❌ Unknown TOPIC_ENGINE '{TOPIC_ENGINE}' (expected one of {', '.join(TOPIC_ENGINES)}).")
+        sys.exit(1)
+    if TOPIC_VECTORIZER not in TOPIC_VECTORIZERS:
+        print(f"❌ Unknown TOPIC_VECTORIZER '{TOPIC_VECTORIZER}' (expected one of {', '.join(TOPIC_VECTORIZERS)}).")
+        sys.exit(1)
+
+    # 1. Load data from Step 1
+    try:
+        metadata = read_metadata(INPUT_DIR)
+        print(f"✅ Extracted data loaded successfully from '{INPUT_DIR}'.")
+    except FileNotFoundError:
+        print(f"❌ Step 1 artifacts not found in '{INPUT_DIR}'. Please run '04.step1_extract_text.py' first.")
+        sys.exit(1)
+    except ArtifactVersionError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    except Exception as e:
+        print(f"❌ Error loading data: {e}")
+        sys.exit(1)
+
+    page_store_path = os.path.join(INPUT_DIR, metadata['page_store'])
+    if not os.path.exists(page_store_path):
+        print(f"❌ Page store '{page_store_path}' not found. Please re-run step 1.")
+        sys.exit(1)
+
+    BERTopic, make_vectorizer = import_topic_libraries()
+
+    # --- FIX: Download all required NLTK resources to prevent LookupError ---
+    print("Attempting to download required NLTK tokenizers...")
+    import nltk
+    try:
+        nltk.download('punkt', quiet=True)
+        nltk.download('punkt_tab', quiet=True)
+        print("✅ NLTK dependencies installed/verified.")
+    except Exception as e:
+        print(f"❌ NLTK download failed: {e}. Cannot proceed with analysis.")
+        sys.exit(1)
+
+    # A. Sentence Tokenization (pages segmented in parallel; sentence texts kept in a file, not in memory)
+    sentences_path = os.path.join(OUTPUT_DIR, 'sentences.partial.bin')
+    with stage('segment') as record:
+        sentences = segment_page_store(page_store_path, sentences_path, SEGMENTATION_WORKERS)
+        record['items'] = len(sentences)
+
+    if not sentences:
+        print("\n❌ ERROR: Could not find any meaningful sentences in the text (too short or poorly formatted).")
+        sys.exit(1)
+
+    # Cache and topic-state keys of all sentences (16 bytes each)
+    with stage('sentence_keys', items=len(sentences)):
+        keys = sentence_keys(sentences)
+
+    # A2. Duplicate and boilerplate elimination (kept sentences carry multiplicity weights)
+    dedup_stats = None
+    if DEDUPLICATE:
+        with stage('dedup', items=len(sentences)):
+            keep_rows, sentence_weights, dedup_stats = deduplicate_sentences(
+                sentences, sentences.doc_ids.astype(np.int64) << 32 | sentences.pages,
+                BOILERPLATE_PAGES, NEAR_DUPLICATE_SIMILARITY, keys
+            )
+        sentences = sentences.subset(keep_rows)
+        keys = keys[keep_rows]
+        print(f"Deduplication: {dedup_stats['exact_duplicates_removed']:,} exact duplicates, "
+              f"{dedup_stats['near_duplicates_removed']:,} near-duplicates and "
+              f"{dedup_stats['boilerplate_sentences_removed']:,} boilerplate sentences removed.")
+    else:
+        sentence_weights = np.ones(len(sentences), dtype=np.int64)
+
+    print(f"Total sentences for modeling: {len(sentences):,}")
+
+    # B. BERTopic Theme Extraction
+    print("\nInitiating BERTopic Model training (this may take a few minutes for large documents)...")
+    with stage('load_embedding_model'):
+        embedding_model = load_embedding_backend(EMBEDDING_MODEL_NAME, EMBEDDING_BACKEND, EMBEDDING_THREADS or None)
+    print(f"Embedding backend: {EMBEDDING_BACKEND} ({EMBEDDING_THREADS or 'default'} threads)")
+
+    # Embed only the sentences that are not in the on-disk cache yet
+    embedding_cache = EmbeddingCache(cache_model_name(EMBEDDING_MODEL_NAME, EMBEDDING_BACKEND),
+                                     EMBEDDING_CACHE, EMBEDDING_CACHE_DTYPE)
+    with stage('embed') as record:
+        embedding_rows = embedding_cache.rows_for(
+            sentences,
+            make_length_bucketed_encoder(embedding_model, EMBEDDING_MODEL_BATCH_SIZE),
+            EMBEDDING_BATCH_SIZE,
+            keys
+        )
+        record['items'] = embedding_cache.misses
+    print(f"✅ Embeddings ready: {embedding_cache.hits:,} reused from cache, {embedding_cache.misses:,} newly embedded.")
+
+    sample_size, batch_size = plan_large_corpus(len(sentences), embedding_cache.dim, TOPIC_MEMORY_BUDGET_MB,
+                                                TOPIC_FIT_SAMPLE_SIZE)
+    large_corpus = TOPIC_FIT_MODE == 'sample' or (TOPIC_FIT_MODE == 'auto' and sample_size < len(sentences))
+    vectorizer = TOPIC_VECTORIZER if TOPIC_VECTORIZER != 'auto' else ('hashing' if large_corpus else 'count')
+
+    # Row-aligned sentence embeddings, copied from the cache a batch at a time and read back
+    # memory-mapped, so only the rows a stage touches are in memory. The file only replaces
+    # the previous run's embeddings.npy once all artifacts are written.
+    embeddings_path = os.path.join(OUTPUT_DIR, 'embeddings.partial.npy')
+    with stage('write_embeddings', items=len(sentences)):
+        cache_matrix = embedding_cache.matrix
+        write_array_batches(embeddings_path, (len(sentences), embedding_cache.dim), np.float32,
+                            (cache_matrix[batch] for batch in iter_batches(embedding_rows, batch_size)))
+    embeddings = read_array(embeddings_path)
+
+    def build_topic_model(n_sentences):
+        """Creates an unfitted BERTopic model with the step 2 configuration for a fit on 'n_sentences'."""
+        topic_model = BERTopic(
+            embedding_model=embedding_model,
+            vectorizer_model=make_vectorizer(vectorizer, n_sentences, N_GRAM_RANGE, VOCAB_MIN_DF, VOCAB_MAX_FEATURES),
+            min_topic_size=MIN_TOPIC_SIZE,
+            verbose=False,
+            **engine_models(TOPIC_ENGINE, n_sentences, MIN_TOPIC_SIZE, FAST_ENGINE_TOPICS, UMAP_NEIGHBORS,
+                            UMAP_COMPONENTS)
+        )
+        # Time BERTopic's internal stages as sub-stages of the fit
+        reducer, clusterer = engine_stage_names(TOPIC_ENGINE)
+        instrument(topic_model.umap_model, 'fit', f'{reducer}_fit')
+        instrument(topic_model.umap_model, 'transform', f'{reducer}_transform')
+        instrument(topic_model.hdbscan_model, 'fit', f'{clusterer}_fit')
+        instrument(topic_model.vectorizer_model, 'fit', 'ctfidf_vectorize')
+        instrument(topic_model.vectorizer_model, 'transform', 'ctfidf_vectorize')
+        instrument(topic_model.ctfidf_model, 'fit', 'ctfidf_weight')
+        instrument(topic_model.ctfidf_model, 'transform', 'ctfidf_weight')
+        return topic_model
+
+    fit_params = {
+        'embedding_model': cache_model_name(EMBEDDING_MODEL_NAME, EMBEDDING_BACKEND),
+        'min_topic_size': MIN_TOPIC_SIZE,
+        'n_gram_range': list(N_GRAM_RANGE),
+        'vectorizer': vectorizer,
+        'vocab_min_df': VOCAB_MIN_DF,
+        'vocab_max_features': VOCAB_MAX_FEATURES,
+        'engine': TOPIC_ENGINE,
+        'umap_n_neighbors': UMAP_NEIGHBORS,
+        'umap_n_components': UMAP_COMPONENTS,
+        'fast_engine_topics': FAST_ENGINE_TOPICS,
+    }
+
+    # BERTopic works on the sentence strings themselves, so they are materialized only from here on
+    # (in large-corpus mode only a sample or a batch of them at a time)
+    documents = None if large_corpus else sentences.texts()
+
+    # Try to update the saved model instead of refitting everything
+    # (a large corpus is always refitted on a fresh sample: folding in would not be memory-bounded)
+    previous_state = None
+    if TOPIC_UPDATE_MODE == 'incremental' and not large_corpus:
+        previous_state = load_topic_state(TOPIC_STATE, embedding_model)
+        if previous_state is not None and previous_state[2]['fit_params'] != fit_params:
+            print("Topic model parameters changed since the saved model; refitting from scratch.")
+            previous_state = None
+
+    if previous_state is not None:
+        topic_model, known_topics, state = previous_state
+        topics, known = known_topics_of(known_topics, keys)
+        new_rows = np.flatnonzero(~known)
+        print(f"Incremental update: {len(new_rows):,} new sentences, {len(sentences) - len(new_rows):,} already modeled.")
+
+        if len(new_rows):
+            with stage('fold_in', items=len(new_rows)):
+                topic_model, new_topics, unmatched = fold_in_new_sentences(
+                    topic_model, [documents[i] for i in new_rows], embeddings[new_rows],
+                    INCREMENTAL_MIN_SIMILARITY, TOPIC_MERGE_MIN_SIMILARITY, MIN_TOPIC_SIZE, build_topic_model
+                )
+            topics[new_rows] = new_topics
+            state['unmatched_since_full_fit'] += unmatched
+
+        drift = state['unmatched_since_full_fit'] / len(sentences)
+        if drift > DRIFT_THRESHOLD:
+            print(f"Topic drift {drift:.1%} exceeds the {DRIFT_THRESHOLD:.0%} threshold; refitting from scratch.")
+            previous_state = None
+        elif len(new_rows) or len(np.unique(keys)) != len(known_topics[0]):
+            # Refresh topic sizes and keywords for the new set of sentences (no re-clustering)
+            with stage('update_topics', items=len(documents)):
+                topic_model.update_topics(documents, topics=topics.tolist(),
+                                          vectorizer_model=make_vectorizer(vectorizer, len(documents), N_GRAM_RANGE,
+                                                                           VOCAB_MIN_DF, VOCAB_MAX_FEATURES))
+        topics = topics.tolist()
+
+    topic_keywords = None
+    if previous_state is None and large_corpus:
+        print(f"Large-corpus mode: fitting on {sample_size:,} of {len(sentences):,} sentences, "
+              f"assigning the rest in batches of {batch_size:,} (budget {TOPIC_MEMORY_BUDGET_MB:,} MB).")
+        topic_model = build_topic_model(sample_size)
+        sample_rows = stratified_sample(sentences.doc_ids, sample_size)
+        with stage('fit_transform', items=len(sample_rows)):
+            sample_topics, _ = topic_model.fit_transform(sentences.texts(sample_rows),
+                                                         embeddings=np.asarray(embeddings[sample_rows]))
+        topics = np.empty(len(sentences), dtype=np.int64)
+        topics[sample_rows] = sample_topics
+        other_rows = np.setdiff1d(np.arange(len(sentences)), sample_rows, assume_unique=True)
+        with stage('transform_batches', items=len(other_rows)):
+            topics[other_rows] = transform_in_batches(topic_model, sentences, embeddings, other_rows, batch_size)
+
+        # Keywords from all sentences, not only the sample: c-TF-IDF over per-topic term counts summed per batch
+        with stage('ctfidf_batches', items=len(sentences)):
+            term_counts = topic_term_counts(topic_model.vectorizer_model, sentences, topics,
+                                            max(topic_model.get_topics()) + 1, batch_size)
+            topic_keywords = ctfidf_keywords(topic_model.ctfidf_model, term_counts,
+                                             topic_model.vectorizer_model.get_feature_names_out())
+        state = {
+            'fit_params': fit_params,
+            'embedding_model': EMBEDDING_MODEL_NAME,
+            'sentences_at_full_fit': len(sentences),
+            'fit_sample_size': len(sample_rows),
+            'unmatched_since_full_fit': 0,
+        }
+    elif previous_state is None:
+        topic_model = build_topic_model(len(documents))
+        # Fit model to sentences, using the precomputed embeddings
+        with stage('fit_transform', items=len(documents)):
+            topics, _ = topic_model.fit_transform(documents, embeddings=np.asarray(embeddings))
+        state = {
+            'fit_params': fit_params,
+            'embedding_model': EMBEDDING_MODEL_NAME,
+            'sentences_at_full_fit': len(sentences),
+            'unmatched_since_full_fit': 0,
+        }
+
+    with stage('save_topic_state'):
+        save_topic_state(TOPIC_STATE, topic_model, keys, topics, state)
+    topic_info = topic_info_records(topic_model.get_topic_info())
+    if topic_keywords:
+        # Same naming scheme as BERTopic: '<topic>_<top 4 keywords>'
+        for row in topic_info:
+            if topic_keywords.get(row['Topic']):
+                row['Representation'] = topic_keywords[row['Topic']]
+                row['Name'] = f"{row['Topic']}_" + '_'.join(topic_keywords[row['Topic']][:4])
+
+    # Paper x topic matrix: topic sizes, per-paper breakdowns and prevalence without rescanning sentences.
+    # Sizes are in original sentences (each kept sentence counts with its multiplicity).
+    with stage('paper_topics', items=len(sentences.doc_names)):
+        paper_topics = document_topic_matrix(sentences.doc_ids, topics, sentence_weights,
+                                             n_docs=len(sentences.doc_names),
+                                             n_topics=max(row['Topic'] for row in topic_info) + 1)
+        topic_sizes = np.asarray(paper_topics.sum(axis=0)).ravel()
+        papers_per_topic, _ = topic_prevalence(paper_topics)
+        related_topics = top_cooccurring_pairs(topic_cooccurrence(paper_topics))
+    for row in topic_info:
+        row['Count'] = int(topic_sizes[row['Topic'] + 1])
+        row['Papers'] = int(papers_per_topic[row['Topic'] + 1])
+    topic_info.sort(key=lambda row: (row['Topic'] != -1, -row['Count']))
+
+    # Quality metrics, to compare engines and settings on the same corpus
+    with stage('topic_quality'):
+        quality = topic_quality(sentences, topic_info, topic_sizes)
+    print(f"Topic quality ({TOPIC_ENGINE}): coherence (NPMI) {quality['coherence_npmi']}, "
+          f"diversity {quality['diversity']}, outlier ratio {quality['outlier_ratio']}")
+
+    # Optional: check that a quantized/ONNX backend assigns topics like the fp32 baseline
+    backend_check = None
+    if EMBEDDING_BACKEND_CHECK and EMBEDDING_BACKEND != 'torch':
+        with stage('backend_check', items=EMBEDDING_BACKEND_CHECK_SAMPLE):
+            print(f"\nComparing '{EMBEDDING_BACKEND}' against the fp32 baseline on {EMBEDDING_BACKEND_CHECK_SAMPLE:,} sentences...")
+            check_rows = np.sort(np.random.default_rng(42).permutation(len(sentences))[:EMBEDDING_BACKEND_CHECK_SAMPLE])
+            sample = sentences.texts(check_rows)
+            baseline_cache = EmbeddingCache(EMBEDDING_MODEL_NAME, EMBEDDING_CACHE, EMBEDDING_CACHE_DTYPE)
+            baseline_embeddings = baseline_cache.embed(
+                sample,
+                make_length_bucketed_encoder(load_embedding_backend(EMBEDDING_MODEL_NAME, 'torch', EMBEDDING_THREADS or None),
+                                             EMBEDDING_MODEL_BATCH_SIZE),
+                EMBEDDING_BATCH_SIZE
+            )
+            # Both sides go through transform() so only the embeddings differ (after an incremental update,
+            # transform() compares with the topic embeddings instead of UMAP/HDBSCAN; see topic_modeling.py)
+            baseline_topics, _ = topic_model.transform(sample, embeddings=baseline_embeddings)
+            candidate_topics, _ = topic_model.transform(sample, embeddings=np.asarray(embeddings[check_rows]))
+            backend_check = compare_topic_assignments(baseline_topics, candidate_topics,
+                                                      baseline_embeddings, embeddings[check_rows])
+            print(f"   Topic agreement: {backend_check['topic_agreement']:.1%} "
+                  f"(ARI {backend_check['adjusted_rand_index']:.3f}, mean cosine {backend_check['mean_cosine']:.4f})")
+            if backend_check['topic_agreement'] < 0.9:
+                print("   ⚠ Warning: fewer than 90% of sentences keep their fp32 topic. Consider the 'torch' backend for final reports.")
+
+    # C. Extractive Summarization (for Executive Summary)
+    summary_sentences = []
+    # Try to grab representative docs from the top 3 NON-OUTLIER topics
+    top_topics = [row['Topic'] for row in topic_info if row['Topic'] != -1][:3]
+
+    if top_topics:
+        for topic_id in top_topics:
+            rep_docs = topic_model.get_representative_docs(topic_id)
+            summary_sentences.extend(rep_docs[:2])
+
+        executive_summary = " ".join(summary_sentences)
+    else:
+        executive_summary = "The analysis could not identify distinct, strong themes to generate a comprehensive extractive summary. The document appears to lack clear, repeating thematic structures, or the content is highly varied."
+
+    print("\n" + "="*80)
+    print("✅ THEME EXTRACTION COMPLETE - Results Summary:")
+    print(f"Identified {len(topic_info) - 1} distinct themes.")
+    print(f"Top Theme: {topic_info[0]['Name']} (Count: {topic_info[0]['Count']})")
+    print("="*80)
+
+    # 3. Save the analysis artifacts for the report
+    topics = np.asarray(topics, dtype=np.int32)
+    # The index is row-aligned with the sentence table, so like embeddings.npy it only replaces
+    # the previous run's index once all artifacts are written
+    evidence_dir = os.path.join(OUTPUT_DIR, EVIDENCE_INDEX_DIR)
+    if EVIDENCE_INDEX:
+        with stage('evidence_index', items=len(sentences)):
+            build_evidence_index(evidence_dir + '.partial', sentences, topics, embeddings, batch_size)
+
+    with stage('save_artifacts', items=len(sentences)):
+        sources = np.asarray(sentences.doc_names, dtype=object)
+        write_table_batches(os.path.join(OUTPUT_DIR, SENTENCES_FILE), ({
+            'sentence': sentences.texts(batch),
+            'source': sources[sentences.doc_ids[batch]],
+            'page': sentences.pages[batch],
+            'weight': sentence_weights[batch],
+            'topic': topics[batch],
+        } for batch in iter_batches(np.arange(len(sentences)), batch_size)))
+        del embeddings
+        os.replace(embeddings_path, os.path.join(OUTPUT_DIR, EMBEDDINGS_FILE))
+        shutil.rmtree(evidence_dir, ignore_errors=True)
+        if EVIDENCE_INDEX:
+            os.replace(evidence_dir + '.partial', evidence_dir)
+        write_sparse(os.path.join(OUTPUT_DIR, PAPER_TOPICS_FILE), paper_topics, sentences.doc_names,
+                     topic_ids(paper_topics))
+
+        # Merge metadata from step 1 (without its own format stamp and page store path)
+        step1_metadata = {key: value for key, value in metadata.items() if key not in ('format_version', 'page_store')}
+        report_data = {
+            **step1_metadata,
+            'executive_summary': executive_summary,
+            'topic_info': topic_info,
+            'sentences_analyzed': len(sentences),
+            'papers': len(sentences.doc_names),
+            'related_topics': [{'topics': [a, b], 'papers': n} for a, b, n in related_topics],
+            'deduplication': dedup_stats,
+            'embedding_model': EMBEDDING_MODEL_NAME,
+            'embedding_backend': EMBEDDING_BACKEND,
+            'embedding_backend_check': backend_check,
+            'topic_engine': TOPIC_ENGINE,
+            'topic_vectorizer': vectorizer,
+            'keyword_vocabulary': len(topic_model.vectorizer_model.vocabulary_),
+            'topic_quality': quality,
+            'analysis_timestamp': datetime.datetime.now().strftime("%B %d, %Y at %H:%M %p"),
+        }
+        write_metadata(OUTPUT_DIR, report_data)
+        os.remove(sentences_path)
+
+    print(f"✅ Analysis results saved successfully to '{OUTPUT_DIR}' for the final report.")
+    finish_step()
+
+
+# (Guarded so the segmentation worker processes can import this file safely)
+if __name__ == "__main__":
+    main()
@@ -1,32 +1,126 @@
 #!/usr/bin/env python3
 """
-STEP 3/3: Loads analysis results and generates the final structured DOCX report.
+STEP 3/3: Loads analysis results and generates the final structured report,
+as a Word document (REPORT_FORMAT=docx, the default) or a standalone HTML page
+(REPORT_FORMAT=html). The corpus-wide report reads the step 2 metadata, the
+paper x topic matrix and the evidence index (for the sentences that support
+each detailed theme, see evidence_index.py); nothing is rescanned.
+python-docx and the notebook helpers are only imported when used, so the
+HTML report starts without them.
 """
-import pickle
-import datetime
-from IPython.display import display, HTML
-from google.colab.files import download as colab_download
-
-# Try to import necessary libraries, installing them if missing
-try:
-    from docx import Document
-    from docx.shared import Pt
-    from docx.enum.text import WD_ALIGN_PARAGRAPH
-except ImportError:
-    print("Installing python-docx...")
-    !pip install python-docx
-    from docx import Document
-    from docx.shared import Pt
-    from docx.enum.text import WD_ALIGN_PARAGRAPH
+import html
+import os
+import sys
+
+from artifacts import PAPER_TOPICS_FILE, ArtifactVersionError, read_metadata, read_sparse, step_dir
+from batch_reports import BATCH_REPORT_DIR, REPORT_SCOPES, generate_batch_reports
+from evidence_index import EvidenceIndex
+from metrics import finish_step, stage, start_step
+from pdf_extraction import numerical_sort_key
+from topic_stats import paper_breakdown
 
 # --- Input/Output Files ---
-INPUT_DATA_FILE = 'analysis_data_step2.pkl'
-REPORT_FILENAME = 'Deep_Learning_Analysis_Report.docx'
+INPUT_DIR = step_dir('step2', create=False)
+# 'docx' or 'html'
+REPORT_FORMAT = os.environ.get('REPORT_FORMAT', 'docx')
+REPORT_FILENAME = f"Deep_Learning_Analysis_Report.{REPORT_FORMAT}"
+# 'corpus' writes the single corpus-wide report; 'sources', 'topics' or 'all'
+# write one DOCX per source paper and/or per topic into REPORT_DIR instead
+REPORT_SCOPE = os.environ.get('REPORT_SCOPE', 'corpus')
+REPORT_DIR = os.environ.get('REPORT_DIR', BATCH_REPORT_DIR)
+# Worker processes for batch reports (defaults to all cores)
+REPORT_WORKERS = int(os.environ.get('REPORT_WORKERS', os.cpu_count() or 1))
+
+METHODOLOGY_NOTES = (
+    "The thematic analysis utilized the **BERTopic** framework. This technique leverages transformer-based embeddings (specifically **all-MiniLM-L6-v2**) to map document segments (sentences) into a semantic space. "
+    "It then uses UMAP for dimensionality reduction and HDBSCAN for clustering to identify dense clusters, which represent the themes. "
+    "The model employs a c-TF-IDF score to determine the most representative words for each cluster (theme). This analysis specifically avoided common stop words to ensure the identified themes focus on the core research substance."
+)
+
+
+# Themes with a detailed breakdown, and the supporting sentences cited for each
+DETAILED_THEMES = 3
+EVIDENCE_PER_THEME = 5
+
+# Papers listed in the per-paper breakdown table (the batch reports cover all of them)
+PAPER_TABLE_ROWS = 100
+PAPER_TABLE_COLUMNS = ['Paper', 'Sentences', 'Themes', 'Dominant Theme', 'Share']
+
+
+def load_paper_breakdown(step2_dir, topic_info):
+    """
+    Per-paper theme breakdown table rows, read from the paper x topic matrix
+    (no sentence is scanned). Returns None for artifacts written without it.
+    """
+    path = os.path.join(step2_dir, PAPER_TOPICS_FILE)
+    if not os.path.exists(path):
+        return None
+    matrix, sources, _ = read_sparse(path)
+    names = {row['Topic']: row['Name'].title() for row in topic_info}
+    records = sorted(paper_breakdown(matrix, sources), key=lambda record: numerical_sort_key(record['source']))
+    return [
+        [record['source'], f"{record['sentences']:,}", str(record['topics']),
+         names.get(record['dominant_topic'], '-') if record['dominant_topic'] != -1 else '-',
+         f"{record['dominant_share']:.0%}"]
+        for record in records if record['sentences']
+    ]
+
+
+def load_theme_evidence(step2_dir, topic_info):
+    """
+    The strongest supporting sentences of each detailed theme, looked up in
+    the evidence index: {topic: hits}. Returns None for artifacts written
+    without it, and (with a warning) for an index that does not match them;
+    the report then lists BERTopic's representative sentences instead.
+    """
+    themes = [row for row in topic_info if row['Topic'] != -1][:DETAILED_THEMES]
+    try:
+        index = EvidenceIndex(step2_dir)
+        return {row['Topic']: index.topic_evidence(row['Topic'], row['Representation'], EVIDENCE_PER_THEME)
+                for row in themes}
+    except FileNotFoundError:
+        return None
+    except (ArtifactVersionError, ValueError, KeyError, IndexError) as e:
+        print(f"⚠ Warning: The evidence index could not be used ({type(e).__name__}: {e}); "
+              "the report cites representative sentences instead. Re-run '05.step2_thematic_analysis.py' to rebuild it.")
+        return None
+
+
+def theme_narrative(row, evidence):
+    """
+    Narrative for a theme from its keywords and size; 'evidence' are its hits in the evidence index (or None).
+    """
+    keywords = ", ".join(row['Representation'])
+    papers = f" across **{row['Papers']:,}** papers" if row.get('Papers') else ''
+    narrative = (f"This theme is characterized by the key terms '{keywords}'. "
+                 f"It covers **{row['Count']:,}** sentences{papers}.")
+    if evidence:
+        return narrative + (" The sentences below support it most strongly, ranked by keyword relevance (BM25) "
+                            "and closeness to the centre of the theme, with the paper and page they come from.")
+    return narrative + " Representative sentences selected by BERTopic are listed below."
+
+
+def theme_evidence_lines(row, evidence):
+    """
+    Bullet points for a theme: cited evidence, or BERTopic's representative documents without an index.
+    """
+    if evidence:
+        return [f"\u201c{hit['sentence']}\u201d ({hit['paper']}, p. {hit['page']})" for hit in evidence]
+    return [f"\u201c{doc}\u201d" for doc in row.get('Representative_Docs') or []]
+
 
 def create_word_report(data):
     """
     Creates a detailed Word document (.docx) based on the thematic analysis results.
     """
+    # (in Colab: !pip install python-docx)
+    try:
+        from docx import Document
+        from docx.shared import Pt
+        from docx.enum.text import WD_ALIGN_PARAGRAPH
+    except ImportError as e:
+        raise ImportError(f"{e}. Install python-docx with 'pip install python-docx'.") from e
+
     print(f"\n[Report Generator] Attempting to generate '{REPORT_FILENAME}'...")
 
     # Unpack data
@@ -36,6 +130,7 @@ def create_word_report(data):
     word_count = data['word_count']
     sentences_analyzed = data['sentences_analyzed']
     generated_timestamp = data['timestamp']
+    source_description = data.get('source_description', 'merged_document_for_analysis.pdf')
 
     doc = Document()
 
@@ -58,7 +153,7 @@ def create_word_report(data):
     doc.add_heading('Analysis Details', level=2)
 
     p = doc.add_paragraph()
-    p.add_run('Source Document: ').bold = True; p.add_run('merged_document_for_analysis.pdf\n')
+    p.add_run('Source Document: ').bold = True; p.add_run(f'{source_description}\n')
     p.add_run('Total Pages in Source: ').bold = True; p.add_run(f'{total_pages:,}\n')
     p.add_run('Total Estimated Words: ').bold = True; p.add_run(f'{word_count:,}\n')
     p.add_run('Sentences Analyzed (BERTopic): ').bold = True; p.add_run(f'{sentences_analyzed:,}\n')
@@ -86,13 +181,14 @@ def create_word_report(data):
     doc.add_heading('2. Quantitative and Thematic Evidence', level=1)
 
     # Subtract 1 because BERTopic topic -1 is 'Outlier'
-    distinct_themes = len(topic_info[topic_info['Topic'] != -1])
+    themes = [row for row in topic_info if row['Topic'] != -1]
+    distinct_themes = len(themes)
     doc.add_paragraph(f"The BERTopic analysis identified **{distinct_themes}** distinct, non-outlier themes across the document corpus.")
 
     doc.add_heading('Top 5 Major Themes', level=2)
 
     # Generate the table for the top 5 themes
-    table_data = topic_info[topic_info['Topic'] != -1].head(5)
+    table_data = themes[:5]
 
     table = doc.add_table(rows=1, cols=3)
     table.style = 'Table Grid'
@@ -101,23 +197,16 @@ def create_word_report(data):
     hdr_cells[1].text = 'Count'
     hdr_cells[2].text = 'Keywords & Focus'
 
-    for index, row in table_data.iterrows():
+    for row in table_data:
         cells = table.add_row().cells
         cells[0].text = str(row['Topic'])
         cells[1].text = str(row['Count'])
 
-        # Format theme name and keywords
-        theme_content = doc.add_paragraph()
+        # Theme name in bold, followed by its top keywords
+        theme_content = cells[2].paragraphs[0]
         theme_content.add_run(f"{row['Name'].title()}").bold = True
         theme_content.add_run(f" (Top 3 Keywords: {', '.join(row['Representation'][:3])})")
 
-        # Transfer content to cell[2]
-        for paragraph in theme_content.runs:
-            cell_run = cells[2].add_paragraph().add_run(paragraph.text)
-            cell_run.bold = paragraph.bold
-
-        cells[2].paragraphs[0].clear() # Clear the initial empty paragraph in the cell
-
 
     doc.add_paragraph('\n')
 
@@ -125,61 +214,214 @@ def create_word_report(data):
     doc.add_heading('3. Detailed Thematic Breakdown', level=1)
     doc.add_paragraph("The following sections provide a more detailed narrative for the top three themes extracted, derived from the core keywords and representative documents.")
 
-    top_3_themes = topic_info[topic_info['Topic'] != -1].head(3)
+    top_3_themes = themes[:DETAILED_THEMES]
+    theme_evidence = data.get('theme_evidence') or {}
 
-    for rank, (index, row) in enumerate(top_3_themes.iterrows()):
+    for rank, row in enumerate(top_3_themes):
         topic_id = row['Topic']
         topic_name = row['Name']
-        keywords = ", ".join(row['Representation'])
 
         doc.add_heading(f"A.{rank+1} Theme {topic_id}: {topic_name.title()}", level=2)
+        evidence = theme_evidence.get(topic_id)
+        doc.add_paragraph(theme_narrative(row, evidence))
+        for line in theme_evidence_lines(row, evidence):
+            doc.add_paragraph(line, style='List Bullet')
+
+    # --- SECTION 4: PER-PAPER THEME BREAKDOWN (if available; later sections are numbered on) ---
+    section = 4
+    paper_rows = data.get('paper_breakdown')
+    if paper_rows:
+        doc.add_heading(f'{section}. Per-Paper Theme Breakdown', level=1)
+        section += 1
+        doc.add_paragraph(paper_breakdown_intro(paper_rows))
+        # Created at full size and filled in place (much faster than add_row for long tables)
+        table = doc.add_table(rows=min(len(paper_rows), PAPER_TABLE_ROWS) + 1, cols=len(PAPER_TABLE_COLUMNS))
+        table.style = 'Table Grid'
+        rows = table.rows
+        for cell, text in zip(rows[0].cells, PAPER_TABLE_COLUMNS):
+            cell.text = text
+        for row, values in zip(rows[1:], paper_rows):
+            for cell, text in zip(row.cells, values):
+                cell.text = text
+
+    # --- LAST SECTION: METHODOLOGY NOTES ---
+    doc.add_heading(f'{section}. Methodology Notes', level=1)
+    doc.add_paragraph(METHODOLOGY_NOTES)
 
-        # Placeholder text derived from keywords
-        placeholder_text = (
-            f"This theme is highly focused on **{topic_name}**. The key terms, including "
-            f"'{keywords}', suggest this section of the document primarily addresses "
-            f"the [Describe the core focus - e.g., implementation challenges, evaluation metrics, or ethical considerations] "
-            f"related to this area. The representative documents indicate a critical discussion of [Specific finding/challenge]. "
-            "**Action Required:** Please review the representative sentences in the analysis log to provide a detailed narrative here."
-        )
-        doc.add_paragraph(placeholder_text)
+    # Save the file
+    with stage('docx_save'):
+        doc.save(REPORT_FILENAME)
+    print(f"\n[Report Generator] ✅ Success! Created Word document: {REPORT_FILENAME}")
 
-    # --- SECTION 4: METHODOLOGY NOTES ---
-    doc.add_heading('4. Methodology Notes', level=1)
-    doc.add_paragraph(
-        "The thematic analysis utilized the **BERTopic** framework. This technique leverages transformer-based embeddings (specifically **all-MiniLM-L6-v2**) to map document segments (sentences) into a semantic space. "
-        "It then uses UMAP for dimensionality reduction and HDBSCAN for clustering to identify dense clusters, which represent the themes. "
-        "The model employs a c-TF-IDF score to determine the most representative words for each cluster (theme). This analysis specifically avoided common stop words to ensure the identified themes focus on the core research substance."
+    show_download_instructions("structured Word document")
+
+
+def paper_breakdown_intro(paper_rows):
+    intro = ("Share of each paper's sentences in its dominant theme, and the number of themes that account "
+             "for at least 5% of its sentences.")
+    if len(paper_rows) > PAPER_TABLE_ROWS:
+        intro += f" The first {PAPER_TABLE_ROWS} of {len(paper_rows):,} papers are listed; the per-paper reports cover all of them."
+    return intro
+
+
+def _html_text(text):
+    """
+    Escapes text for HTML and renders the **bold** markers used in the report text.
+    """
+    parts = html.escape(text).split('**')
+    return ''.join(f"<strong>{part}</strong>" if i % 2 else part for i, part in enumerate(parts))
+
+
+def create_html_report(data):
+    """
+    Creates a standalone HTML page with the same sections as the Word report.
+    """
+    print(f"\n[Report Generator] Attempting to generate '{REPORT_FILENAME}'...")
+
+    themes = [row for row in data['topic_info'] if row['Topic'] != -1]
+    source_description = data.get('source_description', 'merged_document_for_analysis.pdf')
+
+    details = [
+        ('Source Document', source_description),
+        ('Total Pages in Source', f"{data['total_pages']:,}"),
+        ('Total Estimated Words', f"{data['word_count']:,}"),
+        ('Sentences Analyzed (BERTopic)', f"{data['sentences_analyzed']:,}"),
+        ('Generated', data['timestamp']),
+        ('Method', 'BERTopic Neural Topic Modeling (all-MiniLM-L6-v2 embeddings)'),
+    ]
+    table_rows = ''.join(
+        f"<tr><td>{row['Topic']}</td><td>{row['Count']}</td>"
+        f"<td><strong>{html.escape(row['Name'].title())}</strong>"
+        f" (Top 3 Keywords: {html.escape(', '.join(row['Representation'][:3]))})</td></tr>"
+        for row in themes[:5]
+    )
+    paper_rows = data.get('paper_breakdown')
+    paper_section = ''
+    section = 4
+    if paper_rows:
+        paper_section = (
+            f"<h2>{section}. Per-Paper Theme Breakdown</h2>\n<p>{html.escape(paper_breakdown_intro(paper_rows))}</p>\n<table>\n"
+            + '<tr>' + ''.join(f"<th>{column}</th>" for column in PAPER_TABLE_COLUMNS) + '</tr>\n'
+            + ''.join('<tr>' + ''.join(f"<td>{html.escape(text)}</td>" for text in values) + '</tr>\n'
+                      for values in paper_rows[:PAPER_TABLE_ROWS])
+            + '</table>\n'
+        )
+        section += 1
+    theme_evidence = data.get('theme_evidence') or {}
+    breakdown = ''.join(
+        f"<h3>A.{rank+1} Theme {row['Topic']}: {html.escape(row['Name'].title())}</h3>"
+        f"<p>{_html_text(theme_narrative(row, theme_evidence.get(row['Topic'])))}</p>"
+        + '<ul>' + ''.join(f"<li>{html.escape(line)}</li>"
+                           for line in theme_evidence_lines(row, theme_evidence.get(row['Topic']))) + '</ul>'
+        for rank, row in enumerate(themes[:DETAILED_THEMES])
     )
 
-    # Save the file
-    doc.save(REPORT_FILENAME)
-    print(f"\n[Report Generator] ✅ Success! Created Word document: {REPORT_FILENAME}")
+    page = f"""<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta charset="utf-8">
+<title>Comprehensive Deep Learning Project Analysis</title>
+<style>
+body {{ font-family: Arial, sans-serif; font-size: 11pt; max-width: 900px; margin: 2em auto; line-height: 1.5; }}
+h1.title {{ text-align: center; }}
+p.subtitle {{ text-align: center; font-style: italic; }}
+table {{ border-collapse: collapse; width: 100%; }}
+th, td {{ border: 1px solid #999; padding: 6px; text-align: left; vertical-align: top; }}
+</style>
+</head>
+<body>
+<h1 class="title">COMPREHENSIVE DEEP LEARNING PROJECT ANALYSIS</h1>
+<p class="subtitle">AI-Generated Thematic and Extractive Summary</p>
+<h2>Analysis Details</h2>
+<p>{'<br>'.join(f"<strong>{label}:</strong> {html.escape(value)}" for label, value in details)}</p>
+<h2>1. Executive Summary</h2>
+<p>This report presents an automated, semantic analysis of the merged Deep Learning project material. The analysis utilized BERTopic to extract themes and representative text, providing a non-biased, data-driven overview of the document's core content.</p>
+<p><strong>Representative Content (Extractive Summary):</strong> {html.escape(data['executive_summary'])}</p>
+<h2>2. Quantitative and Thematic Evidence</h2>
+<p>The BERTopic analysis identified <strong>{len(themes)}</strong> distinct, non-outlier themes across the document corpus.</p>
+<h3>Top 5 Major Themes</h3>
+<table>
+<tr><th>Theme ID</th><th>Count</th><th>Keywords &amp; Focus</th></tr>
+{table_rows}
+</table>
+<h2>3. Detailed Thematic Breakdown</h2>
+<p>The following sections provide a more detailed narrative for the top three themes extracted, derived from the core keywords and representative documents.</p>
+{breakdown}
+{paper_section}<h2>{section}. Methodology Notes</h2>
+<p>{_html_text(METHODOLOGY_NOTES)}</p>
+</body>
+</html>
+"""
+    with stage('html_save'):
+        with open(REPORT_FILENAME, 'w', encoding='utf-8') as f:
+            f.write(page)
+    print(f"\n[Report Generator] ✅ Success! Created HTML report: {REPORT_FILENAME}")
+
+    show_download_instructions("HTML report")
+
+
+def show_download_instructions(description):
+    """
+    In Colab, shows how to download the report; elsewhere just prints its path.
+    """
+    try:
+        import google.colab  # noqa: F401 (only present inside Colab)
+    except ImportError:
+        print(f"   Report written to '{os.path.abspath(REPORT_FILENAME)}'.")
+        return
+    from IPython.display import display, HTML
 
-    # --- Display Download Instructions ---
-    download_command = f"colab_download('{REPORT_FILENAME}')"
+    download_command = f"from google.colab.files import download; download('{REPORT_FILENAME}')"
 
     html_output = f"""
     <div style="padding: 20px; border: 2px solid #3b82f6; border-radius: 8px; background-color: #e0f2fe; margin-top: 20px;">
         <h3 style="color: #1d4ed8; margin-top: 0;">⬇️ Final Report Generated!</h3>
-        <p>Run the code below to download the structured Word document, populated with the BERTopic analysis results.</p>
+        <p>Run the code below to download the {description}, populated with the BERTopic analysis results.</p>
         <pre style="background-color: #dbeafe; padding: 10px; border-radius: 4px; overflow-x: auto;">{download_command}</pre>
     </div>
     """
     display(HTML(html_output))
 
 
+REPORT_WRITERS = {'docx': create_word_report, 'html': create_html_report}
+
+
 # --- Main Report Execution ---
 if __name__ == "__main__":
+    start_step('step3')
     try:
-        # Load data from step 2
-        with open(INPUT_DATA_FILE, 'rb') as f:
-            report_data = pickle.load(f)
-
-        # Proceed to report generation
-        create_word_report(report_data)
+        if REPORT_FORMAT not in REPORT_WRITERS:
+            raise ValueError(f"Unknown REPORT_FORMAT '{REPORT_FORMAT}' (expected 'docx' or 'html').")
+
+        if REPORT_SCOPE in REPORT_SCOPES:
+            if REPORT_FORMAT != 'docx':
+                raise ValueError("Batch reports (REPORT_SCOPE other than 'corpus') are only available as DOCX.")
+            with stage('batch_reports') as record:
+                paths = generate_batch_reports(INPUT_DIR, REPORT_SCOPE, REPORT_DIR, REPORT_WORKERS)
+                record['items'] = len(paths)
+            print(f"\n[Report Generator] ✅ Success! Created {len(paths):,} reports in '{REPORT_DIR}'.")
+        elif REPORT_SCOPE == 'corpus':
+            # Load data from step 2
+            with stage('load'):
+                report_data = read_metadata(INPUT_DIR)
+                report_data['paper_breakdown'] = load_paper_breakdown(INPUT_DIR, report_data['topic_info'])
+            with stage('theme_evidence'):
+                report_data['theme_evidence'] = load_theme_evidence(INPUT_DIR, report_data['topic_info'])
+
+            # Proceed to report generation
+            with stage(REPORT_FORMAT, items=len(report_data['topic_info'])):
+                REPORT_WRITERS[REPORT_FORMAT](report_data)
+        else:
+            raise ValueError(f"Unknown REPORT_SCOPE '{REPORT_SCOPE}' (expected 'corpus', {', '.join(REPORT_SCOPES)}).")
 
     except FileNotFoundError:
-        print(f"❌ Input file '{INPUT_DATA_FILE}' not found. Please ensure you have run '01_extraction.py' and '02_analysis.py' successfully.")
+        print(f"❌ Step 2 artifacts not found in '{INPUT_DIR}'. Please ensure you have run '04.step1_extract_text.py' and '05.step2_thematic_analysis.py' successfully.")
+        sys.exit(1)
+    except ArtifactVersionError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
     except Exception as e:
         print(f"❌ An error occurred during report generation: {e}")
+        sys.exit(1)
+    finally:
+        finish_step()
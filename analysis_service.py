@@ -0,0 +1,733 @@
+#!/usr/bin/env python3
+"""
+Long-running local analysis service.
+
+Every run of step 2 pays for importing the ML libraries, loading the embedding
+model and reading the topic model from disk before it does any work. The
+service does all of that once and keeps the embedding model and the latest
+fitted topic model (the step 2 topic state, reloaded whenever step 2 saves a
+new one) in memory, so analyzing a few new PDFs against the existing themes
+takes seconds instead of minutes.
+
+Requests are queued as jobs and handled by a few concurrent job workers:
+  1. extraction and sentence segmentation run in warm supervised worker
+     processes, one PDF per task (same normalization and segmentation as
+     steps 1 and 2, with step 1's extraction settings). As in step 1 (see
+     extraction_workers.py), a PDF that hangs, exhausts the memory limit or
+     crashes its worker fails on its own and the worker is replaced;
+  2. the sentences of all jobs in flight are embedded together: an embedding
+     batcher collects what concurrent jobs submit and sends it to the model in
+     shared encode calls (one model thread, so the model is never used twice
+     at the same time);
+  3. every sentence is assigned to the nearest existing topic, as in the
+     incremental fold-in of step 2 (no refit).
+A job returns per-document topic assignments, an extractive summary (the
+sentence closest to each main topic) or DOCX reports in the per-paper layout
+of batch_reports.py.
+
+Protocol: one JSON object per line over a Unix socket (or a localhost TCP
+port), one JSON response line per request:
+    {"action": "analyze", "paths": [...], "folder": "...", "uploads": [{"filename": ..., "data": <base64>}],
+     "output": "topics" | "summary" | "report", "wait": true}
+    {"action": "job", "job": <id>}          result of a job submitted with "wait": false
+    {"action": "status"}                     models, queue and batching statistics
+    {"action": "reload"}                     reload the topic state now
+Responses carry "ok" and either the result or an "error".
+
+Usage:
+    python analysis_service.py serve                          # Unix socket <ARTIFACT_DIR>/service.sock
+    python analysis_service.py serve --port 8765              # localhost TCP instead
+    python analysis_service.py analyze new_paper.pdf --output summary
+    python analysis_service.py analyze --folder ./new_pdfs --output report
+    python analysis_service.py analyze paper.pdf --upload     # send the file contents instead of its path
+    python analysis_service.py status
+"""
+import argparse
+import asyncio
+import base64
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import datetime
+import itertools
+import json
+import os
+import re
+import shutil
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+from artifacts import ARTIFACT_DIR, ArtifactVersionError, read_metadata, step_dir
+from embeddings import (EMBEDDING_CACHE_DIR, EmbeddingCache, cache_model_name, load_embedding_backend,
+                        make_length_bucketed_encoder)
+from extraction_workers import (FILE_TIMEOUT_S, FILES_PER_WORKER, PAGE_TIMEOUT_S, WORKER_MEMORY_MB, ExtractionFailed,
+                                SupervisedExecutor)
+from pdf_engines import DEFAULT_ENGINES, available_engines, parse_engines
+from pdf_extraction import extract_pdf_pages, list_source_pdfs
+from segmentation import MIN_SENTENCE_LENGTH, sentence_spans
+from topic_modeling import TOPIC_STATE_DIR, assign_to_nearest_topics, load_topic_state, topic_info_records
+
+# --- Service Configuration ---
+SERVICE_SOCKET = os.environ.get('ANALYSIS_SERVICE_SOCKET', os.path.join(ARTIFACT_DIR, 'service.sock'))
+# Jobs processed at the same time, and jobs waiting beyond that before requests are turned away
+SERVICE_JOB_WORKERS = int(os.environ.get('SERVICE_JOB_WORKERS', 4))
+SERVICE_MAX_QUEUED_JOBS = int(os.environ.get('SERVICE_MAX_QUEUED_JOBS', 64))
+# Worker processes for extraction and segmentation (defaults to all cores)
+SERVICE_EXTRACTION_WORKERS = int(os.environ.get('SERVICE_EXTRACTION_WORKERS', os.cpu_count() or 1))
+# How long the embedding batcher waits for other jobs' sentences, and the most sentences per encode call
+EMBEDDING_BATCH_WINDOW_MS = float(os.environ.get('EMBEDDING_BATCH_WINDOW_MS', 5))
+SERVICE_MAX_EMBEDDING_BATCH = int(os.environ.get('SERVICE_MAX_EMBEDDING_BATCH', 4096))
+SERVICE_REPORT_DIR = os.environ.get('SERVICE_REPORT_DIR', os.path.join(ARTIFACT_DIR, 'service_reports'))
+# Longest a job thread waits for the extraction workers before letting another job submit its PDFs
+EXTRACTION_POLL_S = 0.05
+# Results of finished jobs kept for {"action": "job"} requests
+KEEP_RESULTS = 256
+# Largest request line (uploads are sent inline, base64-encoded)
+MAX_REQUEST_BYTES = 512 * 1024 * 1024
+
+# --- Model Configuration (the same settings as step 2) ---
+EMBEDDING_CACHE = os.environ.get('EMBEDDING_CACHE', EMBEDDING_CACHE_DIR)
+EMBEDDING_CACHE_DTYPE = os.environ.get('EMBEDDING_CACHE_DTYPE', 'float32')
+EMBEDDING_MODEL_BATCH_SIZE = int(os.environ.get('EMBEDDING_MODEL_BATCH_SIZE', 64))
+EMBEDDING_BACKEND = os.environ.get('EMBEDDING_BACKEND', 'torch')
+EMBEDDING_THREADS = int(os.environ.get('EMBEDDING_THREADS', 0))
+TOPIC_STATE = os.environ.get('TOPIC_STATE', TOPIC_STATE_DIR)
+INCREMENTAL_MIN_SIMILARITY = float(os.environ.get('INCREMENTAL_MIN_SIMILARITY', 0.5))
+
+# --- Extraction Configuration (the same settings as step 1) ---
+TEXT_NORMALIZATION = os.environ.get('TEXT_NORMALIZATION', '1') == '1'
+EXTRACTION_ENGINES = available_engines(parse_engines(os.environ.get('EXTRACTION_ENGINES', ','.join(DEFAULT_ENGINES))))
+EXTRACTION_PAGE_TIMEOUT = float(os.environ.get('EXTRACTION_PAGE_TIMEOUT', PAGE_TIMEOUT_S))
+EXTRACTION_FILE_TIMEOUT = float(os.environ.get('EXTRACTION_FILE_TIMEOUT', FILE_TIMEOUT_S))
+EXTRACTION_WORKER_MEMORY_MB = int(os.environ.get('EXTRACTION_WORKER_MEMORY_MB', WORKER_MEMORY_MB))
+EXTRACTION_FILES_PER_WORKER = int(os.environ.get('EXTRACTION_FILES_PER_WORKER', FILES_PER_WORKER))
+
+OUTPUTS = ('topics', 'summary', 'report')
+# Main topics per document in the summary
+SUMMARY_TOPICS = 3
+
+
+def _warm_worker():
+    """
+    Loads the PDF reader and the Punkt model once in a worker process.
+    """
+    import pypdf  # noqa: F401
+    sentence_spans("Loads the tokenizer.")
+
+
+def extract_sentences(pdf_path, normalize, engines, page_timeout):
+    """
+    Extracts, normalizes and segments one PDF. Runs inside the extraction
+    workers (see SupervisedExecutor). Returns (page_count, pages, sentences)
+    with the page number of every sentence in 'pages'.
+    """
+    page_count, records, _ = extract_pdf_pages(pdf_path, normalize, engines, page_timeout)
+    pages, sentences = [], []
+    for record in records:
+        for start, end in sentence_spans(record['text'], MIN_SENTENCE_LENGTH):
+            pages.append(record['page'])
+            sentences.append(record['text'][start:end])
+    return page_count, pages, sentences
+
+
+class EmbeddingBatcher:
+    """
+    Collects the sentences that concurrent jobs submit and embeds them in
+    shared calls of 'embed' (a function of a sentence list) on a single
+    thread. A job's sentences are split into chunks of at most
+    'max_sentences', so one large job never holds up the others for long.
+    """
+
+    def __init__(self, embed, window_s, max_sentences):
+        self._embed = embed
+        self.window_s = window_s
+        self.max_sentences = max_sentences
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='embedding')
+        self._pending = []
+        self._wakeup = asyncio.Event()
+        self.calls = 0
+        self.requests = 0
+        self.sentences = 0
+
+    async def embed(self, sentences):
+        """
+        Embeddings of 'sentences' (float32, one row per sentence).
+        """
+        if not sentences:
+            return np.empty((0, 0), dtype=np.float32)
+        loop = asyncio.get_running_loop()
+        futures = []
+        for start in range(0, len(sentences), self.max_sentences):
+            future = loop.create_future()
+            self._pending.append((sentences[start:start + self.max_sentences], future))
+            futures.append(future)
+        self.requests += 1
+        self._wakeup.set()
+        return np.concatenate(await asyncio.gather(*futures))
+
+    def run_in_model_thread(self, function, *args):
+        """
+        Runs 'function' on the embedding thread, after the calls queued before it.
+        """
+        return asyncio.get_running_loop().run_in_executor(self.executor, function, *args)
+
+    async def run(self):
+        while True:
+            await self._wakeup.wait()
+            # Give the other jobs in flight a moment to submit their sentences too
+            await asyncio.sleep(self.window_s)
+            batch, size = [], 0
+            while self._pending and (not batch or size + len(self._pending[0][0]) <= self.max_sentences):
+                chunk, future = self._pending.pop(0)
+                batch.append((chunk, future))
+                size += len(chunk)
+            if not self._pending:
+                self._wakeup.clear()
+
+            try:
+                vectors = await self.run_in_model_thread(self._embed, [s for chunk, _ in batch for s in chunk])
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            self.calls += 1
+            self.sentences += size
+            offset = 0
+            for chunk, future in batch:
+                if not future.done():
+                    future.set_result(vectors[offset:offset + len(chunk)])
+                offset += len(chunk)
+
+
+class WarmModels:
+    """
+    The embedding model, its cache and the latest saved topic model.
+    Loading and topic assignment run on the embedding thread.
+    """
+
+    def __init__(self):
+        self.embedding_model = None
+        self.topic_model = None
+        self.topic_info = []
+        self.state = None
+        self.state_mtime = None
+        self.load_seconds = None
+
+    def _state_mtime(self):
+        try:
+            return os.stat(os.path.join(TOPIC_STATE, 'state.json')).st_mtime
+        except FileNotFoundError:
+            return None
+
+    def load(self):
+        """
+        Loads the embedding model (once) and the topic state. Raises
+        FileNotFoundError if step 2 has not saved a topic state yet.
+        """
+        start = time.perf_counter()
+        mtime = self._state_mtime()
+        if mtime is None:
+            raise FileNotFoundError(f"No topic model state in '{TOPIC_STATE}'. "
+                                    f"Please run '05.step2_thematic_analysis.py' first.")
+        with open(os.path.join(TOPIC_STATE, 'state.json'), 'r') as f:
+            model_name = json.load(f)['embedding_model']
+
+        if self.embedding_model is None or self.state['embedding_model'] != model_name:
+            self.embedding_model = load_embedding_backend(model_name, EMBEDDING_BACKEND, EMBEDDING_THREADS or None)
+            # A cache of its own: step 2 appends to the shared cache while the service is running,
+            # and EmbeddingCache assumes a single writer
+            self.cache = EmbeddingCache(cache_model_name(model_name, EMBEDDING_BACKEND),
+                                        os.path.join(EMBEDDING_CACHE, 'service'), EMBEDDING_CACHE_DTYPE)
+            self.encode = make_length_bucketed_encoder(self.embedding_model, EMBEDDING_MODEL_BATCH_SIZE)
+
+        topic_model, _, state = load_topic_state(TOPIC_STATE, self.embedding_model)
+        topic_info = topic_info_records(topic_model.get_topic_info())
+        # Step 2 renames topics after keywords computed over the full corpus in large-corpus mode;
+        # its names are used as long as its metadata describes this very set of topics
+        try:
+            step2_topic_info = read_metadata(step_dir('step2', create=False)).get('topic_info') or []
+        except (FileNotFoundError, ArtifactVersionError):
+            step2_topic_info = []
+        if {row['Topic'] for row in step2_topic_info} == {row['Topic'] for row in topic_info}:
+            topic_info = step2_topic_info
+
+        self.topic_model, self.topic_info, self.state, self.state_mtime = topic_model, topic_info, state, mtime
+        self.load_seconds = round(time.perf_counter() - start, 3)
+
+    def reload_if_changed(self):
+        """
+        Reloads the topic state if step 2 has saved a newer one. Returns True if it did.
+        """
+        if self._state_mtime() == self.state_mtime:
+            return False
+        self.load()
+        return True
+
+    def embed(self, sentences):
+        return self.cache.embed(sentences, self.encode, SERVICE_MAX_EMBEDDING_BATCH)
+
+    @staticmethod
+    def assign(topic_model, embeddings):
+        """
+        (topics, similarity to the topic) of every embedding.
+        """
+        return assign_to_nearest_topics(topic_model, embeddings, INCREMENTAL_MIN_SIMILARITY, return_similarity=True)
+
+
+def _safe_filename(name):
+    name = re.sub(r'[^\w.-]+', '_', os.path.basename(name)).strip('_') or 'upload'
+    return name if name.lower().endswith('.pdf') else name + '.pdf'
+
+
+def document_results(documents, topics, similarity, topic_info, output):
+    """
+    Per-document results of a job: its topic mix and, for 'summary' and
+    'report', the sentence closest to each of its main topics.
+    'documents' holds (source, page_count, pages, sentences) per PDF; 'topics'
+    and 'similarity' cover the sentences of all documents in order.
+    """
+    names = {row['Topic']: row['Name'] for row in topic_info}
+    results = []
+    offset = 0
+    for source, page_count, pages, sentences in documents:
+        doc_topics = topics[offset:offset + len(sentences)]
+        doc_similarity = similarity[offset:offset + len(sentences)]
+        offset += len(sentences)
+
+        ids, counts = np.unique(doc_topics, return_counts=True)
+        ranking = [i for i in np.argsort(-counts, kind='stable') if ids[i] != -1]
+        result = {
+            'source': source,
+            'pages': page_count,
+            'sentences': len(sentences),
+            'unassigned_sentences': int(counts[ids == -1].sum()),
+            'dominant_topic': int(ids[ranking[0]]) if ranking else None,
+            'topics': [{'topic': int(ids[i]), 'name': names.get(int(ids[i]), ''), 'sentences': int(counts[i]),
+                        'share': round(float(counts[i]) / len(sentences), 4)} for i in ranking],
+        }
+        if output in ('summary', 'report'):
+            summary = []
+            for i in ranking[:SUMMARY_TOPICS]:
+                rows = np.flatnonzero(doc_topics == ids[i])
+                best = rows[np.argmax(doc_similarity[rows])]
+                summary.append({'topic': int(ids[i]), 'page': pages[best], 'sentence': sentences[best]})
+            result['summary'] = summary
+        results.append(result)
+    return results
+
+
+def render_document_reports(documents, topics, topic_info, output_dir):
+    """
+    Writes one DOCX per document in the per-paper layout of batch_reports.py.
+    Returns the paths.
+    """
+    from batch_reports import render_reports, source_report_specs
+
+    columns = {
+        'sentence': np.array([s for _, _, _, sentences in documents for s in sentences], dtype=object),
+        'source': np.array([source for source, _, _, sentences in documents for _ in sentences], dtype=object),
+        'page': np.array([page for _, _, pages, _ in documents for page in pages], dtype=np.int64),
+        'weight': np.ones(len(topics), dtype=np.int64),
+        'topic': np.asarray(topics),
+    }
+    return render_reports(source_report_specs(columns, topic_info), output_dir, workers=1)
+
+
+class AnalysisService:
+    """
+    The job queue, its workers and the request handler.
+    """
+
+    def __init__(self, models):
+        self.models = models
+        self.job_ids = itertools.count(1)
+        self.jobs = OrderedDict()          # job id -> {'status', 'result'/'error', ...}
+        self.counts = {'submitted': 0, 'done': 0, 'failed': 0, 'rejected': 0}
+        self.started = time.time()
+
+    async def start(self):
+        self.queue = asyncio.Queue(maxsize=SERVICE_MAX_QUEUED_JOBS)
+        self.batcher = EmbeddingBatcher(self.models.embed, EMBEDDING_BATCH_WINDOW_MS / 1000,
+                                        SERVICE_MAX_EMBEDDING_BATCH)
+        # One supervised executor shared by the job threads (it is not thread-safe, hence the lock)
+        self.extraction = SupervisedExecutor(
+            SERVICE_EXTRACTION_WORKERS, TEXT_NORMALIZATION, EXTRACTION_ENGINES, EXTRACTION_PAGE_TIMEOUT,
+            EXTRACTION_FILE_TIMEOUT, EXTRACTION_WORKER_MEMORY_MB, EXTRACTION_FILES_PER_WORKER,
+            function=extract_sentences, initializer=_warm_worker
+        )
+        self.extraction_lock = threading.Lock()
+        self.extraction_threads = ThreadPoolExecutor(max_workers=SERVICE_JOB_WORKERS, thread_name_prefix='extraction')
+        self.extraction.start()
+        self.tasks = [asyncio.create_task(self.batcher.run())]
+        self.tasks.extend(asyncio.create_task(self._job_worker()) for _ in range(SERVICE_JOB_WORKERS))
+
+    async def stop(self):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        with self.extraction_lock:
+            self.extraction.shutdown()
+        self.extraction_threads.shutdown(wait=False)
+        self.batcher.executor.shutdown(wait=False)
+
+    # --- Jobs ---
+
+    def _extract(self, pdf_paths):
+        """
+        Extracts 'pdf_paths' in the supervised workers (on a job thread). Returns
+        the result of extract_sentences, or the ExtractionFailed error, per PDF.
+        """
+        with self.extraction_lock:
+            tasks = [self.extraction.submit(path) for path in pdf_paths]
+        while not all(task.done for task in tasks):
+            # Short polls, so other jobs can submit their PDFs in between
+            with self.extraction_lock:
+                if not all(task.done for task in tasks):
+                    self.extraction.poll(EXTRACTION_POLL_S)
+        return [task.error if task.error is not None else task.value for task in tasks]
+
+    def _resolve_inputs(self, request, upload_dir):
+        """
+        (path, source name) of every PDF a request names, uploads written to 'upload_dir'.
+        """
+        inputs = []
+        for path in request.get('paths') or []:
+            if not os.path.isfile(path):
+                raise ValueError(f"PDF '{path}' not found.")
+            inputs.append((path, os.path.basename(path)))
+        if request.get('folder'):
+            if not os.path.isdir(request['folder']):
+                raise ValueError(f"Folder '{request['folder']}' not found.")
+            inputs.extend((path, os.path.basename(path)) for path in list_source_pdfs(request['folder']))
+        for upload in request.get('uploads') or []:
+            filename = _safe_filename(upload.get('filename') or 'upload.pdf')
+            path = os.path.join(upload_dir, f"{len(inputs)}_{filename}")
+            with open(path, 'wb') as f:
+                f.write(base64.b64decode(upload['data'], validate=True))
+            inputs.append((path, filename))
+        if not inputs:
+            raise ValueError("No PDFs given (expected 'paths', 'folder' or 'uploads').")
+        return inputs
+
+    async def run_job(self, request):
+        output = request.get('output', 'topics')
+        if output not in OUTPUTS:
+            raise ValueError(f"Unknown output '{output}' (expected one of {', '.join(OUTPUTS)}).")
+        loop = asyncio.get_running_loop()
+        timings = {}
+        start = time.perf_counter()
+
+        if await self.batcher.run_in_model_thread(self.models.reload_if_changed):
+            print(f"🔄 Reloaded the topic model saved {self.models.state.get('updated')}.")
+        # The models of this job, even if a newer topic state is loaded while it runs
+        topic_model, topic_info = self.models.topic_model, self.models.topic_info
+
+        upload_dir = tempfile.mkdtemp(prefix='analysis-service-')
+        try:
+            inputs = self._resolve_inputs(request, upload_dir)
+            extracted = await loop.run_in_executor(self.extraction_threads, self._extract,
+                                                   [path for path, _ in inputs])
+        finally:
+            shutil.rmtree(upload_dir, ignore_errors=True)
+        # A damaged PDF (or one that hangs or takes its worker down) is reported, the others are still analyzed
+        documents, errors = [], []
+        for (_, source), document in zip(inputs, extracted):
+            if isinstance(document, ExtractionFailed):
+                errors.append({'source': source, 'reason': document.reason, 'error': str(document)})
+            else:
+                documents.append((source, *document))
+        timings['extract_s'] = round(time.perf_counter() - start, 3)
+
+        sentences = [s for _, _, _, doc_sentences in documents for s in doc_sentences]
+        mark = time.perf_counter()
+        embeddings = await self.batcher.embed(sentences)
+        timings['embed_s'] = round(time.perf_counter() - mark, 3)
+
+        mark = time.perf_counter()
+        if sentences:
+            topics, similarity = await self.batcher.run_in_model_thread(self.models.assign, topic_model, embeddings)
+        else:
+            topics, similarity = np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        timings['assign_s'] = round(time.perf_counter() - mark, 3)
+
+        result = {'documents': document_results(documents, topics, similarity, topic_info, output), 'errors': errors}
+        if output == 'report':
+            mark = time.perf_counter()
+            output_dir = os.path.join(SERVICE_REPORT_DIR, datetime.datetime.now().strftime('%Y%m%dT%H%M%S%f'))
+            documents_with_text = [document for document in documents if document[3]]
+            result['reports'] = await loop.run_in_executor(
+                None, render_document_reports, documents_with_text, topics, topic_info, output_dir)
+            timings['report_s'] = round(time.perf_counter() - mark, 3)
+        timings['total_s'] = round(time.perf_counter() - start, 3)
+        result['timings'] = timings
+        return result
+
+    async def _job_worker(self):
+        while True:
+            job_id, request = await self.queue.get()
+            job = self.jobs[job_id]
+            job['status'] = 'running'
+            job['timings'] = {'queued_s': round(time.time() - job['submitted'], 3)}
+            try:
+                result = await self.run_job(request)
+                result['timings'] = {**job.pop('timings'), **result['timings']}
+                job.update(status='done', result=result)
+                self.counts['done'] += 1
+            except Exception as e:
+                job.update(status='failed', error=f"{type(e).__name__}: {e}")
+                self.counts['failed'] += 1
+            finally:
+                job['finished'].set()
+                self.queue.task_done()
+
+    def submit(self, request):
+        """
+        Queues an analyze request. Returns its job id, or None if the queue is full.
+        """
+        if self.queue.full():
+            self.counts['rejected'] += 1
+            return None
+        job_id = next(self.job_ids)
+        self.jobs[job_id] = {'status': 'queued', 'submitted': time.time(), 'finished': asyncio.Event()}
+        self.queue.put_nowait((job_id, request))
+        self.counts['submitted'] += 1
+        # Forget the oldest finished jobs
+        while len(self.jobs) > KEEP_RESULTS:
+            oldest = next(iter(self.jobs))
+            if not self.jobs[oldest]['finished'].is_set():
+                break
+            del self.jobs[oldest]
+        return job_id
+
+    def job_response(self, job_id):
+        job = self.jobs.get(job_id)
+        if job is None:
+            return {'ok': False, 'error': f"Unknown job {job_id}."}
+        if job['status'] == 'failed':
+            return {'ok': False, 'job': job_id, 'status': 'failed', 'error': job['error']}
+        response = {'ok': True, 'job': job_id, 'status': job['status']}
+        if job['status'] == 'done':
+            response.update(job['result'])
+        return response
+
+    # --- Requests ---
+
+    def status(self):
+        models = self.models
+        batcher = self.batcher
+        return {
+            'ok': True,
+            'uptime_s': round(time.time() - self.started, 1),
+            'embedding_model': models.state['embedding_model'],
+            'embedding_backend': EMBEDDING_BACKEND,
+            'topic_state': TOPIC_STATE,
+            'topic_state_updated': models.state.get('updated'),
+            'topics': sum(1 for row in models.topic_info if row['Topic'] != -1),
+            'model_load_s': models.load_seconds,
+            'jobs': {**self.counts, 'queued': self.queue.qsize()},
+            'extraction_worker_restarts': self.extraction.restarts,
+            'embedding_batches': {
+                'calls': batcher.calls, 'requests': batcher.requests, 'sentences': batcher.sentences,
+                'cache_hits': models.cache.hits, 'cache_misses': models.cache.misses,
+            },
+        }
+
+    async def handle(self, request):
+        action = request.get('action')
+        if action == 'status':
+            return self.status()
+        if action == 'reload':
+            await self.batcher.run_in_model_thread(self.models.load)
+            return {'ok': True, 'topic_state_updated': self.models.state.get('updated')}
+        if action == 'job':
+            job_id = request.get('job')
+            if request.get('wait') and job_id in self.jobs:
+                await self.jobs[job_id]['finished'].wait()
+            return self.job_response(job_id)
+        if action == 'analyze':
+            job_id = self.submit(request)
+            if job_id is None:
+                return {'ok': False, 'error': f"Job queue is full ({SERVICE_MAX_QUEUED_JOBS} jobs waiting)."}
+            if not request.get('wait', True):
+                return {'ok': True, 'job': job_id, 'status': 'queued'}
+            await self.jobs[job_id]['finished'].wait()
+            return self.job_response(job_id)
+        return {'ok': False, 'error': f"Unknown action '{action}'."}
+
+    async def serve_connection(self, reader, writer):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    request = json.loads(line)
+                    if not isinstance(request, dict):
+                        raise ValueError("a request must be a JSON object")
+                except ValueError as e:
+                    response = {'ok': False, 'error': f"Invalid request: {e}"}
+                else:
+                    try:
+                        response = await self.handle(request)
+                    except Exception as e:
+                        # e.g. a reload without a saved topic state: report it instead of dropping the connection
+                        response = {'ok': False, 'error': f"{type(e).__name__}: {e}"}
+                    if 'id' in request:
+                        response['id'] = request['id']
+                writer.write(json.dumps(response, ensure_ascii=False).encode('utf-8') + b'\n')
+                await writer.drain()
+        except (ConnectionError, asyncio.LimitOverrunError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+
+async def serve(socket_path=None, port=None):
+    """
+    Loads the models and serves requests until interrupted.
+    """
+    import nltk
+    nltk.download('punkt', quiet=True)
+    nltk.download('punkt_tab', quiet=True)
+
+    models = WarmModels()
+    print("Loading the embedding model and the topic model...")
+    models.load()
+    service = AnalysisService(models)
+    await service.start()
+    print(f"✅ Models loaded in {models.load_seconds:.1f}s: {models.state['embedding_model']} "
+          f"({EMBEDDING_BACKEND}), {service.status()['topics']} topics from '{TOPIC_STATE}'.")
+
+    if port is not None:
+        server = await asyncio.start_server(service.serve_connection, '127.0.0.1', port, limit=MAX_REQUEST_BYTES)
+        print(f"🚀 Serving on 127.0.0.1:{port}")
+    else:
+        os.makedirs(os.path.dirname(socket_path) or '.', exist_ok=True)
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        server = await asyncio.start_unix_server(service.serve_connection, socket_path, limit=MAX_REQUEST_BYTES)
+        os.chmod(socket_path, 0o600)
+        print(f"🚀 Serving on {socket_path}")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await service.stop()
+        if port is None and os.path.exists(socket_path):
+            os.remove(socket_path)
+
+
+class ServiceClient:
+    """
+    Minimal blocking client: one connection, one JSON line per request.
+    """
+
+    def __init__(self, socket_path=SERVICE_SOCKET, port=None, timeout=None):
+        if port is not None:
+            self.sock = socket.create_connection(('127.0.0.1', port), timeout=timeout)
+        else:
+            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.sock.settimeout(timeout)
+            self.sock.connect(socket_path)
+        self.stream = self.sock.makefile('rb')
+
+    def request(self, action, **params):
+        self.sock.sendall(json.dumps({'action': action, **params}).encode('utf-8') + b'\n')
+        line = self.stream.readline()
+        if not line:
+            raise ConnectionError("The analysis service closed the connection.")
+        return json.loads(line)
+
+    def analyze(self, paths=(), folder=None, output='topics', upload=False, wait=True):
+        params = {'output': output, 'wait': wait}
+        if upload:
+            params['uploads'] = []
+            for path in paths:
+                with open(path, 'rb') as f:
+                    params['uploads'].append({'filename': os.path.basename(path),
+                                              'data': base64.b64encode(f.read()).decode('ascii')})
+        else:
+            params['paths'] = [os.path.abspath(path) for path in paths]
+        if folder:
+            params['folder'] = os.path.abspath(folder)
+        return self.request('analyze', **params)
+
+    def close(self):
+        self.stream.close()
+        self.sock.close()
+
+
+def print_analysis(response):
+    if not response.get('ok'):
+        print(f"❌ {response.get('error')}")
+        return
+    if response.get('status') != 'done':
+        print(f"Job {response['job']}: {response['status']}")
+        return
+    for document in response['documents']:
+        print(f"\n📄 {document['source']}: {document['pages']} pages, {document['sentences']:,} sentences "
+              f"({document['unassigned_sentences']:,} unassigned)")
+        for topic in document['topics'][:5]:
+            print(f"   Theme {topic['topic']:>3}  {topic['share']:>5.0%}  {topic['name']}")
+        for item in document.get('summary', []):
+            print(f"   • (p. {item['page']}, theme {item['topic']}) {item['sentence']}")
+    for error in response.get('errors', []):
+        print(f"⚠️ {error['source']} skipped: {error['error']}")
+    for path in response.get('reports', []):
+        print(f"📝 {path}")
+    print(f"\n⏱️  {', '.join(f'{name} {value}s' for name, value in response['timings'].items())}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local analysis service with warm models.")
+    parser.add_argument('--socket', default=SERVICE_SOCKET, help=f"Unix socket path (default: {SERVICE_SOCKET})")
+    parser.add_argument('--port', type=int, default=None, help="use localhost TCP on this port instead")
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('serve', help="load the models and serve requests")
+    analyze = commands.add_parser('analyze', help="analyze PDFs with a running service")
+    analyze.add_argument('paths', nargs='*', help="PDF files")
+    analyze.add_argument('--folder', default=None, help="analyze every PDF in this folder")
+    analyze.add_argument('--output', choices=OUTPUTS, default='topics')
+    analyze.add_argument('--upload', action='store_true', help="send the PDF contents instead of their paths")
+    analyze.add_argument('--json', action='store_true', help="print the raw JSON response")
+    commands.add_parser('status', help="show the state of a running service")
+    commands.add_parser('reload', help="reload the topic model now")
+    args = parser.parse_args(argv)
+
+    if args.command == 'serve':
+        try:
+            asyncio.run(serve(args.socket, args.port))
+        except FileNotFoundError as e:
+            print(f"❌ {e}")
+            return 1
+        except KeyboardInterrupt:
+            print("\nService stopped.")
+        return 0
+
+    try:
+        client = ServiceClient(args.socket, args.port)
+    except OSError as e:
+        print(f"❌ Cannot reach the analysis service ({e}). Start it with 'python analysis_service.py serve'.")
+        return 1
+    try:
+        if args.command == 'analyze':
+            response = client.analyze(args.paths, args.folder, args.output, args.upload)
+            if args.json:
+                print(json.dumps(response, indent=2, ensure_ascii=False))
+            else:
+                print_analysis(response)
+        else:
+            response = client.request(args.command)
+            print(json.dumps(response, indent=2, ensure_ascii=False))
+    finally:
+        client.close()
+    return 0 if response.get('ok') else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
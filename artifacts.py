@@ -0,0 +1,185 @@
+"""
+Versioned, pickle-free hand-off artifacts between the pipeline steps.
+
+Each step writes into its own directory under ARTIFACT_DIR:
+    artifacts/step1/metadata.json       extraction metrics
+    artifacts/step1/pages.jsonl         page store (see page_store.py)
+    artifacts/step2/metadata.json       summary, topic overview and run details
+    artifacts/step2/sentences.parquet   one row per sentence: text, source, page, topic
+    artifacts/step2/embeddings.npy      sentence embeddings, row-aligned with sentences.parquet
+    artifacts/step2/paper_topics.npz    sparse papers x topics sentence counts (see topic_stats.py)
+
+Metadata is plain JSON, tables are Parquet (read column by column), arrays
+are raw .npy files (memory-mapped on read) and sparse matrices are .npz files
+of their CSR arrays, so a step only pays for what it
+reads and nothing depends on pickle or on library versions.
+pyarrow is only imported when a table is actually read or written.
+"""
+import json
+import os
+
+import numpy as np
+
+ARTIFACT_DIR = os.environ.get('ARTIFACT_DIR', 'artifacts')
+# ⚠️ Bump this whenever the layout or meaning of an artifact changes
+ARTIFACT_FORMAT_VERSION = 1
+
+METADATA_FILE = 'metadata.json'
+PAGES_FILE = 'pages.jsonl'
+SENTENCES_FILE = 'sentences.parquet'
+EMBEDDINGS_FILE = 'embeddings.npy'
+PAPER_TOPICS_FILE = 'paper_topics.npz'
+
+
+class ArtifactVersionError(Exception):
+    """Raised when an artifact was written by an incompatible pipeline version."""
+
+
+def step_dir(step, root=None, create=True):
+    """
+    Returns the artifact directory of a step, e.g. step_dir('step1').
+    Output directories are created; pass create=False for directories that are only read.
+    """
+    path = os.path.join(root or ARTIFACT_DIR, step)
+    if create:
+        os.makedirs(path, exist_ok=True)
+    return path
+
+
+def write_metadata(directory, metadata):
+    """
+    Writes 'metadata' as JSON, stamped with the artifact format version.
+    """
+    path = os.path.join(directory, METADATA_FILE)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({'format_version': ARTIFACT_FORMAT_VERSION, **metadata}, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, path)
+    return path
+
+
+def read_metadata(directory):
+    """
+    Reads a step's metadata, refusing artifacts from another format version.
+    """
+    path = os.path.join(directory, METADATA_FILE)
+    with open(path, 'r', encoding='utf-8') as f:
+        metadata = json.load(f)
+    version = metadata.get('format_version')
+    if version != ARTIFACT_FORMAT_VERSION:
+        raise ArtifactVersionError(
+            f"'{path}' has format version {version}, expected {ARTIFACT_FORMAT_VERSION}. Please re-run the earlier steps."
+        )
+    return metadata
+
+
+def write_table(path, columns):
+    """
+    Writes a dict of equally long columns (lists or NumPy arrays) to Parquet.
+    String columns with few distinct values (e.g. source filenames) are dictionary-encoded.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    table = pa.table({name: pa.array(values) for name, values in columns.items()})
+    tmp_path = path + '.tmp'
+    pq.write_table(table, tmp_path, compression='zstd', use_dictionary=True)
+    os.replace(tmp_path, path)
+    return path
+
+
+def write_table_batches(path, batches):
+    """
+    Writes a Parquet table from an iterable of column dicts (one row group
+    each), so a large table never has to be in memory at once.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    tmp_path = path + '.tmp'
+    writer = None
+    try:
+        for columns in batches:
+            table = pa.table({name: pa.array(values) for name, values in columns.items()})
+            if writer is None:
+                writer = pq.ParquetWriter(tmp_path, table.schema, compression='zstd', use_dictionary=True)
+            writer.write_table(table)
+    finally:
+        if writer is not None:
+            writer.close()
+    if writer is None:
+        raise ValueError(f"No rows to write to '{path}'.")
+    os.replace(tmp_path, path)
+    return path
+
+
+def read_table(path, columns):
+    """
+    Reads only the requested columns of a Parquet table.
+    Returns a dict of column name -> NumPy array (strings come back as object arrays).
+    """
+    import pyarrow.parquet as pq
+
+    table = pq.read_table(path, columns=list(columns))
+    return {name: table.column(name).to_numpy() for name in columns}
+
+
+def write_array(path, array):
+    """
+    Writes a NumPy array as a raw .npy file.
+    """
+    tmp_path = path + '.tmp.npy'
+    np.save(tmp_path, np.ascontiguousarray(array))
+    os.replace(tmp_path, path)
+    return path
+
+
+def write_array_batches(path, shape, dtype, batches):
+    """
+    Writes a .npy array of the given shape from an iterable of consecutive row
+    batches, through a memory map, without holding the whole array in memory.
+    """
+    tmp_path = path + '.tmp.npy'
+    array = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=dtype, shape=shape)
+    row = 0
+    for batch in batches:
+        array[row:row + len(batch)] = batch
+        row += len(batch)
+    if row != shape[0]:
+        raise ValueError(f"Expected {shape[0]} rows for '{path}', got {row}.")
+    array.flush()
+    del array
+    os.replace(tmp_path, path)
+    return path
+
+
+def read_array(path):
+    """
+    Memory-maps a .npy array; rows are only paged in when they are touched.
+    """
+    return np.load(path, mmap_mode='r')
+
+
+def write_sparse(path, matrix, row_labels, column_labels):
+    """
+    Writes a sparse matrix in CSR form together with its row and column labels
+    (plain arrays in an .npz file, no pickled objects).
+    """
+    matrix = matrix.tocsr()
+    tmp_path = path + '.tmp.npz'
+    np.savez(tmp_path, data=matrix.data, indices=matrix.indices, indptr=matrix.indptr,
+             shape=np.array(matrix.shape, dtype=np.int64),
+             row_labels=np.asarray(row_labels, dtype=str), column_labels=np.asarray(column_labels))
+    os.replace(tmp_path, path)
+    return path
+
+
+def read_sparse(path):
+    """
+    Reads a matrix written by write_sparse. Returns (csr_matrix, row_labels, column_labels).
+    """
+    from scipy import sparse
+
+    with np.load(path, allow_pickle=False) as f:
+        matrix = sparse.csr_matrix((f['data'], f['indices'], f['indptr']), shape=tuple(f['shape']))
+        return matrix, f['row_labels'], f['column_labels']
@@ -0,0 +1,355 @@
+"""
+Batch DOCX reports for step 3: one report per source paper and one per topic.
+
+Each report is filled from the step 2 artifacts (the topic overview in
+metadata.json and the sentence table). Report contents are computed up front
+in the parent process as small plain-dict specs and rendered across a process
+pool, a chunk of reports per task.
+
+Rendering does not go through python-docx per report (its style lookups and
+package serialization cost tens of milliseconds a file). Instead python-docx
+builds a template once, holding one prototype of every element a report uses
+(title, headings, bullet, table, ...) with marker text. Workers cut the
+prototypes out of the template's document.xml and fill them with escaped text,
+and every report is a copy of the template package, whose other parts (styles,
+numbering, theme) stay compressed as they are, plus the new document.xml.
+"""
+from concurrent.futures import ProcessPoolExecutor
+import hashlib
+import io
+import json
+import os
+import re
+import zipfile
+from xml.sax.saxutils import escape
+
+import numpy as np
+
+from artifacts import SENTENCES_FILE, read_metadata, read_table
+
+BATCH_REPORT_DIR = 'reports'
+INDEX_FILE = 'index.json'
+REPORT_SCOPES = ('sources', 'topics', 'all')
+# Example sentences shown per topic in a source report
+SENTENCES_PER_TOPIC = 3
+# Rows in the 'topics of this paper' / 'papers of this topic' tables
+TABLE_ROWS = 15
+
+_DOCUMENT_PART = 'word/document.xml'
+# Prototype elements of the template, in body order
+_PROTOTYPES = ('title', 'subtitle', 'heading1', 'heading2', 'detail', 'bullet', 'table')
+# Characters that are not allowed in XML 1.0 (e.g. form feeds from PDF text)
+_INVALID_XML_CHARS = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f\ufffe\uffff]')
+
+_template = None
+
+
+def build_template():
+    """
+    Builds the report template with python-docx: shared styles plus one
+    prototype of each report element, and returns it as DOCX bytes.
+    """
+    from docx import Document
+    from docx.enum.text import WD_ALIGN_PARAGRAPH
+    from docx.shared import Pt
+
+    doc = Document()
+    style = doc.styles['Normal']
+    style.font.name = 'Arial'
+    style.font.size = Pt(11)
+
+    title = doc.add_heading('@@TEXT@@', 0)
+    title.alignment = WD_ALIGN_PARAGRAPH.CENTER
+    subtitle = doc.add_paragraph('@@TEXT@@')
+    subtitle.alignment = WD_ALIGN_PARAGRAPH.CENTER
+    subtitle.runs[0].italic = True
+    doc.add_heading('@@TEXT@@', level=1)
+    doc.add_heading('@@TEXT@@', level=2)
+    detail = doc.add_paragraph()
+    detail.add_run('@@LABEL@@: ').bold = True
+    detail.add_run('@@TEXT@@')
+    doc.add_paragraph('@@TEXT@@', style='List Bullet')
+    table = doc.add_table(rows=2, cols=1)
+    table.style = 'Table Grid'
+    table.rows[0].cells[0].paragraphs[0].add_run('@@HEADER@@').bold = True
+    table.rows[1].cells[0].text = '@@CELL@@'
+
+    buffer = io.BytesIO()
+    doc.save(buffer)
+    return buffer.getvalue()
+
+
+def _prepare_template(template_bytes):
+    """
+    Splits the template into the package without document.xml (still
+    compressed), the document.xml text around the body, and the prototype
+    snippets.
+    """
+    from lxml import etree
+
+    package = io.BytesIO()
+    with zipfile.ZipFile(io.BytesIO(template_bytes)) as source, \
+            zipfile.ZipFile(package, 'w', zipfile.ZIP_DEFLATED) as target:
+        for info in source.infolist():
+            if info.filename == _DOCUMENT_PART:
+                document_xml = source.read(info)
+            else:
+                target.writestr(info, source.read(info))
+
+    root = etree.fromstring(document_xml)
+    body = root[0]
+    elements = list(body)[:len(_PROTOTYPES)]
+    snippets = dict(zip(_PROTOTYPES, (etree.tostring(element, encoding='unicode') for element in elements)))
+    for element in elements:
+        body.remove(element)
+    document = etree.tostring(root, encoding='UTF-8', xml_declaration=True, standalone=True).decode('utf-8')
+    body_end = document.index('<w:sectPr')
+
+    # The table prototype is cut into its properties, one grid column and one
+    # header/data cell, so tables of any width can be assembled
+    table = snippets.pop('table')
+    snippets['table_start'] = table[:table.index('<w:tblGrid>')]
+    snippets['grid_column'] = re.search(r'<w:gridCol [^>]*/>', table).group(0)
+    cells = re.findall(r'<w:tc>.*?</w:tc>', table)
+    snippets['header_cell'], snippets['cell'] = cells
+    for name in ('grid_column', 'header_cell', 'cell'):
+        snippets[name] = re.sub(r'w:w="\d+"', 'w:w="@@WIDTH@@"', snippets[name])
+    total_width = int(re.search(r'w:w="(\d+)"', table[table.index('<w:tblGrid>'):]).group(1))
+
+    return {
+        'package': package.getvalue(),
+        'head': document[:body_end],
+        'tail': document[body_end:],
+        'snippets': snippets,
+        'table_width': total_width,
+    }
+
+
+def _xml_text(text):
+    return escape(_INVALID_XML_CHARS.sub('', ' '.join(str(text).split())))
+
+
+def _fill(snippet, **markers):
+    for marker, text in markers.items():
+        snippet = snippet.replace(f"@@{marker.upper()}@@", _xml_text(text))
+    return snippet
+
+
+def _safe_filename(name):
+    """
+    'name' reduced to filename-safe characters. Where characters had to be
+    replaced, a short hash of the original name is appended, so different
+    names never share a file ("x y" and "x?y" would both become "x_y").
+    """
+    safe = re.sub(r'[^\w.-]+', '_', name).strip('_')
+    if safe == name:
+        return safe
+    return f"{safe or 'report'}_{hashlib.sha1(name.encode('utf-8')).hexdigest()[:8]}"
+
+
+def _topic_names(topic_info):
+    return {row['Topic']: row['Name'] for row in topic_info}
+
+
+def source_report_specs(columns, topic_info):
+    """
+    One spec per source paper: its topic mix and example sentences of its main topics.
+    'columns' is the step 2 sentence table (sentence, source, page, weight, topic).
+    """
+    names = _topic_names(topic_info)
+    sources, source_ids = np.unique(columns['source'].astype(str), return_inverse=True)
+    order = np.argsort(source_ids, kind='stable')
+    boundaries = np.searchsorted(source_ids[order], np.arange(len(sources) + 1))
+
+    specs = []
+    for source_id, source in enumerate(sources):
+        rows = order[boundaries[source_id]:boundaries[source_id + 1]]
+        topics = columns['topic'][rows]
+        weights = columns['weight'][rows]
+        total = int(weights.sum())
+
+        topic_ids, inverse = np.unique(topics, return_inverse=True)
+        topic_weights = np.bincount(inverse, weights=weights).astype(np.int64)
+        ranking = [i for i in np.argsort(-topic_weights, kind='stable') if topic_ids[i] != -1]
+
+        table_rows = [
+            [str(topic_ids[i]), names.get(int(topic_ids[i]), '').title(), f"{topic_weights[i]:,}",
+             f"{topic_weights[i] / total:.0%}"]
+            for i in ranking[:TABLE_ROWS]
+        ]
+        sections = []
+        for i in ranking[:3]:
+            examples = rows[topics == topic_ids[i]][:SENTENCES_PER_TOPIC]
+            sections.append((
+                f"Theme {topic_ids[i]}: {names.get(int(topic_ids[i]), '').title()}",
+                [f"(p. {columns['page'][row]}) {columns['sentence'][row]}" for row in examples],
+            ))
+
+        specs.append({
+            'filename': f"source_{_safe_filename(os.path.splitext(source)[0])}.docx",
+            'title': source,
+            'subtitle': 'Per-Paper Thematic Profile',
+            'details': [
+                ('Sentences', f"{total:,}"),
+                ('Pages with analyzed text', f"{len(np.unique(columns['page'][rows])):,}"),
+                ('Themes present', f"{len(ranking):,}"),
+            ],
+            'table': {
+                'heading': 'Themes in this Paper',
+                'columns': ['Theme ID', 'Theme', 'Sentences', 'Share'],
+                'rows': table_rows,
+            },
+            'sections': sections,
+        })
+    return specs
+
+
+def topic_report_specs(columns, topic_info):
+    """
+    One spec per (non-outlier) topic: its keywords, the papers it occurs in and
+    its representative sentences.
+    """
+    topics = columns['topic']
+    weights = columns['weight']
+    order = np.argsort(topics, kind='stable')
+    sorted_topics = topics[order]
+
+    specs = []
+    for row in topic_info:
+        topic_id = row['Topic']
+        if topic_id == -1:
+            continue
+        start, end = np.searchsorted(sorted_topics, [topic_id, topic_id + 1])
+        rows = order[start:end]
+        sources, inverse = np.unique(columns['source'][rows].astype(str), return_inverse=True)
+        source_weights = np.bincount(inverse, weights=weights[rows]).astype(np.int64)
+        ranking = np.argsort(-source_weights, kind='stable')
+
+        specs.append({
+            'filename': f"topic_{topic_id:03d}.docx",
+            'title': f"Theme {topic_id}: {row['Name'].title()}",
+            'subtitle': 'Per-Theme Evidence Summary',
+            'details': [
+                ('Sentences', f"{row['Count']:,}"),
+                ('Papers', f"{len(sources):,}"),
+                ('Keywords', ', '.join(row['Representation'])),
+            ],
+            'table': {
+                'heading': 'Papers Discussing this Theme',
+                'columns': ['Paper', 'Sentences'],
+                'rows': [[sources[i], f"{source_weights[i]:,}"] for i in ranking[:TABLE_ROWS]],
+            },
+            'sections': [('Representative Sentences', list(row.get('Representative_Docs') or []))],
+        })
+    return specs
+
+
+def _table_xml(columns, rows):
+    snippets = _template['snippets']
+    width = str(_template['table_width'] // len(columns))
+    header_cell = snippets['header_cell'].replace('@@WIDTH@@', width)
+    cell = snippets['cell'].replace('@@WIDTH@@', width)
+    parts = [snippets['table_start'], '<w:tblGrid>',
+             snippets['grid_column'].replace('@@WIDTH@@', width) * len(columns), '</w:tblGrid>',
+             '<w:tr>', *(_fill(header_cell, header=text) for text in columns), '</w:tr>']
+    for values in rows:
+        parts.append('<w:tr>')
+        parts.extend(_fill(cell, cell=text) for text in values)
+        parts.append('</w:tr>')
+    parts.append('</w:tbl>')
+    return ''.join(parts)
+
+
+def render_report(spec, output_dir):
+    """
+    Fills the template prototypes with one report spec and writes the DOCX. Returns the path.
+    """
+    snippets = _template['snippets']
+    body = [
+        _fill(snippets['title'], text=spec['title']),
+        _fill(snippets['subtitle'], text=spec['subtitle']),
+        _fill(snippets['heading2'], text='Details'),
+    ]
+    body.extend(_fill(snippets['detail'], label=label, text=value) for label, value in spec['details'])
+
+    table_spec = spec['table']
+    body.append(_fill(snippets['heading1'], text=table_spec['heading']))
+    body.append(_table_xml(table_spec['columns'], table_spec['rows']))
+
+    for heading, paragraphs in spec['sections']:
+        body.append(_fill(snippets['heading2'], text=heading))
+        body.extend(_fill(snippets['bullet'], text=text) for text in paragraphs)
+
+    document_xml = _template['head'] + ''.join(body) + _template['tail']
+
+    # Copy of the template package (its parts stay compressed) plus this report's document.xml
+    buffer = io.BytesIO(_template['package'])
+    with zipfile.ZipFile(buffer, 'a', zipfile.ZIP_DEFLATED) as package:
+        package.writestr(_DOCUMENT_PART, document_xml)
+
+    path = os.path.join(output_dir, spec['filename'])
+    with open(path, 'wb') as f:
+        f.write(buffer.getvalue())
+    return path
+
+
+def _init_worker(template_bytes):
+    global _template
+    _template = _prepare_template(template_bytes)
+
+
+def _render_chunk(specs, output_dir):
+    return [render_report(spec, output_dir) for spec in specs]
+
+
+def render_reports(specs, output_dir, workers=None, chunk_size=20):
+    """
+    Renders all report specs across a process pool. Returns the written paths.
+    """
+    workers = workers or os.cpu_count() or 1
+    template_bytes = build_template()
+    os.makedirs(output_dir, exist_ok=True)
+
+    chunks = [specs[i:i + chunk_size] for i in range(0, len(specs), chunk_size)]
+    if workers > 1 and len(chunks) > 1:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(template_bytes,)) as executor:
+            results = list(executor.map(_render_chunk, chunks, [output_dir] * len(chunks)))
+    else:
+        _init_worker(template_bytes)
+        results = [_render_chunk(chunk, output_dir) for chunk in chunks]
+    return [path for paths in results for path in paths]
+
+
+def generate_batch_reports(step2_dir, scope='all', output_dir=BATCH_REPORT_DIR, workers=None):
+    """
+    Writes the per-source and/or per-topic reports for the step 2 artifacts in
+    'step2_dir' and an index of them. Reports listed in a previous index that
+    are not produced again (e.g. topics that no longer exist) are removed.
+    Returns the paths of the written reports.
+    """
+    if scope not in REPORT_SCOPES:
+        raise ValueError(f"Unknown report scope '{scope}' (expected one of {', '.join(REPORT_SCOPES)}).")
+
+    metadata = read_metadata(step2_dir)
+    columns = read_table(os.path.join(step2_dir, SENTENCES_FILE), ['sentence', 'source', 'page', 'weight', 'topic'])
+
+    specs = []
+    if scope in ('sources', 'all'):
+        specs.extend(source_report_specs(columns, metadata['topic_info']))
+    if scope in ('topics', 'all'):
+        specs.extend(topic_report_specs(columns, metadata['topic_info']))
+
+    paths = render_reports(specs, output_dir, workers)
+
+    index_path = os.path.join(output_dir, INDEX_FILE)
+    written = {os.path.basename(path) for path in paths}
+    if os.path.exists(index_path):
+        with open(index_path, 'r', encoding='utf-8') as f:
+            for filename in json.load(f).get('reports', []):
+                if filename not in written and os.path.exists(os.path.join(output_dir, filename)):
+                    os.remove(os.path.join(output_dir, filename))
+    with open(index_path, 'w', encoding='utf-8') as f:
+        json.dump({'scope': scope, 'analysis_timestamp': metadata.get('analysis_timestamp'),
+                   'reports': sorted(written)}, f, indent=2)
+    return paths
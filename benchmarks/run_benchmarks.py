@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+"""
+Scaling benchmarks for the merge -> extract -> topic model -> report chain.
+
+For every corpus size a deterministic synthetic corpus is generated (see
+synthetic_corpus.py) and the pipeline scripts are run against it as separate
+processes, exactly as they run in production, with their inputs and outputs
+redirected through environment variables. Each stage records:
+    wall_s, cpu_s       latency of the whole script
+    peak_rss_mb         peak memory of the script and its worker processes
+    pages_per_s         throughput
+    stages              the script's own per-stage timings (from metrics.py)
+
+Results are written to a JSON file and compared against a stored baseline;
+any stage slower or bigger than the baseline by more than the tolerance is
+reported as a regression and the exit code is 1.
+
+Usage:
+    python benchmarks/run_benchmarks.py --sizes 10,100,1000 --pages 10
+    python benchmarks/run_benchmarks.py --sizes 10,100 --stages extract --save-baseline
+    python benchmarks/run_benchmarks.py --env EMBEDDING_BACKEND=onnx-int8 --stages extract,analyze
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import threading
+import time
+
+from synthetic_corpus import generate_corpus
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+DEFAULT_WORK_DIR = 'benchmark_runs'
+
+MERGED_PDF_FILENAME = "merged_document_for_analysis.pdf"
+
+# Stage name -> (script, output that must exist afterwards, relative to the run directory)
+STAGES = {
+    'merge': ('02.merge_pdfs.py', None),
+    'extract': ('04.step1_extract_text.py', os.path.join('artifacts', 'step1', 'metadata.json')),
+    'analyze': ('05.step2_thematic_analysis.py', os.path.join('artifacts', 'step2', 'metadata.json')),
+    'report': ('06.step3_generate_report.py', 'Deep_Learning_Analysis_Report.docx'),
+}
+# Metrics compared against the baseline (higher is worse)
+COMPARED_METRICS = ('wall_s', 'peak_rss_mb')
+
+
+def run_stage(name, run_dir, env, timeout=None):
+    """
+    Runs one pipeline script in 'run_dir' and returns its resource usage.
+    The script's output goes to '<run_dir>/<name>.log'.
+    """
+    script, expected_output = STAGES[name]
+    log_path = os.path.join(run_dir, f"{name}.log")
+    with open(log_path, 'w', encoding='utf-8') as log:
+        start = time.perf_counter()
+        process = subprocess.Popen([sys.executable, os.path.join(REPO_DIR, script)], cwd=run_dir, env=env,
+                                   stdout=log, stderr=subprocess.STDOUT)
+        timer = threading.Timer(timeout, process.kill) if timeout else None
+        if timer:
+            timer.start()
+        try:
+            # wait4 reports the usage of this child (and the workers it waited for) only
+            _, status, usage = os.wait4(process.pid, 0)
+        finally:
+            if timer:
+                timer.cancel()
+        wall = time.perf_counter() - start
+    process.returncode = os.waitstatus_to_exitcode(status)
+
+    ok = process.returncode == 0
+    if expected_output and not os.path.exists(os.path.join(run_dir, expected_output)):
+        ok = False
+    if name == 'merge' and not os.path.exists(os.path.join(env['PDF_FOLDER_PATH'], MERGED_PDF_FILENAME)):
+        ok = False
+
+    return {
+        'ok': ok,
+        'wall_s': round(wall, 3),
+        'cpu_s': round(usage.ru_utime + usage.ru_stime, 3),
+        'peak_rss_mb': round(usage.ru_maxrss / 1024, 1),  # KiB on Linux
+        'log': log_path,
+    }
+
+
+def read_stage_timings(metrics_path, run_id):
+    """
+    Top-level stage timings recorded by the pipeline's own metrics.py.
+    """
+    timings = {}
+    if not os.path.exists(metrics_path):
+        return timings
+    with open(metrics_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            record = json.loads(line)
+            if record.get('run_id') == run_id and record.get('parent') is None:
+                timings[f"{record['step']}.{record['stage']}"] = record['wall_s']
+    return timings
+
+
+def benchmark_size(documents, args, extra_env):
+    """
+    Generates (or reuses) the corpus for one size and runs the selected stages
+    on it. Returns {stage: result}.
+    """
+    corpus_dir = os.path.join(args.work_dir, f"corpus-{documents}x{args.pages}-seed{args.seed}")
+    generate_corpus(corpus_dir, documents, args.pages, args.seed)
+    corpus_dir = os.path.abspath(corpus_dir)
+
+    results = {}
+    for stage_name in args.stages:
+        runs = []
+        for repeat in range(args.repeat):
+            run_dir = os.path.abspath(os.path.join(args.work_dir, f"run-{documents}x{args.pages}"))
+            if stage_name == args.stages[0] and repeat == 0 and not args.keep_caches:
+                # Cold start: no artifacts, extraction/embedding caches or saved topic model
+                shutil.rmtree(run_dir, ignore_errors=True)
+            os.makedirs(run_dir, exist_ok=True)
+
+            run_id = f"bench-{documents}x{args.pages}-{stage_name}-{repeat}"
+            env = {
+                **os.environ,
+                'PDF_FOLDER_PATH': corpus_dir,
+                'ARTIFACT_DIR': os.path.join(run_dir, 'artifacts'),
+                'PIPELINE_METRICS_FILE': os.path.join(run_dir, 'pipeline_metrics.jsonl'),
+                'PIPELINE_RUN_ID': run_id,
+                'PYTHONPATH': os.pathsep.join(filter(None, [REPO_DIR, os.environ.get('PYTHONPATH')])),
+                **extra_env,
+            }
+            result = run_stage(stage_name, run_dir, env, args.timeout)
+            result['stages'] = read_stage_timings(env['PIPELINE_METRICS_FILE'], run_id)
+            runs.append(result)
+            if not result['ok']:
+                break
+
+        result = {
+            'ok': all(run['ok'] for run in runs),
+            'wall_s': round(statistics.median(run['wall_s'] for run in runs), 3),
+            'cpu_s': round(statistics.median(run['cpu_s'] for run in runs), 3),
+            'peak_rss_mb': max(run['peak_rss_mb'] for run in runs),
+            'repeats': len(runs),
+            'stages': runs[-1]['stages'],
+            'log': runs[-1]['log'],
+        }
+        pages = documents * args.pages
+        result['documents_per_s'] = round(documents / result['wall_s'], 2) if result['wall_s'] else None
+        result['pages_per_s'] = round(pages / result['wall_s'], 2) if result['wall_s'] else None
+        results[stage_name] = result
+
+        status = '✅' if result['ok'] else '❌'
+        print(f"{status} {documents:>6} docs  {stage_name:<8} {result['wall_s']:>9.2f}s  "
+              f"{result['peak_rss_mb']:>8.1f} MB  {result['pages_per_s'] or 0:>9.1f} pages/s")
+        if not result['ok']:
+            print(f"   ⚠️ Stage failed, see '{result['log']}'. Skipping the remaining stages for this size.")
+            break
+    return results
+
+
+def compare_to_baseline(results, baseline, tolerance):
+    """
+    Returns a list of regression messages: metrics that exceed the baseline
+    value by more than 'tolerance' (a fraction, e.g. 0.2 for 20%).
+    """
+    regressions = []
+    for case, stages in results.items():
+        for stage_name, result in stages.items():
+            reference = baseline.get('results', {}).get(case, {}).get(stage_name)
+            if not reference or not result['ok']:
+                continue
+            for metric in COMPARED_METRICS:
+                before, after = reference.get(metric), result.get(metric)
+                if before and after and after > before * (1 + tolerance):
+                    regressions.append(f"{case} {stage_name} {metric}: {before} -> {after} "
+                                       f"(+{(after / before - 1) * 100:.0f}%)")
+    return regressions
+
+
+def environment_info():
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'machine': platform.machine(),
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Scaling benchmarks on synthetic PDF corpora.")
+    parser.add_argument('--sizes', default='10,100,1000',
+                        help="comma-separated corpus sizes in documents (default: 10,100,1000)")
+    parser.add_argument('--pages', type=int, default=10, help="pages per document (default: 10)")
+    parser.add_argument('--seed', type=int, default=0, help="corpus seed (default: 0)")
+    parser.add_argument('--stages', default=','.join(STAGES),
+                        help=f"comma-separated stages to run, in order (default: {','.join(STAGES)})")
+    parser.add_argument('--repeat', type=int, default=1, help="runs per stage; the median is reported")
+    parser.add_argument('--keep-caches', action='store_true',
+                        help="reuse artifacts and caches from the previous run (warm start)")
+    parser.add_argument('--timeout', type=float, default=None, help="per-stage timeout in seconds")
+    parser.add_argument('--env', action='append', default=[], metavar='KEY=VALUE',
+                        help="extra environment for the pipeline scripts (repeatable)")
+    parser.add_argument('--work-dir', default=DEFAULT_WORK_DIR, help="corpora and run directories")
+    parser.add_argument('--output', default=None, help="results file (default: <work-dir>/results-<time>.json)")
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help="baseline results to compare against")
+    parser.add_argument('--save-baseline', action='store_true', help="store these results as the new baseline")
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help="allowed slowdown/memory growth before a regression is reported (default: 0.2)")
+    args = parser.parse_args(argv)
+
+    args.sizes = [int(size) for size in args.sizes.split(',') if size]
+    args.stages = [name for name in args.stages.split(',') if name]
+    unknown = [name for name in args.stages if name not in STAGES]
+    if unknown:
+        parser.error(f"unknown stage(s): {', '.join(unknown)} (choose from {', '.join(STAGES)})")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    extra_env = dict(item.split('=', 1) for item in args.env)
+    os.makedirs(args.work_dir, exist_ok=True)
+
+    print(f"--- Benchmarking {', '.join(args.stages)} on {args.sizes} documents x {args.pages} pages ---")
+    results = {}
+    for documents in args.sizes:
+        results[f"{documents}x{args.pages}"] = benchmark_size(documents, args, extra_env)
+
+    report = {
+        'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+        'environment': environment_info(),
+        'settings': {'seed': args.seed, 'pages': args.pages, 'repeat': args.repeat,
+                     'keep_caches': args.keep_caches, 'env': extra_env},
+        'results': results,
+    }
+    output = args.output or os.path.join(
+        args.work_dir, f"results-{datetime.datetime.now().strftime('%Y%m%dT%H%M%S')}.json")
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"\n📄 Results written to '{output}'.")
+
+    failed = any(not result['ok'] for stages in results.values() for result in stages.values())
+
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"📌 Baseline saved to '{args.baseline}'.")
+        return 1 if failed else 0
+
+    if not os.path.exists(args.baseline):
+        print(f"ℹ️ No baseline at '{args.baseline}' (create one with --save-baseline).")
+        return 1 if failed else 0
+
+    with open(args.baseline, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+    if baseline.get('environment') != report['environment']:
+        print("⚠️ The baseline was recorded on a different machine or Python; comparisons are indicative only.")
+
+    regressions = compare_to_baseline(results, baseline, args.tolerance)
+    if regressions:
+        print(f"❌ {len(regressions)} regression(s) beyond {args.tolerance:.0%} of the baseline:")
+        for message in regressions:
+            print(f"   - {message}")
+        return 1
+    print(f"✅ No regressions beyond {args.tolerance:.0%} of the baseline.")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
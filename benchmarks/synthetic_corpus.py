@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Deterministic synthetic PDF corpus generator for the scaling benchmarks.
+
+Writes plain single-font PDFs directly (no PDF library needed, works offline).
+Each document mixes sentences from one or two of a fixed set of marketing/AI
+themes, and every page carries a running header and footer, so the corpus
+exercises extraction, deduplication and topic modeling much like the real one.
+
+Document N is generated from its own seed, so it is byte-identical whether it
+belongs to a 10-document or a 10,000-document corpus.
+
+Usage:
+    python benchmarks/synthetic_corpus.py OUTPUT_DIR --documents 100 --pages 10
+"""
+import argparse
+import os
+import random
+
+THEMES = {
+    'content': ['generative AI', 'content creation', 'copywriting', 'blog posts', 'social media captions',
+                'brand voice', 'campaign drafts', 'large language models', 'prompt design', 'editorial review'],
+    'personalization': ['personalization', 'customer segments', 'recommendation engines', 'purchase history',
+                        'dynamic pricing', 'email campaigns', 'customer journeys', 'conversion rates',
+                        'predictive analytics', 'loyalty programs'],
+    'ethics': ['ethics', 'transparency', 'algorithmic bias', 'data privacy', 'consumer trust', 'regulation',
+               'disclosure', 'accountability', 'human oversight', 'misinformation'],
+    'service': ['chatbots', 'customer service', 'response times', 'virtual assistants', 'service quality',
+                'support tickets', 'conversational agents', 'customer satisfaction', 'escalation',
+                'self-service portals'],
+    'strategy': ['marketing strategy', 'competitive advantage', 'return on investment', 'adoption barriers',
+                 'organizational change', 'skills gaps', 'marketing budgets', 'decision making',
+                 'managerial implications', 'market research'],
+}
+
+TEMPLATES = [
+    "Recent studies show that {a} strongly influences {b} across many industries.",
+    "Marketing managers increasingly rely on {a} to improve {b} in everyday work.",
+    "Our survey of practitioners suggests that {a} and {b} are closely connected.",
+    "The findings indicate that firms investing in {a} report better {b} over time.",
+    "Critics argue that {a} may undermine {b} unless it is carefully governed.",
+    "A growing body of literature examines how {a} reshapes {b} in digital markets.",
+    "Respondents described {a} as a key driver of {b} in their organizations.",
+    "Future research should investigate the long-term effects of {a} on {b}.",
+]
+
+FILLER = [
+    "These results are consistent with earlier work in the field.",
+    "Table {n} summarizes the descriptive statistics of the sample.",
+    "The remainder of this section discusses the implications in more detail.",
+]
+
+HEADER = "Journal of Synthetic Marketing Research - Volume 12"
+FOOTER = "Copyright 2024 Synthetic Press. All rights reserved. Page {page}"
+LINE_WIDTH = 95
+LINES_PER_PAGE = 52
+
+
+def _escape(text):
+    return text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+
+def _wrap(text, width=LINE_WIDTH):
+    lines, line = [], ''
+    for word in text.split():
+        if line and len(line) + 1 + len(word) > width:
+            lines.append(line)
+            line = word
+        else:
+            line = f"{line} {word}" if line else word
+    if line:
+        lines.append(line)
+    return lines
+
+
+def write_pdf(path, pages):
+    """
+    Writes a minimal PDF with one Helvetica text block per page.
+    'pages' is a list of pages, each a list of text lines.
+    """
+    objects = {1: b'<< /Type /Catalog /Pages 2 0 R >>',
+               3: b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>'}
+    kids = []
+    for i, lines in enumerate(pages):
+        page_id, content_id = 4 + 2 * i, 5 + 2 * i
+        kids.append(f"{page_id} 0 R")
+        stream = 'BT /F1 10 Tf 50 770 Td 14 TL ' + ' '.join(f"({_escape(line)}) '" for line in lines) + ' ET'
+        stream = stream.encode('latin-1', 'replace')
+        objects[page_id] = (f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+                            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {content_id} 0 R >>").encode()
+        objects[content_id] = b'<< /Length %d >>\nstream\n' % len(stream) + stream + b'\nendstream'
+    objects[2] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(pages)} >>".encode()
+
+    out = bytearray(b'%PDF-1.4\n')
+    offsets = []
+    for object_id in sorted(objects):
+        offsets.append(len(out))
+        out += b'%d 0 obj\n' % object_id + objects[object_id] + b'\nendobj\n'
+    xref_offset = len(out)
+    out += b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1)
+    out += b''.join(b'%010d 00000 n \n' % offset for offset in offsets)
+    out += b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(objects) + 1, xref_offset)
+
+    with open(path, 'wb') as f:
+        f.write(out)
+
+
+def generate_document(doc_index, pages, seed=0):
+    """
+    Returns the pages (lists of lines) of synthetic document 'doc_index'.
+    """
+    rng = random.Random(seed * 1_000_003 + doc_index)
+    doc_themes = rng.sample(sorted(THEMES), k=rng.choice([1, 2]))
+    body_lines = LINES_PER_PAGE - 4
+
+    result = []
+    for page in range(1, pages + 1):
+        paragraph = []
+        while sum(len(line) for line in _wrap(' '.join(paragraph))) < body_lines * LINE_WIDTH * 0.9:
+            if rng.random() < 0.15:
+                paragraph.append(rng.choice(FILLER).format(n=rng.randint(1, 9)))
+            else:
+                terms = THEMES[rng.choice(doc_themes)]
+                a, b = rng.sample(terms, 2)
+                paragraph.append(rng.choice(TEMPLATES).format(a=a, b=b))
+        lines = _wrap(' '.join(paragraph))[:body_lines]
+        result.append([HEADER, ''] + lines + ['', FOOTER.format(page=page)])
+    return result
+
+
+def generate_corpus(output_dir, documents, pages_per_document, seed=0):
+    """
+    Writes 'documents' PDFs named 1.pdf ... N.pdf into 'output_dir' (existing
+    files are kept, so growing a corpus only writes the new documents).
+    Returns the list of PDF paths.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    paths = []
+    for doc_index in range(1, documents + 1):
+        path = os.path.join(output_dir, f"{doc_index}.pdf")
+        if not os.path.exists(path):
+            write_pdf(path, generate_document(doc_index, pages_per_document, seed))
+        paths.append(path)
+    return paths
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a deterministic synthetic PDF corpus.")
+    parser.add_argument('output_dir')
+    parser.add_argument('--documents', type=int, default=10)
+    parser.add_argument('--pages', type=int, default=10, help="pages per document")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    paths = generate_corpus(args.output_dir, args.documents, args.pages, args.seed)
+    print(f"✅ {len(paths)} synthetic PDFs ({args.pages} pages each) in '{args.output_dir}'.")
@@ -0,0 +1,147 @@
+"""
+Duplicate and boilerplate sentence elimination for step 2 (runs between
+segmentation and embedding).
+
+Academic PDFs repeat running headers, footers, licence lines and journal names
+on every page, and reference entries recur across papers. Three passes collapse
+them before they inflate the embedding, UMAP and HDBSCAN workload:
+  1. Exact duplicates (after whitespace/Unicode normalization) are collapsed.
+  2. Sentences repeated on many different pages are treated as boilerplate and dropped.
+  3. Near-duplicates are found with MinHash signatures over word shingles and
+     locality-sensitive hashing (LSH), then collapsed as well.
+Every kept sentence carries a multiplicity weight (how many sentences it stands
+for), so topic sizes can still be reported in terms of the full corpus.
+"""
+import zlib
+
+import numpy as np
+
+from embeddings import sentence_keys
+
+# A sentence that appears verbatim on this many different pages is boilerplate
+BOILERPLATE_MIN_PAGES = 5
+# Estimated Jaccard similarity above which two sentences count as near-duplicates
+NEAR_DUPLICATE_THRESHOLD = 0.8
+MINHASH_PERMUTATIONS = 64
+LSH_BANDS = 16
+SHINGLE_SIZE = 3
+
+_HASH_PRIME = np.uint64(4294967311)  # smallest prime above 2**32
+
+
+def _shingle_hashes(text, size=SHINGLE_SIZE):
+    """
+    CRC32 hashes of the word n-gram shingles of a sentence (lower-cased).
+    """
+    words = text.lower().split()
+    if len(words) < size:
+        shingles = [' '.join(words)]
+    else:
+        shingles = [' '.join(words[i:i + size]) for i in range(len(words) - size + 1)]
+    return np.fromiter((zlib.crc32(s.encode('utf-8')) for s in shingles), dtype=np.uint64, count=len(shingles))
+
+
+def minhash_signatures(texts, num_perm=MINHASH_PERMUTATIONS, seed=1):
+    """
+    Returns an (n, num_perm) uint32 matrix of MinHash signatures.
+    """
+    rng = np.random.default_rng(seed)
+    # Multipliers stay below 2**31 so (a * h + b) never overflows uint64
+    a = rng.integers(1, 2 ** 31, size=num_perm, dtype=np.uint64)[:, None]
+    b = rng.integers(0, 2 ** 31, size=num_perm, dtype=np.uint64)[:, None]
+
+    signatures = np.empty((len(texts), num_perm), dtype=np.uint32)
+    for row, text in enumerate(texts):
+        hashes = _shingle_hashes(text)[None, :]
+        signatures[row] = ((a * hashes + b) % _HASH_PRIME).min(axis=1)
+    return signatures
+
+
+def _find(parent, i):
+    while parent[i] != i:
+        parent[i] = parent[parent[i]]
+        i = parent[i]
+    return i
+
+
+def near_duplicate_groups(signatures, threshold=NEAR_DUPLICATE_THRESHOLD, bands=LSH_BANDS):
+    """
+    Groups rows whose signatures agree on at least 'threshold' of their values.
+    Candidate pairs come from LSH buckets (rows sharing all values of a band),
+    so only a tiny fraction of all pairs is ever compared.
+    Returns the group representative (lowest row) of every row.
+    """
+    n, num_perm = signatures.shape
+    rows_per_band = num_perm // bands
+    parent = np.arange(n)
+
+    for band in range(bands):
+        band_values = signatures[:, band * rows_per_band:(band + 1) * rows_per_band]
+        buckets = {}
+        for row, key in enumerate(map(bytes, band_values)):
+            buckets.setdefault(key, []).append(row)
+        for bucket in buckets.values():
+            if len(bucket) < 2:
+                continue
+            first = bucket[0]
+            for other in bucket[1:]:
+                root_a, root_b = _find(parent, first), _find(parent, other)
+                if root_a == root_b:
+                    continue
+                if np.mean(signatures[first] == signatures[other]) >= threshold:
+                    parent[max(root_a, root_b)] = min(root_a, root_b)
+
+    return np.array([_find(parent, i) for i in range(n)])
+
+
+def deduplicate_sentences(sentences, pages, boilerplate_min_pages=BOILERPLATE_MIN_PAGES,
+                          near_threshold=NEAR_DUPLICATE_THRESHOLD, keys=None):
+    """
+    Collapses duplicate sentences and drops boilerplate.
+
+    'sentences' is a sequence of sentence strings, 'pages' a matching integer
+    array of page identifiers (e.g. doc_id << 32 | page) and 'keys' their
+    sentence keys if already computed (see embeddings.sentence_keys).
+    Returns (keep_rows, weights, stats): the rows to keep, how many original
+    sentences each kept row stands for, and a dict of counts for the log.
+    """
+    # 1. Exact duplicates, and on how many distinct pages each one occurs
+    if keys is None:
+        keys = sentence_keys(sentences)
+    _, first_rows, inverse, exact_weights = np.unique(keys, return_index=True, return_inverse=True,
+                                                       return_counts=True)
+    inverse = inverse.ravel()
+    key_pages = np.unique(np.stack([inverse, np.asarray(pages, dtype=np.int64)], axis=1), axis=0)
+    distinct_pages = np.bincount(key_pages[:, 0], minlength=len(first_rows))
+    del inverse, key_pages
+
+    # 2. Boilerplate: the same sentence on many different pages
+    is_boilerplate = distinct_pages >= boilerplate_min_pages
+    boilerplate_sentences = exact_weights[is_boilerplate].sum()
+
+    # In order of first occurrence, so the lowest row represents each group below
+    order = np.argsort(first_rows[~is_boilerplate], kind='stable')
+    unique_rows = first_rows[~is_boilerplate][order].astype(np.int64)
+    unique_weights = exact_weights[~is_boilerplate][order].astype(np.int64)
+
+    # 3. Near-duplicates among the remaining unique sentences
+    if len(unique_rows):
+        signatures = minhash_signatures([sentences[row] for row in unique_rows])
+        representatives = near_duplicate_groups(signatures, near_threshold)
+        weights = np.bincount(representatives, weights=unique_weights, minlength=len(unique_rows)).astype(np.int64)
+        is_representative = representatives == np.arange(len(unique_rows))
+        keep_rows = unique_rows[is_representative]
+        weights = weights[is_representative]
+    else:
+        keep_rows, weights = unique_rows, unique_weights
+
+    stats = {
+        'sentences_total': len(sentences),
+        'exact_duplicates_removed': int(unique_weights.sum() - len(unique_rows)),
+        'boilerplate_sentences_removed': int(boilerplate_sentences),
+        'near_duplicates_removed': int(len(unique_rows) - len(keep_rows)),
+        'sentences_kept': int(len(keep_rows)),
+    }
+    order = np.argsort(keep_rows)
+    return keep_rows[order], weights[order], stats
+
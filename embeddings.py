@@ -0,0 +1,313 @@
+"""
+Sentence embedding helpers for step 2: CPU embedding backends and a persistent cache.
+
+Backends (see load_embedding_backend):
+  - 'torch':      plain fp32 SentenceTransformer (the baseline).
+  - 'torch-int8': the same model with its Linear layers dynamically quantized to int8.
+  - 'onnx':       ONNX Runtime inference of the exported model.
+  - 'onnx-int8':  ONNX Runtime inference of the int8-quantized export.
+The 'onnx' backends need the optional 'optimum[onnxruntime]' package.
+
+Persistent cache (see EmbeddingCache):
+Embeddings are keyed by a hash of the normalized sentence text and stored per
+model as one raw float32/float16 matrix that is memory-mapped on read. Only
+sentences that are not in the cache yet are sent to the embedding model, so a
+re-run of topic modeling with different parameters costs nothing for embeddings.
+
+Layout on disk:
+    <cache_dir>/<model name>/meta.json        model name, dimension, dtype, row count
+    <cache_dir>/<model name>/keys.bin         16-byte sentence hashes, one per row (append-only)
+    <cache_dir>/<model name>/vectors.bin      raw embedding matrix (row-major, append-only)
+    <cache_dir>/<model name>/sorted_keys.bin  the keys in sorted order, for np.searchsorted
+    <cache_dir>/<model name>/sorted_rows.bin  the row of each sorted key (int64)
+"""
+import hashlib
+import json
+import os
+import re
+import unicodedata
+
+import numpy as np
+
+EMBEDDING_CACHE_DIR = '.embedding_cache'
+EMBEDDING_BACKENDS = ('torch', 'torch-int8', 'onnx', 'onnx-int8')
+# Quantized export shipped with the all-MiniLM-L6-v2 repository (AVX2 runs on any modern x86 CPU)
+ONNX_INT8_FILE_NAME = 'onnx/model_quint8_avx2.onnx'
+
+
+def load_embedding_backend(model_name, backend='torch', threads=None):
+    """
+    Loads 'model_name' for CPU inference with the selected backend.
+    'threads' caps the intra-op thread count (None keeps the library default).
+    """
+    if backend not in EMBEDDING_BACKENDS:
+        raise ValueError(f"Unknown embedding backend '{backend}' (expected one of {', '.join(EMBEDDING_BACKENDS)}).")
+
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    if threads:
+        torch.set_num_threads(threads)
+
+    if backend in ('torch', 'torch-int8'):
+        model = SentenceTransformer(model_name, device='cpu')
+        if backend == 'torch-int8':
+            torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+        return model
+
+    try:
+        import onnxruntime
+    except ImportError:
+        raise ImportError(f"The '{backend}' backend needs ONNX Runtime: pip install 'optimum[onnxruntime]'")
+
+    model_kwargs = {'provider': 'CPUExecutionProvider'}
+    if threads:
+        session_options = onnxruntime.SessionOptions()
+        session_options.intra_op_num_threads = threads
+        model_kwargs['session_options'] = session_options
+    if backend == 'onnx-int8':
+        model_kwargs['file_name'] = ONNX_INT8_FILE_NAME
+    return SentenceTransformer(model_name, device='cpu', backend='onnx', model_kwargs=model_kwargs)
+
+
+def cache_model_name(model_name, backend):
+    """
+    Name under which a backend's embeddings are cached. Quantized backends
+    produce slightly different vectors, so they never share the fp32 cache.
+    """
+    return model_name if backend == 'torch' else f"{model_name}@{backend}"
+
+
+def make_length_bucketed_encoder(model, batch_size=64):
+    """
+    Returns an 'encode' function for EmbeddingCache that sorts sentences by
+    length before batching, so short and long sentences are never padded to
+    the same length within a batch. Results come back in the input order.
+    """
+    def encode(sentences):
+        order = np.argsort([len(s) for s in sentences], kind='stable')
+        vectors = None
+        for start in range(0, len(order), batch_size):
+            batch_rows = order[start:start + batch_size]
+            batch_vectors = model.encode([sentences[i] for i in batch_rows], batch_size=batch_size,
+                                         show_progress_bar=False, convert_to_numpy=True)
+            if vectors is None:
+                vectors = np.empty((len(sentences), batch_vectors.shape[1]), dtype=np.float32)
+            vectors[batch_rows] = batch_vectors
+        return vectors
+
+    return encode
+
+
+def compare_topic_assignments(baseline_topics, candidate_topics, baseline_embeddings=None, candidate_embeddings=None):
+    """
+    Measures how close a candidate backend stays to the fp32 baseline.
+    Returns the share of identical topic assignments, their adjusted Rand index
+    and, if the embeddings are given, the mean/min cosine similarity per sentence.
+    """
+    from sklearn.metrics import adjusted_rand_score
+
+    baseline_topics = np.asarray(baseline_topics)
+    candidate_topics = np.asarray(candidate_topics)
+    result = {
+        'sentences_compared': int(len(baseline_topics)),
+        'topic_agreement': float(np.mean(baseline_topics == candidate_topics)),
+        'adjusted_rand_index': float(adjusted_rand_score(baseline_topics, candidate_topics)),
+    }
+    if baseline_embeddings is not None and candidate_embeddings is not None:
+        a = np.asarray(baseline_embeddings, dtype=np.float32)
+        b = np.asarray(candidate_embeddings, dtype=np.float32)
+        cosine = np.sum(a * b, axis=1) / (np.linalg.norm(a, axis=1) * np.linalg.norm(b, axis=1) + 1e-12)
+        result['mean_cosine'] = float(cosine.mean())
+        result['min_cosine'] = float(cosine.min())
+    return result
+
+
+def normalize_sentence(text):
+    """
+    Normalizes a sentence for hashing: Unicode NFKC and collapsed whitespace.
+    """
+    return unicodedata.normalize('NFKC', ' '.join(text.split()))
+
+
+def sentence_key(text):
+    """
+    Returns the 16-byte cache key of a sentence.
+    """
+    return hashlib.blake2b(normalize_sentence(text).encode('utf-8'), digest_size=16).digest()
+
+
+def sentence_keys(sentences):
+    """
+    The cache keys of 'sentences' as an S16 array (16 bytes per sentence).
+    """
+    keys = np.empty(len(sentences), dtype='S16')
+    for row, text in enumerate(sentences):
+        keys[row] = sentence_key(text)
+    return keys
+
+
+class EmbeddingCache:
+    """
+    Append-only, memory-mapped embedding store for a single embedding model.
+
+    Keys and vectors are raw files that only ever grow at the end, so a batch
+    of new embeddings costs a write of that batch. Lookups go through a sorted
+    copy of the keys (searched with np.searchsorted), which is rebuilt once
+    per rows_for call rather than per batch. Nothing held in memory grows
+    with the number of cached sentences.
+    """
+
+    def __init__(self, model_name, cache_dir=EMBEDDING_CACHE_DIR, dtype='float32'):
+        self.model_name = model_name
+        self.dir = os.path.join(cache_dir, re.sub(r'[^A-Za-z0-9_.-]+', '_', model_name))
+        self.meta_path = os.path.join(self.dir, 'meta.json')
+        self.keys_path = os.path.join(self.dir, 'keys.bin')
+        self.vectors_path = os.path.join(self.dir, 'vectors.bin')
+        self.sorted_keys_path = os.path.join(self.dir, 'sorted_keys.bin')
+        self.sorted_rows_path = os.path.join(self.dir, 'sorted_rows.bin')
+        os.makedirs(self.dir, exist_ok=True)
+
+        self.dtype = np.dtype(dtype)
+        self.dim = None
+        self.count = 0
+        self.indexed = 0
+        if os.path.exists(self.meta_path):
+            with open(self.meta_path, 'r') as f:
+                meta = json.load(f)
+            if meta['model_name'] != model_name:
+                raise ValueError(f"Embedding cache at '{self.dir}' belongs to model '{meta['model_name']}'.")
+            # An existing cache keeps the dtype it was created with
+            self.dtype = np.dtype(meta['dtype'])
+            self.dim = meta['dim']
+            self.count = meta['count']
+            self.indexed = meta.get('indexed', 0)
+            legacy_keys_path = os.path.join(self.dir, 'keys.npy')
+            if os.path.exists(legacy_keys_path) and not os.path.exists(self.keys_path):
+                # Caches written before keys.bin: convert the key array once
+                np.load(legacy_keys_path)[:self.count].tofile(self.keys_path)
+                os.remove(legacy_keys_path)
+                self.indexed = 0
+            if self.indexed != self.count:
+                # An earlier run stopped between appending and re-indexing
+                self._rebuild_index()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return self.count
+
+    @property
+    def matrix(self):
+        """
+        The full cached matrix as a read-only memory map (count x dim).
+        """
+        if not self.count:
+            return np.empty((0, self.dim or 0), dtype=self.dtype)
+        return np.memmap(self.vectors_path, dtype=self.dtype, mode='r', shape=(self.count, self.dim))
+
+    def _memmap(self, path, dtype, count):
+        if not count:
+            return np.empty(0, dtype=dtype)
+        return np.memmap(path, dtype=dtype, mode='r', shape=(count,))
+
+    def _write_meta(self):
+        tmp_path = self.meta_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'model_name': self.model_name, 'dim': self.dim, 'dtype': self.dtype.name,
+                       'count': self.count, 'indexed': self.indexed}, f)
+        os.replace(tmp_path, self.meta_path)
+
+    def _write_index(self, sorted_keys, sorted_rows):
+        for path, array in ((self.sorted_keys_path, sorted_keys), (self.sorted_rows_path, sorted_rows)):
+            array.tofile(path + '.tmp')
+            os.replace(path + '.tmp', path)
+        self.indexed = len(sorted_keys)
+        self._write_meta()
+
+    def _rebuild_index(self):
+        keys = self._memmap(self.keys_path, 'S16', self.count)
+        order = np.argsort(keys, kind='stable')
+        self._write_index(np.asarray(keys[order]), order.astype(np.int64))
+
+    def lookup(self, keys):
+        """
+        Cache row of every key in 'keys' (an S16 array); -1 where it is not cached.
+        """
+        keys = np.asarray(keys, dtype='S16')
+        rows = np.full(len(keys), -1, dtype=np.int64)
+        if not self.indexed or not len(keys):
+            return rows
+        sorted_keys = self._memmap(self.sorted_keys_path, 'S16', self.indexed)
+        positions = np.minimum(np.searchsorted(sorted_keys, keys), self.indexed - 1)
+        found = sorted_keys[positions] == keys
+        rows[found] = self._memmap(self.sorted_rows_path, np.int64, self.indexed)[positions[found]]
+        return rows
+
+    def _append(self, new_keys, vectors):
+        """
+        Appends one batch of keys and vectors. Rows past the recorded count
+        (left over from an interrupted run) are overwritten.
+        """
+        vectors = np.ascontiguousarray(vectors, dtype=self.dtype)
+        if self.dim is None:
+            self.dim = vectors.shape[1]
+        elif vectors.shape[1] != self.dim:
+            raise ValueError(f"Embedding dimension changed from {self.dim} to {vectors.shape[1]}.")
+
+        for path, data, row_bytes in ((self.vectors_path, vectors, self.dim * self.dtype.itemsize),
+                                      (self.keys_path, np.asarray(new_keys, dtype='S16'), 16)):
+            with open(path, 'r+b' if os.path.exists(path) else 'wb') as f:
+                f.truncate(self.count * row_bytes)
+                f.seek(0, os.SEEK_END)
+                f.write(data.tobytes())
+        # The count in meta.json is the commit point
+        self.count += len(new_keys)
+        self._write_meta()
+
+    def _add_to_index(self, new_keys, first_row):
+        """
+        Merges 'new_keys' (sorted, unique, stored from 'first_row' on) into the sorted key index.
+        """
+        sorted_keys = self._memmap(self.sorted_keys_path, 'S16', self.indexed)
+        sorted_rows = self._memmap(self.sorted_rows_path, np.int64, self.indexed)
+        positions = np.searchsorted(sorted_keys, new_keys)
+        self._write_index(np.insert(np.asarray(sorted_keys), positions, new_keys),
+                          np.insert(np.asarray(sorted_rows), positions,
+                                    np.arange(first_row, first_row + len(new_keys), dtype=np.int64)))
+
+    def rows_for(self, sentences, encode, batch_size=1024, keys=None):
+        """
+        Returns the cache row of every sentence, embedding the missing ones first.
+
+        'encode' takes a list of sentences and returns an (n, dim) array. Misses
+        are de-duplicated and sent to it 'batch_size' sentences at a time, and
+        each batch is persisted as soon as it is embedded. 'keys' are the
+        sentences' keys if already computed (see sentence_keys).
+        """
+        keys = sentence_keys(sentences) if keys is None else np.asarray(keys, dtype='S16')
+        rows = self.lookup(keys)
+        missing = np.flatnonzero(rows < 0)
+        new_keys, first_rows, inverse = np.unique(keys[missing], return_index=True, return_inverse=True)
+        self.misses += len(new_keys)
+        self.hits += len(keys) - len(new_keys)
+        if not len(new_keys):
+            return rows
+
+        first_row = self.count
+        for start in range(0, len(new_keys), batch_size):
+            batch_rows = missing[first_rows[start:start + batch_size]]
+            vectors = encode([sentences[i] for i in batch_rows])
+            self._append(new_keys[start:start + batch_size], np.asarray(vectors))
+        self._add_to_index(new_keys, first_row)
+
+        rows[missing] = first_row + inverse.ravel()
+        return rows
+
+    def embed(self, sentences, encode, batch_size=1024):
+        """
+        Returns the embeddings of 'sentences' as an in-memory float32 array,
+        embedding only the sentences that are not cached yet.
+        """
+        rows = self.rows_for(sentences, encode, batch_size)
+        return np.asarray(self.matrix[rows], dtype=np.float32)
@@ -0,0 +1,385 @@
+#!/usr/bin/env python3
+"""
+Hybrid keyword + vector search over the step 2 sentences, so the report (and
+anyone looking into a theme) can fetch the sentences that support a topic or
+a query in milliseconds instead of rescanning the corpus.
+
+  - Keyword side: an inverted index for Okapi BM25. Words (lowercase, English
+    stop words removed) are hashed into a fixed term space, so the index is
+    built a batch at a time without a vocabulary pass, and the term
+    frequencies are stored column-major (CSC): the column of a term hash is
+    its postings list. Queries are tokenized the same way without importing
+    scikit-learn, which alone takes longer to import than a search takes.
+  - Vector side: an IVF (inverted file) index over the step 2 embeddings. The
+    normalized embeddings are clustered into about sqrt(n) lists with k-means;
+    a query is compared with the list centroids and only the rows of the
+    closest N_PROBE lists are scored exactly, read from the memory-mapped
+    embeddings.npy. Small corpora get a single list (exact search).
+  - Provenance: paper, page and topic of every row, so hits can be traced
+    and filtered by topic without the sentence table.
+Both rankings are combined with reciprocal rank fusion. Rows are the rows of
+sentences.parquet and embeddings.npy.
+
+Layout on disk (artifacts/step2/evidence_index/):
+    metadata.json     row count, BM25 and IVF parameters, stop words, paper names
+    postings.npz      BM25 term-frequency matrix (CSC arrays) and sentence lengths
+    ivf.npz           list centroids, the rows of each list, row norms and topic centroids
+    provenance.npz    paper id, page and topic of every row
+
+Usage:
+    python evidence_index.py "consumer trust in chatbots"            # keyword search
+    python evidence_index.py "consumer trust in chatbots" --semantic # hybrid (loads the embedding model)
+    python evidence_index.py --topic 3                                # evidence for a theme
+"""
+import argparse
+import os
+import re
+import sys
+import time
+import zlib
+
+import numpy as np
+
+from artifacts import (ARTIFACT_DIR, EMBEDDINGS_FILE, SENTENCES_FILE, read_array, read_metadata, step_dir,
+                       write_metadata)
+
+EVIDENCE_INDEX_DIR = 'evidence_index'
+POSTINGS_FILE = 'postings.npz'
+IVF_FILE = 'ivf.npz'
+PROVENANCE_FILE = 'provenance.npz'
+
+# Okapi BM25 parameters
+BM25_K1 = 1.2
+BM25_B = 0.75
+# Hashed term space (collisions are negligible at this size)
+HASH_FEATURES = 2 ** 20
+# Below this many sentences the vector index is a single list, i.e. exact search
+EXACT_SEARCH_ROWS = 20000
+MAX_IVF_LISTS = 4096
+IVF_TRAIN_SAMPLE = 100000
+# Lists scored per vector query
+N_PROBE = 32
+# Reciprocal rank fusion constant, and how deep each ranking is fused
+RRF_K = 60
+FUSION_DEPTH = 200
+
+
+# Words as scikit-learn's vectorizers see them
+_TOKEN = re.compile(r"(?u)\b\w\w+\b")
+
+
+def term_hashes(text, stop_words, n_features=HASH_FEATURES):
+    """
+    Hashed terms of 'text' (one entry per occurrence).
+    """
+    return [zlib.crc32(word.encode('utf-8')) % n_features
+            for word in _TOKEN.findall(text.lower()) if word not in stop_words]
+
+
+def term_counts(texts, stop_words, n_features=HASH_FEATURES):
+    """
+    Sparse (len(texts) x n_features) term-frequency matrix of 'texts'.
+    """
+    from scipy import sparse
+
+    rows, columns = [], []
+    for row, text in enumerate(texts):
+        hashes = term_hashes(text, stop_words, n_features)
+        rows.extend([row] * len(hashes))
+        columns.extend(hashes)
+    # Repeated (row, column) pairs are summed into counts
+    return sparse.csr_matrix((np.ones(len(rows), dtype=np.float32), (rows, columns)),
+                             shape=(len(texts), n_features))
+
+
+def ivf_list_count(n_rows):
+    """
+    Number of IVF lists for 'n_rows' sentences.
+    """
+    if n_rows < EXACT_SEARCH_ROWS:
+        return 1
+    return min(MAX_IVF_LISTS, int(np.sqrt(n_rows)))
+
+
+def _save_npz(path, **arrays):
+    tmp_path = path + '.tmp.npz'
+    np.savez(tmp_path, **arrays)
+    os.replace(tmp_path, path)
+
+
+def _normalized(vectors, norms=None):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if norms is None:
+        norms = np.linalg.norm(vectors, axis=1)
+    return vectors / (norms[:, None] + 1e-12)
+
+
+def build_evidence_index(index_dir, sentences, topics, embeddings, batch_size=50000, seed=42):
+    """
+    Builds the index for the step 2 sentences in 'index_dir'. 'sentences' is
+    the SentenceIndex of the sentence table's rows, 'topics' their topics and
+    'embeddings' their (memory-mapped) embeddings. Everything is read a batch
+    of rows at a time.
+    """
+    from scipy import sparse
+    from sklearn.cluster import MiniBatchKMeans
+    from sklearn.feature_extraction.text import ENGLISH_STOP_WORDS
+
+    os.makedirs(index_dir, exist_ok=True)
+    n = len(sentences)
+    batches = [np.arange(start, min(start + batch_size, n)) for start in range(0, n, batch_size)]
+
+    # Inverted index: term frequencies of every sentence, stored per term
+    counts = sparse.vstack([term_counts(sentences.texts(rows), ENGLISH_STOP_WORDS) for rows in batches], format='csr')
+    lengths = np.asarray(counts.sum(axis=1), dtype=np.float32).ravel()
+    postings = counts.tocsc()
+    del counts
+    _save_npz(os.path.join(index_dir, POSTINGS_FILE), data=postings.data, indices=postings.indices,
+              indptr=postings.indptr, lengths=lengths)
+
+    # Vector index: k-means lists over the normalized embeddings
+    norms = np.concatenate([np.linalg.norm(np.asarray(embeddings[rows], dtype=np.float32), axis=1)
+                            for rows in batches])
+    n_lists = ivf_list_count(n)
+    dim = embeddings.shape[1]
+    if n_lists > 1:
+        train_rows = np.sort(np.random.default_rng(seed).choice(n, min(n, IVF_TRAIN_SAMPLE), replace=False))
+        kmeans = MiniBatchKMeans(n_clusters=n_lists, batch_size=4096, n_init=1, random_state=seed)
+        kmeans.fit(_normalized(embeddings[train_rows], norms[train_rows]))
+        centroids = _normalized(kmeans.cluster_centers_)
+        row_lists = np.concatenate([
+            (_normalized(embeddings[rows], norms[rows]) @ centroids.T).argmax(axis=1) for rows in batches])
+    else:
+        centroids = np.zeros((1, dim), dtype=np.float32)
+        row_lists = np.zeros(n, dtype=np.int64)
+    list_rows = np.argsort(row_lists, kind='stable').astype(np.int64)
+    list_offsets = np.searchsorted(row_lists[list_rows], np.arange(n_lists + 1)).astype(np.int64)
+
+    # Topic centroids, the vector query for a topic's evidence
+    topics = np.asarray(topics, dtype=np.int32)
+    topic_ids = np.unique(topics)
+    topic_vectors = np.zeros((len(topic_ids), dim), dtype=np.float64)
+    for rows in batches:
+        np.add.at(topic_vectors, np.searchsorted(topic_ids, topics[rows]), _normalized(embeddings[rows], norms[rows]))
+    _save_npz(os.path.join(index_dir, IVF_FILE), centroids=centroids, list_rows=list_rows, list_offsets=list_offsets,
+              norms=norms, topic_ids=topic_ids, topic_vectors=_normalized(topic_vectors))
+
+    _save_npz(os.path.join(index_dir, PROVENANCE_FILE), doc_ids=np.asarray(sentences.doc_ids, dtype=np.int32),
+              pages=np.asarray(sentences.pages, dtype=np.int32), topics=topics)
+    write_metadata(index_dir, {
+        'rows': n,
+        'dim': int(dim),
+        'hash_features': HASH_FEATURES,
+        'bm25_k1': BM25_K1,
+        'bm25_b': BM25_B,
+        'average_length': float(lengths.mean()) if n else 0.0,
+        'ivf_lists': n_lists,
+        'stop_words': sorted(ENGLISH_STOP_WORDS),
+        'papers': [str(name) for name in sentences.doc_names],
+    })
+    return index_dir
+
+
+class EvidenceIndex:
+    """
+    Read side of the index, opened on a step 2 directory. Sentence texts are
+    read from the sentence table only for hits, one Parquet row group at a time.
+    """
+
+    def __init__(self, step2_dir):
+        index_dir = os.path.join(step2_dir, EVIDENCE_INDEX_DIR)
+        self.meta = read_metadata(index_dir)
+        self.embeddings = read_array(os.path.join(step2_dir, EMBEDDINGS_FILE))
+        if len(self.embeddings) != self.meta['rows']:
+            raise ValueError(f"Evidence index in '{index_dir}' does not match the step 2 embeddings. "
+                             "Please re-run '05.step2_thematic_analysis.py'.")
+        self.sentences_path = os.path.join(step2_dir, SENTENCES_FILE)
+        self._sentence_table = None
+        self._row_groups = {}
+        self.stop_words = frozenset(self.meta['stop_words'])
+        self.papers = self.meta['papers']
+
+        with np.load(os.path.join(index_dir, POSTINGS_FILE), allow_pickle=False) as f:
+            self.tf_data, self.tf_indices, self.tf_indptr = f['data'], f['indices'], f['indptr']
+            self.lengths = f['lengths']
+        with np.load(os.path.join(index_dir, IVF_FILE), allow_pickle=False) as f:
+            self.centroids, self.list_rows, self.list_offsets = f['centroids'], f['list_rows'], f['list_offsets']
+            self.norms, self.topic_ids, self.topic_vectors = f['norms'], f['topic_ids'], f['topic_vectors']
+        with np.load(os.path.join(index_dir, PROVENANCE_FILE), allow_pickle=False) as f:
+            self.doc_ids, self.pages, self.topics = f['doc_ids'], f['pages'], f['topics']
+
+    def __len__(self):
+        return self.meta['rows']
+
+    # --- Keyword side ---
+
+    def keyword_scores(self, query):
+        """
+        BM25 score of every sentence that contains a query term. Returns (rows, scores).
+        """
+        terms, weights = np.unique(term_hashes(query, self.stop_words, self.meta['hash_features']),
+                                   return_counts=True)
+        n = len(self)
+        k1, b = self.meta['bm25_k1'], self.meta['bm25_b']
+        average_length = self.meta['average_length'] or 1.0
+        all_rows, all_scores = [], []
+        for term, weight in zip(terms.tolist(), weights.tolist()):
+            start, end = self.tf_indptr[term], self.tf_indptr[term + 1]
+            if start == end:
+                continue
+            rows = self.tf_indices[start:end]
+            tf = self.tf_data[start:end]
+            idf = np.log1p((n - (end - start) + 0.5) / ((end - start) + 0.5))
+            norm = k1 * (1 - b + b * self.lengths[rows] / average_length)
+            all_rows.append(rows)
+            all_scores.append(weight * idf * tf * (k1 + 1) / (tf + norm))
+        if not all_rows:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        rows, inverse = np.unique(np.concatenate(all_rows), return_inverse=True)
+        return rows, np.bincount(inverse, weights=np.concatenate(all_scores)).astype(np.float32)
+
+    # --- Vector side ---
+
+    def vector_scores(self, vector, n_probe=N_PROBE, topic=None):
+        """
+        Cosine similarity of 'vector' to the sentences in the 'n_probe' closest
+        IVF lists (only those of 'topic' if given). Returns (rows, scores).
+        """
+        vector = np.asarray(vector, dtype=np.float32).ravel()
+        vector = vector / (np.linalg.norm(vector) + 1e-12)
+        lists = np.argsort(-(self.centroids @ vector), kind='stable')[:n_probe]
+        rows = np.sort(np.concatenate([self.list_rows[self.list_offsets[i]:self.list_offsets[i + 1]] for i in lists]))
+        if topic is not None:
+            rows = rows[self.topics[rows] == topic]
+        scores = np.asarray(self.embeddings[rows], dtype=np.float32) @ vector / (self.norms[rows] + 1e-12)
+        return rows, scores
+
+    def topic_vector(self, topic):
+        """
+        Mean normalized embedding of a topic's sentences (None for an unknown topic).
+        """
+        i = np.searchsorted(self.topic_ids, topic)
+        if i == len(self.topic_ids) or self.topic_ids[i] != topic:
+            return None
+        return self.topic_vectors[i]
+
+    # --- Hybrid search ---
+
+    def search(self, query='', k=10, vector=None, topic=None, n_probe=N_PROBE):
+        """
+        Top-k sentences for a keyword 'query' and/or a query 'vector', fused by
+        reciprocal rank when both are given. 'topic' restricts the hits to the
+        sentences of one topic. Returns hit dicts with provenance.
+        """
+        rankings = {}
+        if query:
+            rows, scores = self.keyword_scores(query)
+            if topic is not None:
+                keep = self.topics[rows] == topic
+                rows, scores = rows[keep], scores[keep]
+            rankings['keyword'] = rows[_top(scores, FUSION_DEPTH)]
+        if vector is not None:
+            rows, scores = self.vector_scores(vector, n_probe, topic)
+            rankings['vector'] = rows[_top(scores, FUSION_DEPTH)]
+        if not rankings:
+            return []
+
+        fused = {}
+        ranks = {}
+        for name, ranked_rows in rankings.items():
+            for rank, row in enumerate(ranked_rows.tolist()):
+                fused[row] = fused.get(row, 0.0) + 1.0 / (RRF_K + rank + 1)
+                ranks.setdefault(row, {})[f"{name}_rank"] = rank + 1
+        best = sorted(fused, key=fused.get, reverse=True)[:k]
+        return [dict(self.provenance(row), score=round(fused[row], 6), **ranks[row]) for row in best]
+
+    def topic_evidence(self, topic, keywords=(), k=5, n_probe=N_PROBE):
+        """
+        Top-k sentences of 'topic': its keywords (BM25) fused with closeness to
+        the topic's centroid, among the sentences assigned to it.
+        """
+        return self.search(' '.join(keywords), k, self.topic_vector(topic), topic, n_probe)
+
+    def provenance(self, row):
+        """
+        Sentence text, paper, page and topic of a row.
+        """
+        return {
+            'row': int(row),
+            'sentence': self.sentence(row),
+            'paper': self.papers[self.doc_ids[row]],
+            'page': int(self.pages[row]),
+            'topic': int(self.topics[row]),
+        }
+
+    def sentence(self, row):
+        """
+        Text of a row, from the row group of the sentence table that holds it.
+        """
+        import pyarrow.parquet as pq
+
+        if self._sentence_table is None:
+            self._sentence_table = pq.ParquetFile(self.sentences_path)
+            metadata = self._sentence_table.metadata
+            self._group_starts = np.cumsum([0] + [metadata.row_group(i).num_rows
+                                                  for i in range(metadata.num_row_groups)])
+        group = int(np.searchsorted(self._group_starts, row, side='right')) - 1
+        if group not in self._row_groups:
+            self._row_groups[group] = self._sentence_table.read_row_group(group, columns=['sentence']).column(0)
+        return str(self._row_groups[group][row - self._group_starts[group]].as_py())
+
+
+def _top(scores, k):
+    """
+    Indices of the 'k' highest scores, best first.
+    """
+    if len(scores) > k:
+        candidates = np.argpartition(-scores, k)[:k]
+        return candidates[np.argsort(-scores[candidates], kind='stable')]
+    return np.argsort(-scores, kind='stable')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Search the step 2 sentences for supporting evidence.")
+    parser.add_argument('query', nargs='?', default='', help="keywords to search for")
+    parser.add_argument('--topic', type=int, default=None, help="only sentences of this topic (with no query: "
+                                                                 "the topic's strongest evidence)")
+    parser.add_argument('-k', type=int, default=10, help="number of sentences (default: 10)")
+    parser.add_argument('--semantic', action='store_true',
+                        help="also rank by embedding similarity to the query (loads the embedding model)")
+    parser.add_argument('--artifact-dir', default=ARTIFACT_DIR, help=f"artifact directory (default: {ARTIFACT_DIR})")
+    args = parser.parse_args(argv)
+    if not args.query and args.topic is None:
+        parser.error("give a query and/or --topic")
+
+    step2_dir = step_dir('step2', args.artifact_dir, create=False)
+    try:
+        index = EvidenceIndex(step2_dir)
+    except FileNotFoundError:
+        print(f"❌ No evidence index in '{step2_dir}'. Please run '05.step2_thematic_analysis.py' first.")
+        return 1
+
+    vector = None
+    if args.semantic and args.query:
+        from embeddings import load_embedding_backend
+        metadata = read_metadata(step2_dir)
+        model = load_embedding_backend(metadata['embedding_model'], metadata.get('embedding_backend', 'torch'))
+        vector = model.encode([args.query], convert_to_numpy=True)[0]
+
+    start = time.perf_counter()
+    if args.query or vector is not None:
+        hits = index.search(args.query, args.k, vector, args.topic)
+    else:
+        metadata = read_metadata(step2_dir)
+        keywords = next((row['Representation'] for row in metadata['topic_info'] if row['Topic'] == args.topic), [])
+        hits = index.topic_evidence(args.topic, keywords, args.k)
+    elapsed_ms = (time.perf_counter() - start) * 1000
+
+    for rank, hit in enumerate(hits, start=1):
+        print(f"{rank:>3}. [{hit['paper']}, p. {hit['page']}, theme {hit['topic']}] {hit['sentence']}")
+    print(f"\n{len(hits)} sentences in {elapsed_ms:.1f} ms ({len(index):,} indexed).")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
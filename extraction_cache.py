@@ -0,0 +1,109 @@
+"""
+Persistent, content-addressed cache for per-PDF text extraction.
+
+Each source PDF is keyed by the SHA-256 of its bytes together with
+EXTRACTOR_VERSION, so renaming a file is free, editing a file re-extracts it,
+and changing the extraction logic invalidates everything at once.
+
+Layout on disk:
+    <cache_dir>/v<EXTRACTOR_VERSION>[-<variant>]/<sha256>.jsonl
+Variants of the same extractor version (raw text, other engines; see
+CACHE_VERSION in step 1) live side by side, so switching a setting back and
+forth does not re-extract anything. Only directories of older extractor
+versions are removed, since their entries can never be used again.
+The first line of each entry holds the PDF's page count, the following lines
+hold its page records (without the source filename, which is filled in on load).
+"""
+import hashlib
+import json
+import os
+import shutil
+
+from page_store import make_page_record
+
+# ⚠️ Bump this whenever the extracted text would change (parser, cleaning, etc.)
+EXTRACTOR_VERSION = 2
+EXTRACTION_CACHE_DIR = '.extraction_cache'
+
+
+def file_content_hash(path, chunk_size=1024 * 1024):
+    """
+    Returns the SHA-256 hex digest of the file at 'path', read in chunks.
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ExtractionCache:
+    """
+    Serves page records for unchanged PDFs and stores them for new ones.
+    """
+
+    def __init__(self, cache_dir=EXTRACTION_CACHE_DIR, version=EXTRACTOR_VERSION):
+        self.cache_dir = cache_dir
+        self.version_dir = os.path.join(cache_dir, f"v{version}")
+        # Directories of other variants of this extractor version are kept (see evict_except)
+        self.version_prefix = f"v{str(version).split('-', 1)[0]}"
+        os.makedirs(self.version_dir, exist_ok=True)
+        self.hits = 0
+        self.misses = 0
+        # Keys of the PDFs looked up in this run (filled in by pdf_extraction.iter_folder_pages)
+        self.seen_keys = set()
+
+    def _entry_path(self, key):
+        return os.path.join(self.version_dir, f"{key}.jsonl")
+
+    def key_for(self, pdf_path):
+        return file_content_hash(pdf_path)
+
+    def has(self, key):
+        return os.path.exists(self._entry_path(key))
+
+    def load(self, key, source):
+        """
+        Returns (page_count, page_records) for a cached entry, tagged with 'source'.
+        """
+        records = []
+        with open(self._entry_path(key), 'r', encoding='utf-8') as f:
+            page_count = json.loads(f.readline())['page_count']
+            for line in f:
+                page, text = json.loads(line)
+                records.append(make_page_record(source, page, text))
+        self.hits += 1
+        return page_count, records
+
+    def store(self, key, page_count, records):
+        """
+        Writes an entry atomically so a crashed run never leaves a partial entry.
+        """
+        path = self._entry_path(key)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(json.dumps({'page_count': page_count}) + '\n')
+            for record in records:
+                f.write(json.dumps([record['page'], record['text']], ensure_ascii=False) + '\n')
+        os.replace(tmp_path, path)
+        self.misses += 1
+
+    def evict_except(self, keep_keys):
+        """
+        Removes this variant's entries for PDFs that are no longer in the
+        folder, plus the cache directories left behind by older extractor
+        versions. Other variants of the current version are left as they are.
+        Returns the number of entries removed.
+        """
+        removed = 0
+        for filename in os.listdir(self.version_dir):
+            key = filename.split('.', 1)[0]
+            if key not in keep_keys:
+                os.remove(os.path.join(self.version_dir, filename))
+                removed += 1
+
+        for dirname in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, dirname)
+            if dirname.split('-', 1)[0] != self.version_prefix and os.path.isdir(path):
+                shutil.rmtree(path)
+        return removed
@@ -0,0 +1,284 @@
+"""
+Fault-isolated PDF extraction workers for step 1.
+
+A concurrent.futures process pool cannot interrupt a task: one PDF on which
+the parser hangs (a native loop in a damaged content stream, a pathological
+page) stalls its worker for good, and a worker that exhausts memory or
+segfaults breaks the whole pool. SupervisedExecutor instead drives its own
+worker processes, one pipe each, and
+  - kills and replaces a worker whose PDF runs past the per-file timeout,
+  - replaces a worker that died (crash, out-of-memory kill) and fails only
+    the PDF it was working on,
+  - caps each worker's address space (RLIMIT_AS), so a runaway PDF raises
+    MemoryError inside its worker instead of swapping the machine,
+  - recycles every worker after a number of files, so memory fragmentation
+    and parser caches do not accumulate over a long run.
+Inside the worker, every page additionally runs under the per-page timeout
+with engine fallback (see pdf_engines.PdfPageReader).
+
+PDFs and pages that could not be extracted are collected in a
+QuarantineReport ('artifacts/step1/quarantine.json').
+"""
+from collections import deque
+import datetime
+import json
+import multiprocessing
+from multiprocessing.connection import wait
+import os
+import time
+
+from pdf_engines import DEFAULT_ENGINES
+
+# Defaults of the step 1 settings (see '04.step1_extract_text.py')
+FILE_TIMEOUT_S = 300
+PAGE_TIMEOUT_S = 30
+WORKER_MEMORY_MB = 2048
+FILES_PER_WORKER = 50
+QUARANTINE_FILENAME = "quarantine.json"
+
+
+class ExtractionFailed(Exception):
+    """
+    A PDF could not be extracted. 'reason' is 'timeout', 'crashed', 'memory' or 'error'.
+    """
+
+    def __init__(self, reason, message):
+        super().__init__(message)
+        self.reason = reason
+
+
+def _worker_main(conn, function, initializer, normalize, engines, page_timeout, memory_mb):
+    """
+    Worker process loop: receives PDF paths, sends back ('ok', result) or
+    (reason, message); None stops it. The result is that of
+    function(pdf_path, normalize, engines, page_timeout), by default
+    extract_pdf_pages' (page_count, records, failed_pages).
+    """
+    if memory_mb:
+        import resource
+
+        limit = memory_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    if function is None:
+        from pdf_extraction import extract_pdf_pages as function
+    if initializer is not None:
+        initializer()
+
+    while True:
+        try:
+            pdf_path = conn.recv()
+        except EOFError:
+            return
+        if pdf_path is None:
+            return
+        try:
+            result = ('ok', function(pdf_path, normalize, engines, page_timeout))
+        except MemoryError:
+            result = ('memory', f"exceeded the worker memory limit of {memory_mb} MB")
+        except Exception as e:
+            result = ('error', f"{type(e).__name__}: {e}")
+        conn.send(result)
+
+
+class ExtractionTask:
+    """
+    A submitted PDF. result() blocks (driving the executor) until it is done.
+    """
+
+    def __init__(self, executor, pdf_path):
+        self.executor = executor
+        self.pdf_path = pdf_path
+        self.done = False
+        self.value = None
+        self.error = None
+
+    def _finish(self, value=None, error=None):
+        self.done = True
+        self.value = value
+        self.error = error
+
+    def result(self):
+        while not self.done:
+            self.executor.poll()
+        if self.error is not None:
+            raise self.error
+        return self.value
+
+
+class _Worker:
+    def __init__(self, context, args):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=_worker_main, args=(child_conn,) + args, daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.task = None
+        self.deadline = None
+        self.files = 0
+
+    def stop(self, kill=False):
+        if not kill and self.process.is_alive():
+            try:
+                self.conn.send(None)
+            except OSError:
+                pass
+            self.process.join(5)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        self.conn.close()
+
+
+class SupervisedExecutor:
+    """
+    Runs extract_pdf_pages for submitted PDFs in 'workers' supervised worker
+    processes (see the module docstring). Use as a context manager.
+
+    'function' replaces extract_pdf_pages (a module-level function with the
+    same parameters, so the spawned workers can import it) and 'initializer'
+    runs once in every new worker. The executor is not thread-safe.
+    """
+
+    def __init__(self, workers, normalize=True, engines=DEFAULT_ENGINES, page_timeout=PAGE_TIMEOUT_S,
+                 file_timeout=FILE_TIMEOUT_S, memory_mb=WORKER_MEMORY_MB, files_per_worker=FILES_PER_WORKER,
+                 function=None, initializer=None):
+        # Spawned (not forked) workers start small, so the memory limit applies to the extraction alone
+        self.context = multiprocessing.get_context('spawn')
+        self.worker_args = (function, initializer, normalize, engines, page_timeout, memory_mb)
+        self.file_timeout = file_timeout
+        self.files_per_worker = files_per_worker
+        self.slots = [None] * max(1, workers)
+        self.queue = deque()
+        self.restarts = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
+
+    def start(self):
+        """
+        Starts all workers now rather than on their first PDF.
+        """
+        for slot, worker in enumerate(self.slots):
+            if worker is None:
+                self.slots[slot] = _Worker(self.context, self.worker_args)
+
+    def submit(self, pdf_path):
+        task = ExtractionTask(self, pdf_path)
+        self.queue.append(task)
+        self._dispatch()
+        return task
+
+    def _dispatch(self):
+        for slot, worker in enumerate(self.slots):
+            if not self.queue:
+                return
+            if worker is not None and worker.task is not None:
+                continue
+            if worker is None or not worker.process.is_alive() or worker.files >= self.files_per_worker:
+                if worker is not None:
+                    worker.stop()
+                worker = self.slots[slot] = _Worker(self.context, self.worker_args)
+            task = self.queue.popleft()
+            worker.task = task
+            worker.deadline = time.monotonic() + self.file_timeout if self.file_timeout else None
+            worker.files += 1
+            try:
+                worker.conn.send(task.pdf_path)
+            except OSError as e:
+                self._replace(slot, ExtractionFailed('crashed', f"worker unavailable: {e}"))
+
+    def _replace(self, slot, error):
+        """
+        Kills the worker in 'slot' and fails its task; a fresh worker is started on the next dispatch.
+        """
+        worker = self.slots[slot]
+        worker.task._finish(error=error)
+        worker.stop(kill=True)
+        self.slots[slot] = None
+        self.restarts += 1
+
+    def poll(self, max_wait=None):
+        """
+        Waits until a busy worker answers, dies or runs out of time (or at
+        most 'max_wait' seconds), and handles it.
+        """
+        busy = {slot: worker for slot, worker in enumerate(self.slots) if worker is not None and worker.task}
+        if not busy:
+            self._dispatch()
+            return
+        deadlines = [worker.deadline for worker in busy.values() if worker.deadline is not None]
+        if max_wait is not None:
+            deadlines.append(time.monotonic() + max_wait)
+        timeout = max(0.0, min(deadlines) - time.monotonic()) if deadlines else None
+        ready = set(wait([worker.conn for worker in busy.values()]
+                         + [worker.process.sentinel for worker in busy.values()], timeout))
+
+        now = time.monotonic()
+        for slot, worker in busy.items():
+            if worker.conn in ready or worker.conn.poll():
+                try:
+                    status, payload = worker.conn.recv()
+                except (EOFError, OSError):
+                    self._replace(slot, self._crash_error(worker))
+                    continue
+                if status == 'ok':
+                    worker.task._finish(payload)
+                else:
+                    worker.task._finish(error=ExtractionFailed(status, payload))
+                worker.task = None
+            elif worker.process.sentinel in ready:
+                self._replace(slot, self._crash_error(worker))
+            elif worker.deadline is not None and now >= worker.deadline:
+                self._replace(slot, ExtractionFailed('timeout', f"no result after {self.file_timeout:g}s"))
+        self._dispatch()
+
+    @staticmethod
+    def _crash_error(worker):
+        worker.process.join(1)
+        code = worker.process.exitcode
+        detail = f"killed by signal {-code}" if code is not None and code < 0 else f"exit code {code}"
+        return ExtractionFailed('crashed', f"worker process died ({detail})")
+
+    def shutdown(self):
+        for task in self.queue:
+            task._finish(error=ExtractionFailed('error', "executor shut down"))
+        self.queue.clear()
+        for slot, worker in enumerate(self.slots):
+            if worker is not None:
+                if worker.task is not None:
+                    worker.task._finish(error=ExtractionFailed('error', "executor shut down"))
+                worker.stop(kill=worker.task is not None)
+                self.slots[slot] = None
+
+
+class QuarantineReport:
+    """
+    PDFs that could not be extracted at all, and pages of otherwise extracted
+    PDFs that no engine could read.
+    """
+
+    def __init__(self):
+        self.files = []
+        self.pages = []
+
+    def add_file(self, source, reason, error):
+        self.files.append({'file': source, 'reason': reason, 'error': error})
+
+    def add_pages(self, source, failed_pages):
+        self.pages.extend({'file': source, **page} for page in failed_pages)
+
+    def write(self, path):
+        report = {
+            'created': datetime.datetime.now().isoformat(timespec='seconds'),
+            'quarantined_files': len(self.files),
+            'failed_pages': len(self.pages),
+            'files': self.files,
+            'pages': self.pages,
+        }
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, path)
+        return path
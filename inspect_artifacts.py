@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Prints an overview of the pipeline artifacts (extraction metrics, analysis
+details, top themes, table and array sizes, recorded stage runs).
+
+Only reads metadata: no PDF, NLP or ML library is imported, so it starts in a
+fraction of a second.
+
+Usage:
+    python inspect_artifacts.py              # overview of artifacts/
+    python inspect_artifacts.py --topics 20  # show more themes
+    python inspect_artifacts.py --json       # machine-readable output
+"""
+import argparse
+import json
+import os
+import sys
+
+from artifacts import (ARTIFACT_DIR, EMBEDDINGS_FILE, PAGES_FILE, SENTENCES_FILE, ArtifactVersionError,
+                       read_array, read_metadata, step_dir)
+from evidence_index import EVIDENCE_INDEX_DIR
+from run_pipeline import STATE_FILE, load_state
+
+
+def _load_step(directory):
+    try:
+        return read_metadata(directory)
+    except FileNotFoundError:
+        return None
+    except ArtifactVersionError as e:
+        return {'error': str(e)}
+
+
+def parquet_row_count(path):
+    """
+    Row count from the Parquet footer (no data is read).
+    """
+    import pyarrow.parquet as pq
+    return pq.ParquetFile(path).metadata.num_rows
+
+
+def summarize_artifacts(root, top_topics=10):
+    """
+    Returns a dict describing the artifacts under 'root'.
+    """
+    summary = {'artifact_dir': os.path.abspath(root)}
+
+    step1_dir = step_dir('step1', root, create=False)
+    step1 = _load_step(step1_dir)
+    if step1 is not None and 'error' not in step1:
+        pages_path = os.path.join(step1_dir, step1.get('page_store', PAGES_FILE))
+        step1['page_store_mb'] = round(os.path.getsize(pages_path) / 2 ** 20, 2) if os.path.exists(pages_path) else None
+    summary['step1'] = step1
+
+    step2_dir = step_dir('step2', root, create=False)
+    step2 = _load_step(step2_dir)
+    if step2 is not None and 'error' not in step2:
+        topic_info = step2.pop('topic_info', [])
+        step2['themes'] = sum(1 for row in topic_info if row['Topic'] != -1)
+        step2['top_topics'] = [{key: row[key] for key in ('Topic', 'Count', 'Name')} for row in topic_info[:top_topics]]
+
+        sentences_path = os.path.join(step2_dir, SENTENCES_FILE)
+        if os.path.exists(sentences_path):
+            step2['sentence_rows'] = parquet_row_count(sentences_path)
+        embeddings_path = os.path.join(step2_dir, EMBEDDINGS_FILE)
+        if os.path.exists(embeddings_path):
+            embeddings = read_array(embeddings_path)
+            step2['embeddings'] = {'shape': list(embeddings.shape), 'dtype': str(embeddings.dtype)}
+        index = _load_step(os.path.join(step2_dir, EVIDENCE_INDEX_DIR))
+        if index is not None and 'error' not in index:
+            step2['evidence_index'] = {key: index[key] for key in ('rows', 'ivf_lists')}
+    summary['step2'] = step2
+
+    summary['stages'] = load_state(os.path.join(root, STATE_FILE))
+    return summary
+
+
+def print_summary(summary):
+    print(f"--- Artifacts in '{summary['artifact_dir']}' ---")
+
+    step1 = summary['step1']
+    print("\nStep 1 (extraction):")
+    if step1 is None:
+        print("   ❌ Not run yet.")
+    elif 'error' in step1:
+        print(f"   ❌ {step1['error']}")
+    else:
+        print(f"   Source: {step1['source_description']}")
+        print(f"   Pages: {step1['total_pages']:,}   Words: {step1['word_count']:,}   Characters: {step1['char_count']:,}")
+        print(f"   Page store: {step1['page_store_mb']} MB   Extracted: {step1['timestamp']}")
+
+    step2 = summary['step2']
+    print("\nStep 2 (thematic analysis):")
+    if step2 is None:
+        print("   ❌ Not run yet.")
+    elif 'error' in step2:
+        print(f"   ❌ {step2['error']}")
+    else:
+        print(f"   Sentences analyzed: {step2['sentences_analyzed']:,}   Themes: {step2['themes']}")
+        print(f"   Embeddings: {step2.get('embedding_model')} ({step2.get('embedding_backend')})"
+              + (f", {step2['embeddings']['shape']} {step2['embeddings']['dtype']}" if 'embeddings' in step2 else ''))
+        if step2.get('evidence_index'):
+            index = step2['evidence_index']
+            print(f"   Evidence index: {index['rows']:,} sentences, {index['ivf_lists']:,} vector lists")
+        if step2.get('keyword_vocabulary'):
+            print(f"   Keyword vocabulary: {step2['keyword_vocabulary']:,} terms ({step2.get('topic_vectorizer')})")
+        if step2.get('deduplication'):
+            dedup = step2['deduplication']
+            print(f"   Deduplication: {dedup['sentences_total']:,} -> {dedup['sentences_kept']:,} sentences")
+        if step2.get('topic_quality'):
+            quality = step2['topic_quality']
+            print(f"   Topic quality ({step2.get('topic_engine')}): coherence (NPMI) {quality['coherence_npmi']}, "
+                  f"diversity {quality['diversity']}, outlier ratio {quality['outlier_ratio']}")
+        print(f"   Analyzed: {step2.get('analysis_timestamp')}")
+        if step2['top_topics']:
+            print("\n   Topic   Count   Name")
+            for row in step2['top_topics']:
+                print(f"   {row['Topic']:>5}  {row['Count']:>6}   {row['Name']}")
+
+    if summary['stages']:
+        print("\nRecorded stage runs (run_pipeline.py):")
+        for name, record in summary['stages'].items():
+            print(f"   {name:<12} {record.get('finished')}   {record.get('wall_s')}s")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Show an overview of the pipeline artifacts.")
+    parser.add_argument('--artifact-dir', default=ARTIFACT_DIR, help=f"artifact directory (default: {ARTIFACT_DIR})")
+    parser.add_argument('--topics', type=int, default=10, help="number of themes to list (default: 10)")
+    parser.add_argument('--json', action='store_true', help="print the overview as JSON")
+    args = parser.parse_args(argv)
+
+    summary = summarize_artifacts(args.artifact_dir, args.topics)
+    if args.json:
+        print(json.dumps(summary, indent=2, ensure_ascii=False))
+    else:
+        print_summary(summary)
+    return 0 if summary['step1'] is not None else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,148 @@
+"""
+Large-corpus mode for step 2: fit on a sample, assign the rest in batches.
+
+Fitting UMAP + HDBSCAN needs memory for every fitted sentence at once (the
+neighbour graph, the reduced embeddings and the cluster tree come on top of
+the embeddings themselves). In this mode the topic model is fitted on a
+sample stratified by paper, and all other sentences are then assigned to the
+fitted topics in batches. Their embeddings are read from the memory-mapped
+embeddings.npy, a batch at a time, and the topic keywords (c-TF-IDF) are
+computed from per-topic term counts that are accumulated batch by batch.
+
+Both the sample size and the batch size follow from a memory budget (see
+plan_large_corpus), so the peak memory of the modeling stages does not grow
+with the corpus. The rest of step 2 still holds a few fixed-size values per
+sentence: its byte offsets, paper and page (segmentation.SentenceIndex; the
+text itself stays on disk), its 16-byte key, weight, topic and embedding
+cache row, about 80 bytes in all. Cache lookups search sorted keys on disk
+(embeddings.EmbeddingCache). Deduplication additionally holds a 256-byte
+MinHash signature per distinct sentence while it runs.
+"""
+import numpy as np
+
+# Rough peak bytes per sentence, in multiples of its float32 embedding:
+# fitting holds the embedding, the UMAP graph, the reduced vectors and the HDBSCAN tree,
+# transforming only the embedding batch, its neighbours and the sentence texts.
+FIT_MEMORY_FACTOR = 12
+TRANSFORM_MEMORY_FACTOR = 4
+# Share of the budget reserved for the fit; batches use a quarter, the rest is headroom
+FIT_BUDGET_SHARE = 0.5
+BATCH_BUDGET_SHARE = 0.25
+# Smallest sample worth fitting and smallest assignment batch
+MIN_FIT_SAMPLE = 5000
+MIN_BATCH_SIZE = 1000
+# Keywords kept per topic (as in BERTopic's topic_info)
+KEYWORDS_PER_TOPIC = 10
+# Topics weighted per c-TF-IDF chunk
+CTFIDF_CHUNK_TOPICS = 64
+
+
+def plan_large_corpus(n_sentences, dim, memory_budget_mb, sample_size=None):
+    """
+    Returns (sample_size, batch_size) for a corpus of 'n_sentences' embeddings
+    of dimension 'dim'. A sample size equal to 'n_sentences' means the whole
+    corpus fits the budget and no sampling is needed.
+    """
+    budget = memory_budget_mb * 2 ** 20
+    embedding_bytes = dim * np.dtype(np.float32).itemsize
+    if not sample_size:
+        sample_size = max(MIN_FIT_SAMPLE, int(budget * FIT_BUDGET_SHARE / (embedding_bytes * FIT_MEMORY_FACTOR)))
+    batch_size = max(MIN_BATCH_SIZE, int(budget * BATCH_BUDGET_SHARE / (embedding_bytes * TRANSFORM_MEMORY_FACTOR)))
+    return min(sample_size, n_sentences), batch_size
+
+
+def stratified_sample(doc_ids, sample_size, seed=42):
+    """
+    Returns the sorted rows of a random sample of 'sample_size' sentences in
+    which every paper is represented in proportion to its sentence count
+    (and by at least one sentence, so small papers are not lost).
+    """
+    doc_ids = np.asarray(doc_ids)
+    if sample_size >= len(doc_ids):
+        return np.arange(len(doc_ids))
+
+    rng = np.random.default_rng(seed)
+    # Shuffle, then group by paper: the first k rows of each group are a random pick from that paper
+    order = rng.permutation(len(doc_ids))
+    order = order[np.argsort(doc_ids[order], kind='stable')]
+    _, group_starts, group_sizes = np.unique(doc_ids[order], return_index=True, return_counts=True)
+
+    quotas = np.maximum(1, np.floor(group_sizes * (sample_size / len(doc_ids)))).astype(np.int64)
+    # Hand out the rows lost to rounding, largest remainders first
+    shortfall = sample_size - quotas.sum()
+    if shortfall > 0:
+        remainders = group_sizes * (sample_size / len(doc_ids)) - quotas
+        room = group_sizes - quotas
+        for group in np.argsort(-remainders, kind='stable'):
+            if shortfall <= 0:
+                break
+            extra = min(room[group], shortfall)
+            quotas[group] += extra
+            shortfall -= extra
+
+    rank_in_group = np.arange(len(order)) - np.repeat(group_starts, group_sizes)
+    return np.sort(order[rank_in_group < np.repeat(quotas, group_sizes)])
+
+
+def iter_batches(rows, batch_size):
+    """
+    Splits 'rows' into consecutive batches.
+    """
+    for start in range(0, len(rows), batch_size):
+        yield rows[start:start + batch_size]
+
+
+def transform_in_batches(topic_model, sentences, embeddings, rows, batch_size):
+    """
+    Assigns the sentences at 'rows' to the fitted topics, 'batch_size'
+    sentences at a time. Only one batch of texts and embeddings is in memory
+    at any time. Returns their topics in the order of 'rows'.
+    """
+    topics = np.empty(len(rows), dtype=np.int64)
+    done = 0
+    for batch in iter_batches(rows, batch_size):
+        batch_topics, _ = topic_model.transform(sentences.texts(batch),
+                                                embeddings=np.asarray(embeddings[batch], dtype=np.float32))
+        topics[done:done + len(batch)] = batch_topics
+        done += len(batch)
+    return topics
+
+
+def topic_term_counts(vectorizer, sentences, topics, n_topics, batch_size):
+    """
+    Sums the term counts of all sentences per topic with a fitted vectorizer
+    (its vocabulary stays fixed), one batch of sentences at a time.
+    Returns a (1 + n_topics) x vocabulary CSR matrix; row 0 holds the outliers.
+    """
+    from scipy import sparse
+
+    topics = np.asarray(topics, dtype=np.int64)
+    counts = None
+    for batch in iter_batches(np.arange(len(topics)), batch_size):
+        term_counts = vectorizer.transform(sentences.texts(batch))
+        membership = sparse.csr_matrix(
+            (np.ones(len(batch), dtype=np.int64), (topics[batch] + 1, np.arange(len(batch)))),
+            shape=(n_topics + 1, len(batch))
+        )
+        batch_counts = membership @ term_counts
+        counts = batch_counts if counts is None else counts + batch_counts
+    return counts.tocsr()
+
+
+def ctfidf_keywords(ctfidf_model, counts, vocabulary, top_n=KEYWORDS_PER_TOPIC, chunk_topics=CTFIDF_CHUNK_TOPICS):
+    """
+    Weights per-topic term counts with the model's c-TF-IDF transformer and
+    returns {topic: [top keywords]} (topics with no terms get an empty list).
+    The weights stay sparse and are computed 'chunk_topics' topics at a time
+    (the transformer weighs each topic row on its own once fitted).
+    """
+    ctfidf_model.fit(counts)
+    keywords = {}
+    for first in range(0, counts.shape[0], chunk_topics):
+        weights = ctfidf_model.transform(counts[first:first + chunk_topics]).tocsr()
+        for row in range(weights.shape[0]):
+            start, end = weights.indptr[row], weights.indptr[row + 1]
+            scores, terms = weights.data[start:end], weights.indices[start:end]
+            best = np.argsort(-scores, kind='stable')[:top_n]
+            keywords[first + row - 1] = [str(vocabulary[terms[i]]) for i in best if scores[i] > 0]
+    return keywords
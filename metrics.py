@@ -0,0 +1,147 @@
+"""
+Per-stage instrumentation for the pipeline steps.
+
+Wrap a stage in 'with stage("embed") as record:' and a JSON line is appended to
+the metrics file when it finishes:
+    {"run_id": ..., "step": "step2", "stage": "embed", "parent": null,
+     "wall_s": ..., "cpu_s": ..., "rss_mb": ..., "peak_rss_mb": ...,
+     "children_peak_rss_mb": ..., "items": ...}
+Stages nest ('parent' names the enclosing stage), and set record['items'] to
+count what a stage processed. Library internals such as UMAP.fit can be timed
+as sub-stages with instrument(). cpu_s includes worker processes that have
+finished; peak RSS values are high-water marks since the process started.
+
+Configuration (environment variables):
+    PIPELINE_METRICS_FILE   JSONL output file (default 'pipeline_metrics.jsonl', '' disables)
+    PIPELINE_RUN_ID         groups the records of one pipeline run (default: start time)
+    PIPELINE_PROFILE        set to '1' to also dump a cProfile of each step to PIPELINE_PROFILE_DIR
+"""
+from contextlib import contextmanager
+import datetime
+import functools
+import json
+import os
+import time
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+METRICS_FILE = os.environ.get('PIPELINE_METRICS_FILE', 'pipeline_metrics.jsonl')
+RUN_ID = os.environ.get('PIPELINE_RUN_ID') or datetime.datetime.now().strftime('%Y%m%dT%H%M%S')
+PROFILE = os.environ.get('PIPELINE_PROFILE', '0') == '1'
+PROFILE_DIR = os.environ.get('PIPELINE_PROFILE_DIR', 'profiles')
+
+_step = None
+_stack = []
+_summary = []
+_profiler = None
+
+
+def _cpu_seconds():
+    if resource is None:
+        return time.process_time()
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime
+
+
+def _current_rss_mb():
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return round(int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2 ** 20, 1)
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def _peak_rss_mb(who):
+    if resource is None:
+        return None
+    # ru_maxrss is reported in KiB on Linux
+    return round(resource.getrusage(who).ru_maxrss / 1024, 1)
+
+
+def _write(record):
+    if METRICS_FILE:
+        with open(METRICS_FILE, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record) + '\n')
+
+
+def start_step(step):
+    """
+    Marks the start of a pipeline step ('step1', 'step2', ...) and starts the
+    profiler if PIPELINE_PROFILE is set.
+    """
+    global _step, _profiler
+    _step = step
+    if PROFILE:
+        import cProfile
+        _profiler = cProfile.Profile()
+        _profiler.enable()
+
+
+def finish_step():
+    """
+    Stops the profiler (writing its dump) and prints the top-level stage timings.
+    """
+    global _profiler
+    if _profiler is not None:
+        _profiler.disable()
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        profile_path = os.path.join(PROFILE_DIR, f"{_step}-{RUN_ID}.prof")
+        _profiler.dump_stats(profile_path)
+        _profiler = None
+        print(f"⏱  Profile written to '{profile_path}' (open with 'python -m pstats' or snakeviz).")
+
+    if _summary:
+        timings = ', '.join(f"{name} {wall:.1f}s" for name, wall in _summary)
+        print(f"⏱  Stage timings ({_step}): {timings}")
+        _summary.clear()
+
+
+@contextmanager
+def stage(name, items=None):
+    """
+    Times a stage and appends its metrics record when it ends (also on errors).
+    Yields the record so the stage can fill in 'items' once it knows the count.
+    """
+    record = {
+        'run_id': RUN_ID,
+        'step': _step,
+        'stage': name,
+        'parent': _stack[-1] if _stack else None,
+        'items': items,
+    }
+    _stack.append(name)
+    wall_start = time.perf_counter()
+    cpu_start = _cpu_seconds()
+    try:
+        yield record
+    finally:
+        _stack.pop()
+        record['wall_s'] = round(time.perf_counter() - wall_start, 4)
+        record['cpu_s'] = round(_cpu_seconds() - cpu_start, 4)
+        record['rss_mb'] = _current_rss_mb()
+        record['peak_rss_mb'] = _peak_rss_mb(resource.RUSAGE_SELF) if resource else None
+        record['children_peak_rss_mb'] = _peak_rss_mb(resource.RUSAGE_CHILDREN) if resource else None
+        record['finished'] = datetime.datetime.now().isoformat(timespec='seconds')
+        _write(record)
+        if record['parent'] is None:
+            _summary.append((name, record['wall_s']))
+
+
+def instrument(obj, method_name, stage_name):
+    """
+    Times every call of obj.method_name as a sub-stage, without changing the
+    object's type (the bound method is shadowed on this instance only).
+    """
+    method = getattr(obj, method_name)
+
+    @functools.wraps(method)
+    def timed(*args, **kwargs):
+        with stage(stage_name):
+            return method(*args, **kwargs)
+
+    setattr(obj, method_name, timed)
+    return obj
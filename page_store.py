@@ -0,0 +1,53 @@
+"""
+Page store shared by the pipeline steps.
+
+Step 1 writes one record per extracted page (source PDF, page number, text) to a
+JSON Lines file as the pages are produced, and later steps stream the records
+back one page at a time. Nothing here ever holds more than a single page of text
+in memory, so peak RSS stays flat regardless of the corpus size.
+"""
+import json
+import os
+
+
+def make_page_record(source, page, text):
+    """
+    Builds a single page record.
+    'source' is the PDF filename, 'page' is the 1-based page number within it.
+    """
+    return {'source': source, 'page': page, 'text': text}
+
+
+def write_page_store(records, path):
+    """
+    Writes page records to 'path' as they are yielded by 'records'.
+
+    The store is written to a temporary file first and renamed at the end, so an
+    interrupted run never leaves a half-written store behind for the next step.
+    Returns running totals: (pages_written, word_count, char_count).
+    """
+    tmp_path = path + '.tmp'
+    pages_written = 0
+    word_count = 0
+    char_count = 0
+
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        for record in records:
+            f.write(json.dumps(record, ensure_ascii=False))
+            f.write('\n')
+            pages_written += 1
+            word_count += len(record['text'].split())
+            char_count += len(record['text'])
+
+    os.replace(tmp_path, path)
+    return pages_written, word_count, char_count
+
+
+def iter_page_store(path):
+    """
+    Streams page records back from the store, one page at a time.
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
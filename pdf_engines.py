@@ -0,0 +1,182 @@
+"""
+Text extraction engines for step 1.
+
+  - 'pypdf':   pure-Python parser, always available (the reference engine).
+  - 'pymupdf': MuPDF's native parser (optional 'pymupdf' package); several
+               times faster and more tolerant of damaged files, with slightly
+               different whitespace in the extracted text.
+Engines are tried per page in the configured order (EXTRACTION_ENGINES, e.g.
+'pymupdf,pypdf'): if an engine raises or runs past the page timeout on a
+page, or returns no text for it, the next engine is tried for that page only.
+Pages on which every engine failed are reported (see PdfPageReader.failed_pages).
+
+The page timeout uses SIGALRM, so it interrupts Python code (pypdf) but not a
+native call that never returns; the supervised extraction workers (see
+extraction_workers.py) enforce a per-file timeout for that.
+"""
+from contextlib import contextmanager
+import importlib.util
+import signal
+import threading
+
+PDF_ENGINES = ('pypdf', 'pymupdf')
+DEFAULT_ENGINES = ('pypdf',)
+
+
+class PageTimeout(Exception):
+    pass
+
+
+@contextmanager
+def time_limit(seconds):
+    """
+    Raises PageTimeout in the enclosed block after 'seconds'. Does nothing for
+    a falsy limit, outside the main thread or where SIGALRM does not exist.
+    """
+    if not seconds or not hasattr(signal, 'SIGALRM') or threading.current_thread() is not threading.main_thread():
+        yield
+        return
+
+    def on_alarm(signum, frame):
+        raise PageTimeout(f"no result after {seconds:g}s")
+
+    previous = signal.signal(signal.SIGALRM, on_alarm)
+    signal.setitimer(signal.ITIMER_REAL, seconds)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+
+class PypdfDocument:
+    def __init__(self, pdf_path):
+        from pypdf import PdfReader
+
+        self.file = open(pdf_path, 'rb')
+        try:
+            self.reader = PdfReader(self.file)
+            if self.reader.is_encrypted:
+                self.reader.decrypt('')
+            self.page_count = len(self.reader.pages)
+        except BaseException:
+            self.file.close()
+            raise
+
+    def page_text(self, index):
+        return self.reader.pages[index].extract_text() or ''
+
+    def close(self):
+        self.file.close()
+
+
+class PymupdfDocument:
+    def __init__(self, pdf_path):
+        try:
+            import pymupdf
+        except ImportError:
+            import fitz as pymupdf  # releases before 1.24
+
+        self.document = pymupdf.open(pdf_path)
+        if self.document.needs_pass:
+            self.document.authenticate('')
+        self.page_count = self.document.page_count
+
+    def page_text(self, index):
+        return self.document.load_page(index).get_text() or ''
+
+    def close(self):
+        self.document.close()
+
+
+ENGINE_DOCUMENTS = {'pypdf': PypdfDocument, 'pymupdf': PymupdfDocument}
+
+
+def parse_engines(spec):
+    """
+    Engine names from a comma-separated setting, in fallback order.
+    """
+    engines = tuple(name.strip() for name in spec.split(',') if name.strip())
+    unknown = [name for name in engines if name not in PDF_ENGINES]
+    if unknown or not engines:
+        raise ValueError(f"Unknown extraction engine(s) {', '.join(unknown) or spec!r} "
+                         f"(expected a comma-separated list of {', '.join(PDF_ENGINES)}).")
+    return engines
+
+
+def available_engines(engines):
+    """
+    The engines whose library is installed (pypdf is a requirement; pymupdf is optional).
+    """
+    installed = tuple(name for name in engines
+                      if name != 'pymupdf' or importlib.util.find_spec('pymupdf') or importlib.util.find_spec('fitz'))
+    if not installed:
+        raise ImportError(f"None of the extraction engines {', '.join(engines)} is installed "
+                          f"(pip install pymupdf, or use 'pypdf').")
+    return installed
+
+
+class PdfPageReader:
+    """
+    Page texts of one PDF with per-page engine fallback. Documents are opened
+    lazily, so a fallback engine only parses the file if it is needed.
+    """
+
+    def __init__(self, pdf_path, engines=DEFAULT_ENGINES, page_timeout=None):
+        self.pdf_path = pdf_path
+        self.engines = engines
+        self.page_timeout = page_timeout
+        self.documents = {}
+        self.open_errors = {}
+        self.open_exception = None
+        self.failed_pages = []      # {'page', 'errors': {engine: error}} for pages no engine could read
+        self.fallback_pages = 0     # pages read by a later engine after an earlier one failed
+
+        for name in engines:
+            if self._document(name) is not None:
+                self.page_count = self.documents[name].page_count
+                break
+        else:
+            # No engine could open the file: re-raise the first engine's error (e.g. FileNotFoundError)
+            raise self.open_exception
+
+    def _document(self, name):
+        if name not in self.documents and name not in self.open_errors:
+            try:
+                with time_limit(self.page_timeout):
+                    self.documents[name] = ENGINE_DOCUMENTS[name](self.pdf_path)
+            except MemoryError:
+                raise  # the worker's memory limit applies to the whole file, not one engine
+            except Exception as e:
+                self.open_errors[name] = f"{type(e).__name__}: {e}"
+                self.open_exception = self.open_exception or e
+        return self.documents.get(name)
+
+    def page_text(self, index):
+        """
+        Text of page 'index' (0-based) from the first engine that returns any.
+        """
+        errors = {}
+        for name in self.engines:
+            document = self._document(name)
+            if document is None or index >= document.page_count:
+                continue
+            try:
+                with time_limit(self.page_timeout):
+                    text = document.page_text(index)
+            except MemoryError:
+                raise
+            except Exception as e:
+                errors[name] = f"{type(e).__name__}: {e}"
+                continue
+            if text.strip():
+                if errors:
+                    self.fallback_pages += 1
+                return text
+        if errors and len(errors) == len(self.documents):
+            self.failed_pages.append({'page': index + 1, 'errors': errors})
+        return ''
+
+    def close(self):
+        for document in self.documents.values():
+            document.close()
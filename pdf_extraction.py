@@ -0,0 +1,181 @@
+"""
+PDF text extraction helpers shared by the pipeline steps.
+
+Two extraction modes are supported:
+  - 'merged': parse the single merged PDF written by '02.merge_pdfs.py'.
+  - 'folder': parse every source PDF in the folder directly, in numerical
+    filename order, spread across a process pool. No merged PDF is needed.
+
+Both modes yield the same page records (see page_store.make_page_record).
+Pages are read with the configured engines (see pdf_engines.py); in 'folder'
+mode every PDF is extracted in a supervised worker process (see
+extraction_workers.py), so a PDF that hangs or exhausts memory is quarantined
+instead of stalling the run.
+"""
+from collections import deque
+import glob
+import os
+import re
+
+from extraction_workers import ExtractionFailed, SupervisedExecutor
+from page_store import make_page_record
+from pdf_engines import DEFAULT_ENGINES, PdfPageReader
+from text_normalization import PageNormalizer
+
+MERGED_PDF_FILENAME = "merged_document_for_analysis.pdf"
+
+
+# --- Custom Sorting Function for Numerical Order ---
+def numerical_sort_key(filepath):
+    """
+    Extracts the leading number from the filename for correct numerical sorting.
+    e.g., "110.pdf" -> 110, "3.pdf" -> 3
+    """
+    filename = os.path.basename(filepath)
+    # Match one or more digits at the start of the filename
+    match = re.match(r'(\d+)', filename)
+    if match:
+        # Convert the matched string (e.g., "10") to an integer (10)
+        return int(match.group(1))
+    # For files without a leading number, push them to the end of the list
+    return float('inf')
+
+
+def list_source_pdfs(folder_path):
+    """
+    Lists the individual PDFs in 'folder_path' in numerical ascending order,
+    leaving out the merged output file if it exists.
+    """
+    all_files = glob.glob(os.path.join(folder_path, "*.pdf"))
+    pdf_paths = [f for f in all_files if os.path.basename(f) != MERGED_PDF_FILENAME]
+    # Ties (and files without a leading number) fall back to the filename so the order is stable
+    pdf_paths.sort(key=lambda f: (numerical_sort_key(f), os.path.basename(f)))
+    return pdf_paths
+
+
+def iter_pdf_pages(pdf_path, page_counter=None, normalize=True, engines=DEFAULT_ENGINES, page_timeout=None,
+                   failed_pages=None, document_starts=None):
+    """
+    Yields one page record per non-empty page of 'pdf_path'.
+    If given, 'page_counter["total"]' is increased by the PDF's page count,
+    including pages that yielded no text. With 'normalize', the page text is
+    cleaned and reference sections are dropped (see text_normalization.py);
+    otherwise line breaks are only replaced by spaces. Pages that no engine
+    could read are appended to 'failed_pages' (if given) once all pages are read.
+
+    A references section carries over to the following pages of the same
+    document only. 'document_starts' are the page numbers at which the source
+    documents of a merged PDF begin (normalization restarts there); None means
+    'pdf_path' is a single document, and an empty collection that the
+    boundaries are unknown, so no page inherits the state of the one before.
+    """
+    source = os.path.basename(pdf_path)
+    reader = PdfPageReader(pdf_path, engines, page_timeout)
+    try:
+        if page_counter is not None:
+            page_counter['total'] += reader.page_count
+        normalizer = PageNormalizer() if normalize else None
+        for page_number in range(1, reader.page_count + 1):
+            if normalizer and page_number > 1 and document_starts is not None and (
+                    not document_starts or page_number in document_starts):
+                normalizer = PageNormalizer()
+            page_text = reader.page_text(page_number - 1)
+            if page_text:
+                page_text = normalizer.normalize(page_text) if normalizer else page_text.replace('\n', ' ')
+            if page_text:
+                yield make_page_record(source, page_number, page_text)
+    finally:
+        reader.close()
+    if failed_pages is not None:
+        failed_pages.extend(reader.failed_pages)
+
+
+def extract_pdf_pages(pdf_path, normalize=True, engines=DEFAULT_ENGINES, page_timeout=None):
+    """
+    Extracts (and normalizes) a whole PDF in one go. Runs inside the worker processes.
+    Returns (page_count, page_records, failed_pages).
+    """
+    page_counter = {'total': 0}
+    failed_pages = []
+    records = list(iter_pdf_pages(pdf_path, page_counter, normalize, engines, page_timeout, failed_pages))
+    return page_counter['total'], records, failed_pages
+
+
+def iter_folder_pages(pdf_paths, workers=None, page_counter=None, cache=None, normalize=True,
+                      engines=DEFAULT_ENGINES, limits=None, quarantine=None):
+    """
+    Extracts 'pdf_paths' in supervised worker processes and yields their page
+    records in the order of 'pdf_paths', regardless of which worker finishes first.
+
+    Only a small window of PDFs is in flight at any time, so memory stays bounded
+    by a few documents rather than growing with the corpus.
+
+    If an ExtractionCache is given, unchanged PDFs are served from it and only
+    new or modified PDFs are sent to the workers. The content keys of all
+    PDFs seen are collected in 'cache.seen_keys' for eviction afterwards.
+    PDFs with pages that could not be read are not cached, so they are retried
+    on the next run.
+
+    'limits' are the SupervisedExecutor limits (page_timeout, file_timeout,
+    memory_mb, files_per_worker). PDFs that fail, time out or take their
+    worker down, and pages no engine could read, are recorded in
+    'quarantine' (a QuarantineReport) if given.
+    """
+    workers = workers or os.cpu_count() or 1
+    max_in_flight = workers * 2
+    pending = deque()
+    paths = iter(pdf_paths)
+
+    with SupervisedExecutor(workers, normalize, engines, **(limits or {})) as executor:
+
+        def schedule_next():
+            """Queues the next PDF: cached ones resolve immediately, others go to a worker."""
+            for pdf_path in paths:
+                key = None
+                if cache is not None:
+                    try:
+                        key = cache.key_for(pdf_path)
+                    except OSError:
+                        # Unreadable or gone: submitted uncached, so its worker failure quarantines it
+                        key = None
+                    else:
+                        cache.seen_keys.add(key)
+                        if cache.has(key):
+                            pending.append((pdf_path, key, None))
+                            return True
+                pending.append((pdf_path, key, executor.submit(pdf_path)))
+                return True
+            return False
+
+        while len(pending) < max_in_flight and schedule_next():
+            pass
+
+        while pending:
+            done_path, key, future = pending.popleft()
+            # Keep the window full before handing the finished document downstream
+            schedule_next()
+            source = os.path.basename(done_path)
+            try:
+                if future is None:
+                    page_count, records = cache.load(key, source)
+                else:
+                    page_count, records, failed_pages = future.result()
+                    if failed_pages:
+                        print(f"  - ⚠ Warning: {len(failed_pages)} page(s) of {source} could not be read.")
+                        if quarantine is not None:
+                            quarantine.add_pages(source, failed_pages)
+                    elif key is not None:
+                        cache.store(key, page_count, records)
+            except ExtractionFailed as e:
+                print(f"  - ⚠ Warning: Could not extract {source} ({e.reason}). Skipping. Error: {e}")
+                if quarantine is not None:
+                    quarantine.add_file(source, e.reason, str(e))
+                continue
+            except Exception as e:
+                print(f"  - ⚠ Warning: Could not extract {source}. Skipping. Error: {e}")
+                if quarantine is not None:
+                    quarantine.add_file(source, 'error', f"{type(e).__name__}: {e}")
+                continue
+            if page_counter is not None:
+                page_counter['total'] += page_count
+            yield from records
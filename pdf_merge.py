@@ -0,0 +1,293 @@
+"""
+Bounded-memory PDF merging for '02.merge_pdfs.py'.
+
+pypdf's PdfWriter keeps every appended page (and everything it references)
+in memory until the merged file is written, so its memory grows with the
+corpus. StreamingPdfMerger instead copies one source PDF at a time: the
+objects reachable from its pages are renumbered and written straight to the
+output file, and only their byte offsets (for the cross-reference table) and
+the new page references are kept. Peak memory is bounded by the largest
+single source PDF.
+
+Every source PDF is validated in parallel before anything is merged (see
+validate_pdfs), so damaged or encrypted files are reported up front and left
+out of the merge instead of failing it halfway. Validation only resolves the
+page contents, so a file can still fail while its fonts, images or
+annotations are copied; its partly written objects are then discarded and
+the file is skipped like one that failed validation.
+
+The writer copies stream data as it is stored (still encoded), which pypdf
+only exposes as a private attribute; _raw_stream_data checks it, and
+requirements.txt pins the pypdf versions it is known to work with.
+
+The merge can also (or instead) be described by a manifest, a small JSON file
+listing every merged file with its page range in the merged document; step 1
+extracts the listed files directly when no merged PDF was written.
+"""
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import datetime
+import json
+import os
+
+MERGE_MANIFEST_FILENAME = "merged_document_for_analysis.manifest.json"
+
+# Object numbers of the merged document's catalog and page tree root (written last)
+CATALOG_ID = 1
+PAGES_ID = 2
+
+
+def _raw_stream_data(stream):
+    """
+    The stored (still encoded) bytes of a pypdf stream object. pypdf has no
+    public accessor for them, so the private attribute is checked here.
+    """
+    data = getattr(stream, '_data', None)
+    if not isinstance(data, bytes):
+        import pypdf
+
+        raise RuntimeError(f"pypdf {pypdf.__version__} does not expose raw stream data as StreamObject._data; "
+                           f"install a version allowed by requirements.txt.")
+    return data
+
+
+def validate_pdf(pdf_path):
+    """
+    Opens 'pdf_path' and resolves every page. Runs inside the worker
+    processes. Returns {'path', 'pages', 'error'} ('error' is None for a
+    usable PDF).
+    """
+    from pypdf import PdfReader
+
+    try:
+        with open(pdf_path, 'rb') as f:
+            reader = PdfReader(f)
+            if reader.is_encrypted and not reader.decrypt(''):
+                raise ValueError("encrypted with a password")
+            pages = len(reader.pages)
+            for page in reader.pages:
+                page.get_contents()
+        if not pages:
+            raise ValueError("no pages")
+        return {'path': pdf_path, 'pages': pages, 'error': None}
+    except Exception as e:
+        return {'path': pdf_path, 'pages': 0, 'error': f"{type(e).__name__}: {e}"}
+
+
+def validate_pdfs(pdf_paths, workers=None):
+    """
+    Validates 'pdf_paths' across a process pool. Results come back in the
+    order of 'pdf_paths'.
+    """
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(pdf_paths) < 2:
+        return [validate_pdf(path) for path in pdf_paths]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(validate_pdf, pdf_paths, chunksize=max(1, len(pdf_paths) // (workers * 8))))
+
+
+class StreamingPdfMerger:
+    """
+    Writes a merged PDF to 'output' (a binary file object) one source PDF at a
+    time. Call append() per source in merge order, then close().
+
+    Only page content is carried over (text, fonts, images, annotations);
+    document-level structures such as outlines and forms are not.
+    """
+
+    def __init__(self, output):
+        self.output = output
+        self.offsets = {}
+        self.page_ids = []
+        self.next_id = PAGES_ID + 1
+        output.write(b"%PDF-1.7\n%\xe2\xe3\xcf\xd3\n")
+
+    def _allocate(self):
+        object_id = self.next_id
+        self.next_id += 1
+        return object_id
+
+    def _write_object(self, object_id, obj):
+        self.offsets[object_id] = self.output.tell()
+        self.output.write(f"{object_id} 0 obj\n".encode('ascii'))
+        obj.write_to_stream(self.output)
+        self.output.write(b"\nendobj\n")
+
+    def append(self, pdf_path):
+        """
+        Copies every page of 'pdf_path' to the output. Returns its page count.
+        If copying fails, the objects already written for 'pdf_path' are
+        discarded (the output is as before the call) and the error is raised.
+        """
+        position, first_id = self.output.tell(), self.next_id
+        try:
+            return self._append(pdf_path)
+        except BaseException:
+            self.output.seek(position)
+            self.output.truncate()
+            for object_id in range(first_id, self.next_id):
+                self.offsets.pop(object_id, None)
+            self.next_id = first_id
+            raise
+
+    def _append(self, pdf_path):
+        from pypdf import PdfReader
+        from pypdf.generic import NullObject
+
+        with open(pdf_path, 'rb') as f:
+            reader = PdfReader(f)
+            if reader.is_encrypted:
+                reader.decrypt('')
+            pages = reader.pages
+            new_ids = {}
+            queue = deque()
+            page_refs = []
+            for page in pages:
+                ref = page.indirect_reference
+                key = (ref.idnum, ref.generation)
+                new_ids[key] = self._allocate()
+                page_refs.append(key)
+                queue.append((ref, True))
+
+            # Breadth-first over the objects reachable from the pages; each is written as soon
+            # as it is reached, so only the current source is held by the reader's object cache
+            while queue:
+                ref, is_page = queue.popleft()
+                obj = ref.get_object()
+                copy = self._copy(obj, new_ids, queue, is_page) if obj is not None else NullObject()
+                self._write_object(new_ids[(ref.idnum, ref.generation)], copy)
+
+        self.page_ids.extend(new_ids[key] for key in page_refs)
+        self.output.flush()
+        return len(page_refs)
+
+    def _copy(self, obj, new_ids, queue, is_page=False):
+        """
+        Copy of 'obj' with its references renumbered; newly reached objects are
+        queued for writing. The source's page tree and catalog are not copied
+        (the pages already carry their inherited attributes, see PdfReader.pages).
+        """
+        from pypdf.generic import (ArrayObject, DecodedStreamObject, DictionaryObject, IndirectObject, NameObject,
+                                   NullObject, StreamObject)
+
+        if isinstance(obj, IndirectObject):
+            key = (obj.idnum, obj.generation)
+            if key not in new_ids:
+                target = obj.get_object()
+                if isinstance(target, DictionaryObject) and target.get('/Type') in ('/Pages', '/Catalog'):
+                    return NullObject()
+                new_ids[key] = self._allocate()
+                queue.append((obj, False))
+            return IndirectObject(new_ids[key], 0, None)
+        if isinstance(obj, StreamObject):
+            copy = DecodedStreamObject()
+            # The raw (still encoded) stream bytes are copied as they are, together with their /Filter
+            copy.set_data(_raw_stream_data(obj))
+        elif isinstance(obj, DictionaryObject):
+            copy = DictionaryObject()
+        elif isinstance(obj, ArrayObject):
+            return ArrayObject(self._copy(item, new_ids, queue) for item in obj)
+        else:
+            return obj
+
+        for key, value in obj.items():
+            if is_page and key == '/Parent':
+                copy[NameObject(key)] = IndirectObject(PAGES_ID, 0, None)
+            else:
+                copy[NameObject(key)] = self._copy(value, new_ids, queue)
+        return copy
+
+    def close(self):
+        """
+        Writes the page tree, the catalog, the cross-reference table and the trailer.
+        """
+        from pypdf.generic import (ArrayObject, DictionaryObject, IndirectObject, NameObject, NumberObject)
+
+        pages = DictionaryObject({
+            NameObject('/Type'): NameObject('/Pages'),
+            NameObject('/Kids'): ArrayObject(IndirectObject(page_id, 0, None) for page_id in self.page_ids),
+            NameObject('/Count'): NumberObject(len(self.page_ids)),
+        })
+        self._write_object(PAGES_ID, pages)
+        catalog = DictionaryObject({
+            NameObject('/Type'): NameObject('/Catalog'),
+            NameObject('/Pages'): IndirectObject(PAGES_ID, 0, None),
+        })
+        self._write_object(CATALOG_ID, catalog)
+
+        xref_offset = self.output.tell()
+        lines = [f"xref\n0 {self.next_id}\n", "0000000000 65535 f \n"]
+        lines.extend(f"{self.offsets[object_id]:010d} 00000 n \n" for object_id in range(1, self.next_id))
+        self.output.write(''.join(lines).encode('ascii'))
+        self.output.write(f"trailer\n<< /Size {self.next_id} /Root {CATALOG_ID} 0 R >>\n"
+                          f"startxref\n{xref_offset}\n%%EOF\n".encode('ascii'))
+        self.output.flush()
+
+
+def merge_pdfs(pdf_paths, output_path, on_appended=None, on_skipped=None):
+    """
+    Merges 'pdf_paths' in order into 'output_path' (written to a temporary
+    file first, so an interrupted merge never leaves a truncated PDF behind).
+    A source that cannot be copied is left out. Returns one result per
+    source, {'path', 'pages', 'error'} as from validate_pdf;
+    'on_appended(path, pages)' or 'on_skipped(path, error)' is called after each.
+    """
+    tmp_path = output_path + '.tmp'
+    results = []
+    try:
+        with open(tmp_path, 'wb') as f:
+            merger = StreamingPdfMerger(f)
+            for pdf_path in pdf_paths:
+                try:
+                    pages = merger.append(pdf_path)
+                except Exception as e:
+                    results.append({'path': pdf_path, 'pages': 0, 'error': f"{type(e).__name__}: {e}"})
+                    if on_skipped is not None:
+                        on_skipped(pdf_path, results[-1]['error'])
+                    continue
+                results.append({'path': pdf_path, 'pages': pages, 'error': None})
+                if on_appended is not None:
+                    on_appended(pdf_path, pages)
+            if not any(result['error'] is None for result in results):
+                raise ValueError("none of the PDFs could be merged")
+            merger.close()
+        os.replace(tmp_path, output_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return results
+
+
+def write_merge_manifest(path, pdf_paths, page_counts, merged_pdf=None, skipped=()):
+    """
+    Writes the merge manifest: every merged file with its page range in the
+    merged document, the skipped files and the merged PDF (None if only the
+    manifest was written).
+    """
+    files = []
+    first_page = 1
+    for pdf_path, pages in zip(pdf_paths, page_counts):
+        files.append({'file': os.path.basename(pdf_path), 'pages': pages,
+                      'first_page': first_page, 'last_page': first_page + pages - 1})
+        first_page += pages
+    manifest = {
+        'created': datetime.datetime.now().isoformat(timespec='seconds'),
+        'merged_pdf': merged_pdf,
+        'total_pages': first_page - 1,
+        'files': files,
+        'skipped': [{'file': os.path.basename(result['path']), 'error': result['error']} for result in skipped],
+    }
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, path)
+    return path
+
+
+def read_merge_manifest(path):
+    """
+    Reads a manifest written by write_merge_manifest.
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
@@ -0,0 +1,350 @@
+#!/usr/bin/env python3
+"""
+Command-line pipeline runner for headless runs.
+
+Models the pipeline scripts as a DAG of stages:
+
+    merge (02) --> extract (04) --> analyze (05) --> report_docx (06, REPORT_FORMAT=docx)
+                                                 |-> report_html (06, REPORT_FORMAT=html)
+                                                 |-> report_batch (06, REPORT_SCOPE=all; on request)
+
+('merge' is only a dependency of 'extract' in EXTRACTION_MODE=merged.)
+
+Every stage gets a fingerprint built from its code (the script and the local
+modules it imports), the settings that change its output (the environment
+variables those files read, minus worker/thread/cache knobs), its external
+inputs (name, size and modification time of the source PDFs) and the
+fingerprints of the stages it depends on. A stage whose fingerprint matches
+the one recorded after its last successful run, and whose outputs still exist,
+is skipped without starting a process. Independent stages (the two reports)
+run concurrently.
+
+Each script runs in its own process with its output in
+'<ARTIFACT_DIR>/logs/<stage>.log'; the recorded fingerprints live in
+'<ARTIFACT_DIR>/pipeline_state.json'.
+
+Usage:
+    python run_pipeline.py --pdf-folder ./pdf_files                  # build both reports
+    python run_pipeline.py --pdf-folder ./pdf_files report_html      # only what the HTML report needs
+    python run_pipeline.py --pdf-folder ./pdf_files report_batch     # per-paper and per-topic reports
+    python run_pipeline.py --pdf-folder ./pdf_files --dry-run        # show what would run
+    python run_pipeline.py --pdf-folder ./pdf_files --force analyze  # re-run a stage regardless
+    python run_pipeline.py --set EMBEDDING_BACKEND=onnx-int8 --set MIN_TOPIC_SIZE=10
+"""
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import argparse
+import ast
+import datetime
+import hashlib
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+
+from artifacts import EMBEDDINGS_FILE, METADATA_FILE, PAGES_FILE, SENTENCES_FILE
+from batch_reports import BATCH_REPORT_DIR, INDEX_FILE
+from pdf_extraction import MERGED_PDF_FILENAME, list_source_pdfs
+from pdf_merge import MERGE_MANIFEST_FILENAME
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+STATE_FILE = 'pipeline_state.json'
+LOG_DIR = 'logs'
+REPORT_BASENAME = 'Deep_Learning_Analysis_Report'
+DEFAULT_TARGETS = ('report_docx', 'report_html')
+
+# Settings that only change how fast a stage runs, never what it writes
+RUNTIME_ONLY_SETTINGS = {
+    'EXTRACTION_WORKERS', 'EXTRACTION_CACHE', 'EXTRACTION_FILES_PER_WORKER',
+    'SEGMENTATION_WORKERS',
+    'EMBEDDING_CACHE', 'EMBEDDING_BATCH_SIZE', 'EMBEDDING_MODEL_BATCH_SIZE', 'EMBEDDING_THREADS',
+    'REPORT_WORKERS',
+    'PIPELINE_METRICS_FILE', 'PIPELINE_RUN_ID', 'PIPELINE_PROFILE', 'PIPELINE_PROFILE_DIR',
+}
+
+_ENVIRON_READ = re.compile(r"""os\.environ\.get\(\s*['"]([A-Za-z0-9_]+)['"]""")
+
+
+class Stage:
+    """
+    One pipeline script in the DAG. 'inputs' returns the external files the
+    stage reads, 'outputs' the files that must exist after a successful run.
+    """
+
+    def __init__(self, name, script, deps=(), env=None, inputs=None, outputs=()):
+        self.name = name
+        self.script = script
+        self.deps = list(deps)
+        self.env = env or {}
+        self.inputs = inputs or (lambda: [])
+        self.outputs = list(outputs)
+
+
+def build_stages(env):
+    """
+    Returns the stage DAG (name -> Stage, in execution order) for the given environment.
+    """
+    pdf_folder = env['PDF_FOLDER_PATH']
+    artifact_root = env.get('ARTIFACT_DIR', 'artifacts')
+    step1 = os.path.join(artifact_root, 'step1')
+    step2 = os.path.join(artifact_root, 'step2')
+    merged_mode = env.get('EXTRACTION_MODE', 'folder') == 'merged'
+    merge_output = env.get('MERGE_OUTPUT', 'pdf')
+    merge_outputs = []
+    if merge_output in ('pdf', 'both'):
+        merge_outputs.append(os.path.join(pdf_folder, MERGED_PDF_FILENAME))
+    if merge_output in ('manifest', 'both'):
+        merge_outputs.append(os.path.join(pdf_folder, MERGE_MANIFEST_FILENAME))
+
+    def source_pdfs():
+        return list_source_pdfs(pdf_folder)
+
+    stages = [
+        Stage('merge', '02.merge_pdfs.py', inputs=source_pdfs, outputs=merge_outputs),
+        Stage('extract', '04.step1_extract_text.py', deps=['merge'] if merged_mode else [],
+              inputs=None if merged_mode else source_pdfs,
+              outputs=[os.path.join(step1, METADATA_FILE), os.path.join(step1, PAGES_FILE)]),
+        Stage('analyze', '05.step2_thematic_analysis.py', deps=['extract'],
+              outputs=[os.path.join(step2, name) for name in (METADATA_FILE, SENTENCES_FILE, EMBEDDINGS_FILE)]),
+    ]
+    for report_format in ('docx', 'html'):
+        stages.append(Stage(f"report_{report_format}", '06.step3_generate_report.py', deps=['analyze'],
+                            env={'REPORT_FORMAT': report_format},
+                            outputs=[f"{REPORT_BASENAME}.{report_format}"]))
+    # Per-paper and per-topic reports (not built unless asked for)
+    stages.append(Stage('report_batch', '06.step3_generate_report.py', deps=['analyze'],
+                        env={'REPORT_SCOPE': 'all'},
+                        outputs=[os.path.join(env.get('REPORT_DIR', BATCH_REPORT_DIR), INDEX_FILE)]))
+    return {stage.name: stage for stage in stages}
+
+
+def _local_module_files(script, seen=None):
+    """
+    The script plus every repository module it imports, directly or indirectly.
+    """
+    seen = set() if seen is None else seen
+    path = os.path.join(REPO_DIR, script)
+    if path in seen or not os.path.exists(path):
+        return seen
+    seen.add(path)
+    with open(path, 'r', encoding='utf-8') as f:
+        tree = ast.parse(f.read(), filename=path)
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            modules = [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+            modules = [node.module]
+        else:
+            continue
+        for module in modules:
+            _local_module_files(module.split('.')[0] + '.py', seen)
+    return seen
+
+
+def _file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def stage_fingerprint(stage, env, dep_fingerprints):
+    """
+    Hash of everything that determines a stage's output (see the module docstring).
+    """
+    digest = hashlib.sha256(stage.name.encode())
+    code_files = sorted(_local_module_files(stage.script))
+    settings = set()
+    for path in code_files:
+        digest.update(f"code {os.path.basename(path)} {_file_digest(path)}\n".encode())
+        with open(path, 'r', encoding='utf-8') as f:
+            settings.update(_ENVIRON_READ.findall(f.read()))
+
+    stage_env = {**env, **stage.env}
+    for key in sorted(settings - RUNTIME_ONLY_SETTINGS):
+        digest.update(f"setting {key}={stage_env.get(key)!r}\n".encode())
+
+    for path in stage.inputs():
+        stat = os.stat(path)
+        digest.update(f"input {os.path.basename(path)} {stat.st_size} {stat.st_mtime_ns}\n".encode())
+
+    for dep in stage.deps:
+        digest.update(f"dep {dep} {dep_fingerprints[dep]}\n".encode())
+    return digest.hexdigest()
+
+
+def load_state(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def save_state(path, state):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def run_stage(stage, env, log_dir):
+    """
+    Runs one stage's script to completion. Returns (succeeded, wall seconds, log path).
+    """
+    os.makedirs(log_dir, exist_ok=True)
+    log_path = os.path.join(log_dir, f"{stage.name}.log")
+    start = time.perf_counter()
+    with open(log_path, 'w', encoding='utf-8') as log:
+        result = subprocess.run([sys.executable, os.path.join(REPO_DIR, stage.script)],
+                                env={**env, **stage.env}, stdout=log, stderr=subprocess.STDOUT)
+    wall = time.perf_counter() - start
+    succeeded = result.returncode == 0 and all(os.path.exists(path) for path in stage.outputs)
+    return succeeded, wall, log_path
+
+
+def _tail(path, lines=20):
+    with open(path, 'r', encoding='utf-8', errors='replace') as f:
+        return ''.join(f.readlines()[-lines:])
+
+
+def required_stages(stages, targets):
+    """
+    The targets and everything they depend on, in DAG order.
+    """
+    needed = set()
+    pending = list(targets)
+    while pending:
+        name = pending.pop()
+        if name not in needed:
+            needed.add(name)
+            pending.extend(stages[name].deps)
+    return [name for name in stages if name in needed]
+
+
+def run_pipeline(stages, targets, env, jobs=2, force=(), dry_run=False, verbose=False):
+    """
+    Runs the stages needed for 'targets', skipping the up-to-date ones and
+    running independent ones concurrently. Returns {stage: status}.
+    """
+    artifact_root = env.get('ARTIFACT_DIR', 'artifacts')
+    state_path = os.path.join(artifact_root, STATE_FILE)
+    log_dir = os.path.join(artifact_root, LOG_DIR)
+    state = load_state(state_path)
+
+    pending = required_stages(stages, targets)
+    status = {}
+    fingerprints = {}
+    running = {}
+
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as executor:
+        while pending or running:
+            # Start (or skip) every stage whose dependencies are finished
+            progress = True
+            while progress:
+                progress = False
+                for name in list(pending):
+                    stage = stages[name]
+                    dep_status = [status.get(dep) for dep in stage.deps]
+                    if any(s in ('failed', 'blocked') for s in dep_status):
+                        status[name] = 'blocked'
+                    elif any(s not in ('done', 'skipped', 'would run') for s in dep_status):
+                        continue
+                    else:
+                        fingerprints[name] = stage_fingerprint(stage, env, fingerprints)
+                        up_to_date = (state.get(name, {}).get('fingerprint') == fingerprints[name]
+                                      and all(os.path.exists(path) for path in stage.outputs))
+                        if up_to_date and name not in force:
+                            status[name] = 'skipped'
+                            print(f"⏭  {name}: up to date")
+                        elif dry_run:
+                            status[name] = 'would run'
+                            print(f"▶  {name}: would run")
+                        else:
+                            # Forget the old fingerprint first so an interrupted run is never trusted
+                            state.pop(name, None)
+                            save_state(state_path, state)
+                            print(f"▶  {name}: running {stage.script}...")
+                            running[executor.submit(run_stage, stage, env, log_dir)] = name
+                            status[name] = 'running'
+                    pending.remove(name)
+                    progress = True
+
+            if not running:
+                continue
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                name = running.pop(future)
+                succeeded, wall, log_path = future.result()
+                if verbose:
+                    print(_tail(log_path, lines=10 ** 6))
+                if succeeded:
+                    status[name] = 'done'
+                    state[name] = {
+                        'fingerprint': fingerprints[name],
+                        'finished': datetime.datetime.now().isoformat(timespec='seconds'),
+                        'wall_s': round(wall, 2),
+                    }
+                    save_state(state_path, state)
+                    print(f"✅ {name}: done in {wall:.1f}s")
+                else:
+                    status[name] = 'failed'
+                    print(f"❌ {name}: failed after {wall:.1f}s (log: '{log_path}')")
+                    print(_tail(log_path))
+
+    for name, value in status.items():
+        if value == 'blocked':
+            print(f"⛔ {name}: not run because a dependency failed")
+    return status
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run the PDF theme extraction pipeline, skipping up-to-date stages.")
+    parser.add_argument('targets', nargs='*', default=list(DEFAULT_TARGETS),
+                        help=f"stages to bring up to date (default: {' '.join(DEFAULT_TARGETS)})")
+    parser.add_argument('--pdf-folder', help="folder with the source PDFs (sets PDF_FOLDER_PATH)")
+    parser.add_argument('--set', action='append', default=[], metavar='KEY=VALUE',
+                        help="setting for the stage scripts, e.g. --set EXTRACTION_MODE=merged (repeatable)")
+    parser.add_argument('--force', nargs='*', metavar='STAGE',
+                        help="re-run these stages (all required stages if none are named) even if up to date")
+    parser.add_argument('--jobs', type=int, default=2, help="stages run concurrently (default: 2)")
+    parser.add_argument('--dry-run', action='store_true', help="only show which stages would run")
+    parser.add_argument('--verbose', action='store_true', help="print each stage's full output when it finishes")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    env = dict(os.environ)
+    for item in args.set:
+        key, _, value = item.partition('=')
+        env[key] = value
+    if args.pdf_folder:
+        env['PDF_FOLDER_PATH'] = os.path.abspath(args.pdf_folder)
+    if not env.get('PDF_FOLDER_PATH'):
+        print("❌ No PDF folder given. Use --pdf-folder or set PDF_FOLDER_PATH.")
+        return 2
+    # One run id, so the stage metrics of this run can be grouped
+    env.setdefault('PIPELINE_RUN_ID', datetime.datetime.now().strftime('%Y%m%dT%H%M%S'))
+
+    stages = build_stages(env)
+    unknown = [name for name in args.targets + (args.force or []) if name not in stages]
+    if unknown:
+        print(f"❌ Unknown stage(s): {', '.join(unknown)}. Stages: {', '.join(stages)}")
+        return 2
+    if args.force is None:
+        force = set()
+    else:
+        force = set(args.force) or set(required_stages(stages, args.targets))
+
+    print(f"--- Pipeline run {env['PIPELINE_RUN_ID']}: {', '.join(args.targets)} ---")
+    status = run_pipeline(stages, args.targets, env, args.jobs, force, args.dry_run, args.verbose)
+    return 0 if all(value in ('done', 'skipped', 'would run') for value in status.values()) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
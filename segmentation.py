@@ -0,0 +1,198 @@
+"""
+Parallel sentence segmentation for step 2.
+
+Pages from the page store are split into sentences with NLTK's Punkt tokenizer
+in worker processes, a chunk of pages at a time. The page store is streamed,
+so page texts are only in memory while their chunk is being segmented. The
+sentence texts go to a file on disk, back to back as UTF-8; in memory each
+sentence is only (start, end, doc_id, page) in compact NumPy arrays (24 bytes),
+and its text is decoded from the memory-mapped file when it is actually needed
+(see SentenceIndex).
+"""
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import os
+
+import numpy as np
+
+from page_store import iter_page_store
+
+# Sentences this short are mostly headers, page numbers and other debris
+MIN_SENTENCE_LENGTH = 30
+
+_punkt_tokenizer = None
+
+
+def _get_punkt_tokenizer():
+    """
+    Loads the English Punkt tokenizer once per process (the same model sent_tokenize uses).
+    """
+    global _punkt_tokenizer
+    if _punkt_tokenizer is None:
+        try:
+            from nltk.tokenize import PunktTokenizer
+            _punkt_tokenizer = PunktTokenizer('english')
+        except ImportError:
+            # Older NLTK releases ship the pickled model instead of 'punkt_tab'
+            import nltk
+            _punkt_tokenizer = nltk.data.load('tokenizers/punkt/english.pickle')
+    return _punkt_tokenizer
+
+
+def sentence_spans(text, min_length=MIN_SENTENCE_LENGTH):
+    """
+    Returns the (start, end) offsets of the stripped sentences in 'text' that
+    are longer than 'min_length' characters.
+    """
+    spans = []
+    for start, end in _get_punkt_tokenizer().span_tokenize(text):
+        sentence = text[start:end]
+        stripped = sentence.strip()
+        if len(stripped) > min_length:
+            start += len(sentence) - len(sentence.lstrip())
+            spans.append((start, start + len(stripped)))
+    return spans
+
+
+def _segment_chunk(texts, min_length):
+    """
+    Segments a chunk of page texts. Runs inside the worker processes and sends
+    back the chunk's sentences as one UTF-8 byte string, with the byte length
+    of every sentence and the number of sentences of every page.
+    """
+    sentences = []
+    counts = []
+    for text in texts:
+        spans = sentence_spans(text, min_length)
+        sentences.extend(text[start:end].encode('utf-8') for start, end in spans)
+        counts.append(len(spans))
+    return b''.join(sentences), np.array([len(s) for s in sentences], dtype=np.int64), np.array(counts, dtype=np.int64)
+
+
+class SentenceIndex:
+    """
+    All sentences of the corpus, stored back to back as UTF-8 in a file that
+    is memory-mapped on read, with per-sentence byte offsets, paper and page
+    in compact NumPy arrays.
+
+    Behaves like a read-only sequence of sentence strings: indexing or
+    iterating decodes the text from the file on demand.
+    """
+
+    def __init__(self, text_path, doc_names, starts, ends, doc_ids, pages):
+        self.text_path = text_path
+        # (an empty file cannot be memory-mapped)
+        self.text = np.memmap(text_path, dtype=np.uint8, mode='r') if os.path.getsize(text_path) else b''
+        self.doc_names = doc_names
+        self.starts = starts                # byte offsets into the text file, per sentence
+        self.ends = ends
+        self.doc_ids = doc_ids
+        self.pages = pages
+
+    def __len__(self):
+        return len(self.starts)
+
+    def __getitem__(self, i):
+        return bytes(self.text[self.starts[i]:self.ends[i]]).decode('utf-8')
+
+    def __iter__(self):
+        text = self.text
+        for start, end in zip(self.starts.tolist(), self.ends.tolist()):
+            yield bytes(text[start:end]).decode('utf-8')
+
+    def texts(self, rows=None):
+        """
+        Materializes sentence strings, either all of them or only 'rows'.
+        """
+        if rows is None:
+            return list(self)
+        return [self[i] for i in rows]
+
+    def subset(self, rows):
+        """
+        Returns a SentenceIndex over only 'rows' (shares the text file).
+        """
+        subset = SentenceIndex.__new__(SentenceIndex)
+        subset.text_path = self.text_path
+        subset.text = self.text
+        subset.doc_names = self.doc_names
+        for name in ('starts', 'ends', 'doc_ids', 'pages'):
+            setattr(subset, name, getattr(self, name)[rows])
+        return subset
+
+    def sources(self):
+        """
+        Source filename of every sentence (NumPy object array).
+        """
+        return np.asarray(self.doc_names, dtype=object)[self.doc_ids]
+
+
+def _page_chunks(page_store_path, chunk_pages, doc_names, doc_id_of):
+    """
+    Yields (texts, doc_ids, pages) for consecutive chunks of 'chunk_pages'
+    pages of the page store, registering new papers in 'doc_names'/'doc_id_of'.
+    """
+    chunk = ([], [], [])
+    for record in iter_page_store(page_store_path):
+        if record['source'] not in doc_id_of:
+            doc_id_of[record['source']] = len(doc_names)
+            doc_names.append(record['source'])
+        chunk[0].append(record['text'])
+        chunk[1].append(doc_id_of[record['source']])
+        chunk[2].append(record['page'])
+        if len(chunk[0]) == chunk_pages:
+            yield chunk
+            chunk = ([], [], [])
+    if chunk[0]:
+        yield chunk
+
+
+def segment_page_store(page_store_path, text_path, workers=None, min_length=MIN_SENTENCE_LENGTH, chunk_pages=64):
+    """
+    Segments every page in the page store across a process pool and returns a
+    SentenceIndex whose sentence texts are written to 'text_path'.
+
+    The page store is streamed: only the chunks in flight (a few per worker)
+    are in memory, and each finished chunk is appended to the text file in
+    page order, so sentence order is the same as with a sequential pass.
+    """
+    workers = workers or os.cpu_count() or 1
+    doc_names = []
+    doc_id_of = {}
+    lengths, doc_ids, pages = [], [], []
+
+    def append(result, chunk_doc_ids, chunk_page_numbers):
+        data, chunk_lengths, counts = result
+        text_file.write(data)
+        lengths.append(chunk_lengths)
+        doc_ids.append(np.repeat(np.asarray(chunk_doc_ids, dtype=np.int32), counts))
+        pages.append(np.repeat(np.asarray(chunk_page_numbers, dtype=np.int32), counts))
+
+    chunks = _page_chunks(page_store_path, chunk_pages, doc_names, doc_id_of)
+    with open(text_path, 'wb') as text_file:
+        if workers > 1:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                in_flight = deque()
+                for texts, chunk_doc_ids, chunk_page_numbers in chunks:
+                    in_flight.append((executor.submit(_segment_chunk, texts, min_length),
+                                      chunk_doc_ids, chunk_page_numbers))
+                    if len(in_flight) >= 2 * workers:
+                        future, *chunk_info = in_flight.popleft()
+                        append(future.result(), *chunk_info)
+                while in_flight:
+                    future, *chunk_info = in_flight.popleft()
+                    append(future.result(), *chunk_info)
+        else:
+            for texts, chunk_doc_ids, chunk_page_numbers in chunks:
+                append(_segment_chunk(texts, min_length), chunk_doc_ids, chunk_page_numbers)
+
+    lengths = np.concatenate(lengths) if lengths else np.zeros(0, dtype=np.int64)
+    ends = np.cumsum(lengths)
+    return SentenceIndex(
+        text_path=text_path,
+        doc_names=doc_names,
+        starts=ends - lengths,
+        ends=ends,
+        doc_ids=np.concatenate(doc_ids) if doc_ids else np.zeros(0, dtype=np.int32),
+        pages=np.concatenate(pages) if pages else np.zeros(0, dtype=np.int32),
+    )
@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+"""
+Parameter sweep for the step 2 topic model.
+
+Evaluates a grid of clustering and vectorizer settings on the sentences and
+embeddings of the last step 2 run (artifacts/step2/), so nothing is embedded
+again. Keywords come from the step 2 keyword vectorizer and its settings
+(TOPIC_VECTORIZER, VOCAB_MIN_DF, VOCAB_MAX_FEATURES), and topic sizes count
+every sentence with its deduplication weight, as in step 2. Each distinct
+reduction (UMAP per n_neighbors/n_components, PCA for the fast engine) is
+computed once and cached on disk by its parameters and inputs; the
+configurations are then clustered and scored in parallel worker processes. For
+every configuration the sweep reports the topic count, the outlier ratio,
+coherence (NPMI), diversity (see topic_quality.py) and its runtime, and prints
+the step 2 settings of the most coherent one.
+
+Usage:
+    python sweep_topics.py                                             # default grid
+    python sweep_topics.py --grid min_topic_size=10,15,30,50 --grid n_gram_range=1-1,1-2
+    python sweep_topics.py --grid engine=umap-hdbscan,fast --grid n_neighbors=10,15,30 --sample 50000
+"""
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import datetime
+import hashlib
+import itertools
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+from artifacts import ARTIFACT_DIR, EMBEDDINGS_FILE, SENTENCES_FILE, read_array, read_metadata, read_table, step_dir
+from large_corpus import stratified_sample
+from topic_engines import (FAST_COMPONENTS, TOPIC_ENGINES, UMAP_N_COMPONENTS, UMAP_N_NEIGHBORS, clustering_model,
+                           reduction_model)
+from topic_modeling import topic_info_records
+from topic_quality import topic_quality
+
+SWEEP_DIR = 'sweep'
+REDUCTION_CACHE_DIR = 'reductions'
+
+# Keyword vectorizer settings, read like step 2 ('auto' uses the vectorizer of the last step 2 run)
+TOPIC_VECTORIZER = os.environ.get('TOPIC_VECTORIZER', 'auto')
+TOPIC_VECTORIZERS = ('auto', 'count', 'hashing')
+VOCAB_MIN_DF = int(os.environ.get('VOCAB_MIN_DF', 1))
+VOCAB_MAX_FEATURES = int(os.environ.get('VOCAB_MAX_FEATURES', 100000))
+
+# Parameter -> parser of its command-line values
+PARAMETERS = {
+    'engine': str,
+    'n_neighbors': int,
+    'n_components': int,
+    'min_topic_size': int,
+    'n_gram_range': lambda value: tuple(int(n) for n in value.split('-')),
+    'fast_topics': int,
+}
+DEFAULT_GRID = {
+    'engine': ['umap-hdbscan'],
+    'n_neighbors': [UMAP_N_NEIGHBORS],
+    'n_components': [UMAP_N_COMPONENTS],
+    'min_topic_size': [10, 15, 30],
+    'n_gram_range': [(1, 1), (1, 2)],
+    'fast_topics': [0],
+}
+# Parameters that matter for each engine, and those that determine its reduction
+ENGINE_PARAMETERS = {
+    'umap-hdbscan': ('n_neighbors', 'n_components', 'min_topic_size', 'n_gram_range'),
+    'fast': ('fast_topics', 'n_gram_range'),
+}
+REDUCTION_PARAMETERS = {
+    'umap-hdbscan': ('n_neighbors', 'n_components'),
+    'fast': (),
+}
+# Step 2 environment variable of each parameter
+SETTINGS = {
+    'engine': 'TOPIC_ENGINE',
+    'n_neighbors': 'UMAP_N_NEIGHBORS',
+    'n_components': 'UMAP_N_COMPONENTS',
+    'min_topic_size': 'MIN_TOPIC_SIZE',
+    'n_gram_range': 'N_GRAM_RANGE',
+    'fast_topics': 'FAST_ENGINE_TOPICS',
+}
+
+
+class SentenceList(list):
+    """
+    Sentence strings with the texts(rows) accessor of segmentation.SentenceIndex.
+    """
+
+    def texts(self, rows):
+        return [self[i] for i in rows]
+
+
+def expand_grid(grid):
+    """
+    All configurations of 'grid' ({parameter: [values]}), keeping only the
+    parameters that matter for each engine, without duplicates.
+    """
+    configs = []
+    names = list(grid)
+    for values in itertools.product(*(grid[name] for name in names)):
+        combination = dict(zip(names, values))
+        engine = combination['engine']
+        config = {'engine': engine, **{name: combination[name] for name in ENGINE_PARAMETERS[engine]}}
+        if config not in configs:
+            configs.append(config)
+    return configs
+
+
+def reduction_key(config, inputs_fingerprint):
+    """
+    Cache key of the reduction a configuration clusters on.
+    """
+    engine = config['engine']
+    params = {name: config[name] for name in REDUCTION_PARAMETERS[engine]}
+    if engine == 'fast':
+        params['components'] = FAST_COMPONENTS
+    payload = json.dumps({'engine': engine, 'params': params, 'inputs': inputs_fingerprint}, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]
+
+
+def inputs_fingerprint(embeddings_path, rows):
+    """
+    Identifies the embeddings file and the sampled rows (reductions of other
+    inputs must not be reused).
+    """
+    info = os.stat(embeddings_path)
+    digest = hashlib.sha256(np.ascontiguousarray(rows, dtype=np.int64).tobytes()).hexdigest()
+    return f"{info.st_size}-{info.st_mtime_ns}-{digest[:16]}"
+
+
+# Set in every worker process by _init_worker
+_sentences = None
+_weights = None
+_rows = None
+_vectorizer = None
+
+
+def _init_worker(step2_dir, rows, vectorizer):
+    global _sentences, _weights, _rows, _vectorizer
+    table = read_table(os.path.join(step2_dir, SENTENCES_FILE), ['sentence', 'weight'])
+    _sentences = SentenceList(table['sentence'][rows].tolist())
+    _weights = np.asarray(table['weight'][rows], dtype=np.int64)
+    _rows = rows
+    _vectorizer = vectorizer
+
+
+def compute_reduction(config, embeddings_path, cache_path):
+    """
+    Fits the reduction of 'config' on the sampled embeddings and stores it
+    at 'cache_path'. Returns the seconds it took.
+    """
+    start = time.perf_counter()
+    embeddings = np.asarray(read_array(embeddings_path)[_rows], dtype=np.float32)
+    model = reduction_model(config['engine'], len(_rows), config.get('n_neighbors', UMAP_N_NEIGHBORS),
+                            config.get('n_components', UMAP_N_COMPONENTS), seed=42)
+    reduced = np.asarray(model.fit_transform(embeddings), dtype=np.float32)
+    tmp_path = cache_path + '.tmp.npy'
+    np.save(tmp_path, reduced)
+    os.replace(tmp_path, cache_path)
+    return round(time.perf_counter() - start, 3)
+
+
+def evaluate_config(config, reduction_path):
+    """
+    Clusters the cached reduction with 'config', extracts the c-TF-IDF keywords
+    and scores the result. Returns the result record.
+    """
+    from bertopic import BERTopic
+    from bertopic.dimensionality import BaseDimensionalityReduction
+    from topic_vocabulary import make_vectorizer
+
+    start = time.perf_counter()
+    reduced = np.load(reduction_path)
+    topic_model = BERTopic(
+        # The embeddings passed in are already reduced
+        umap_model=BaseDimensionalityReduction(),
+        hdbscan_model=clustering_model(config['engine'], len(_sentences), config.get('min_topic_size'),
+                                       config.get('fast_topics')),
+        vectorizer_model=make_vectorizer(_vectorizer, len(_sentences), config['n_gram_range'], VOCAB_MIN_DF,
+                                         VOCAB_MAX_FEATURES),
+        verbose=False
+    )
+    topics, _ = topic_model.fit_transform(_sentences, embeddings=reduced)
+    fit_seconds = time.perf_counter() - start
+
+    topic_info = topic_info_records(topic_model.get_topic_info())
+    # In original sentences, like step 2's topic sizes
+    topic_sizes = np.bincount(np.asarray(topics) + 1, weights=_weights).astype(np.int64)
+    quality = topic_quality(_sentences, topic_info, topic_sizes)
+    return {
+        'config': config,
+        'topics': quality['topics'],
+        'outlier_ratio': quality['outlier_ratio'],
+        'coherence_npmi': quality['coherence_npmi'],
+        'diversity': quality['diversity'],
+        'cluster_s': round(fit_seconds, 3),
+        'total_s': round(time.perf_counter() - start, 3),
+    }
+
+
+def run_sweep(step2_dir, configs, sweep_dir, sample_size=None, workers=None, seed=42):
+    """
+    Evaluates 'configs' on the step 2 artifacts in 'step2_dir'. Returns the
+    result records in the order of 'configs'.
+    """
+    embeddings_path = os.path.join(step2_dir, EMBEDDINGS_FILE)
+    vectorizer = TOPIC_VECTORIZER
+    if vectorizer == 'auto':
+        vectorizer = read_metadata(step2_dir).get('topic_vectorizer', 'count')
+    sources = read_table(os.path.join(step2_dir, SENTENCES_FILE), ['source'])['source']
+    _, doc_ids = np.unique(sources.astype(str), return_inverse=True)
+    rows = stratified_sample(doc_ids, sample_size or len(doc_ids), seed)
+
+    cache_dir = os.path.join(sweep_dir, REDUCTION_CACHE_DIR)
+    os.makedirs(cache_dir, exist_ok=True)
+    fingerprint = inputs_fingerprint(embeddings_path, rows)
+    reduction_paths = [os.path.join(cache_dir, f"{reduction_key(config, fingerprint)}.npy") for config in configs]
+
+    # One representative configuration per reduction that is not cached yet
+    missing = {}
+    for config, path in zip(configs, reduction_paths):
+        if not os.path.exists(path) and path not in missing:
+            missing[path] = config
+    print(f"Sweeping {len(configs)} configurations on {len(rows):,} sentences "
+          f"({len(set(reduction_paths))} reductions, {len(missing)} to compute, {workers} workers, "
+          f"'{vectorizer}' keyword vectorizer).")
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(step2_dir, rows, vectorizer)) as executor:
+        reduction_seconds = dict(zip(missing, executor.map(
+            compute_reduction, missing.values(), [embeddings_path] * len(missing), missing.keys())))
+        results = list(executor.map(evaluate_config, configs, reduction_paths))
+
+    for result, path in zip(results, reduction_paths):
+        result['reduction_s'] = reduction_seconds.get(path, 0.0)
+        result['reduction_cached'] = path not in reduction_seconds
+        result['sentences'] = len(rows)
+    return results
+
+
+def step2_settings(config):
+    """
+    The step 2 environment settings that reproduce 'config'.
+    """
+    settings = []
+    for name, value in config.items():
+        if name == 'n_gram_range':
+            value = ','.join(str(n) for n in value)
+        settings.append(f"{SETTINGS[name]}={value}")
+    return ' '.join(settings)
+
+
+def print_results(results):
+    print(f"\n{'Topics':>6} {'Outliers':>8} {'NPMI':>7} {'Divers.':>7} {'Time s':>7}   Configuration")
+    for result in sorted(results, key=lambda r: -(r['coherence_npmi'] if r['coherence_npmi'] is not None else -2)):
+        npmi = f"{result['coherence_npmi']:.3f}" if result['coherence_npmi'] is not None else '-'
+        print(f"{result['topics']:>6} {result['outlier_ratio']:>8.1%} {npmi:>7} {result['diversity']:>7.3f} "
+              f"{result['reduction_s'] + result['total_s']:>7.1f}   {step2_settings(result['config'])}")
+
+
+def parse_grid(items, parser):
+    grid = {name: list(values) for name, values in DEFAULT_GRID.items()}
+    for item in items:
+        name, _, values = item.partition('=')
+        if name not in PARAMETERS or not values:
+            parser.error(f"invalid --grid '{item}' (expected NAME=V1,V2 with NAME one of {', '.join(PARAMETERS)})")
+        grid[name] = [PARAMETERS[name](value) for value in values.split(',')]
+    unknown = [engine for engine in grid['engine'] if engine not in TOPIC_ENGINES]
+    if unknown:
+        parser.error(f"unknown engine(s): {', '.join(unknown)} (choose from {', '.join(TOPIC_ENGINES)})")
+    return grid
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare topic model settings on the step 2 embeddings.")
+    parser.add_argument('--grid', action='append', default=[], metavar='NAME=V1,V2',
+                        help=f"values to try for one parameter (repeatable; parameters: {', '.join(PARAMETERS)}; "
+                             "n_gram_range values are written as 1-2)")
+    parser.add_argument('--sample', type=int, default=None,
+                        help="sweep on a sample of this many sentences, stratified by paper (default: all)")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="worker processes (default: all cores)")
+    parser.add_argument('--artifact-dir', default=ARTIFACT_DIR, help=f"artifact directory (default: {ARTIFACT_DIR})")
+    parser.add_argument('--output', default=None, help="results file (default: <artifact-dir>/sweep/results-<time>.json)")
+    args = parser.parse_args(argv)
+    configs = expand_grid(parse_grid(args.grid, parser))
+    if TOPIC_VECTORIZER not in TOPIC_VECTORIZERS:
+        print(f"❌ Unknown TOPIC_VECTORIZER '{TOPIC_VECTORIZER}' (expected one of {', '.join(TOPIC_VECTORIZERS)}).")
+        return 1
+
+    step2_dir = step_dir('step2', args.artifact_dir, create=False)
+    if not os.path.exists(os.path.join(step2_dir, EMBEDDINGS_FILE)):
+        print(f"❌ No step 2 embeddings in '{step2_dir}'. Please run '05.step2_thematic_analysis.py' first.")
+        return 1
+
+    sweep_dir = os.path.join(args.artifact_dir, SWEEP_DIR)
+    start = time.perf_counter()
+    results = run_sweep(step2_dir, configs, sweep_dir, args.sample, args.workers)
+    print_results(results)
+
+    output = args.output or os.path.join(
+        sweep_dir, f"results-{datetime.datetime.now().strftime('%Y%m%dT%H%M%S')}.json")
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump({'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+                   'sample': args.sample, 'wall_s': round(time.perf_counter() - start, 3), 'results': results},
+                  f, indent=2)
+    print(f"\n📄 Results written to '{output}' ({time.perf_counter() - start:.0f}s).")
+
+    scored = [result for result in results if result['coherence_npmi'] is not None]
+    if scored:
+        best = max(scored, key=lambda result: result['coherence_npmi'])
+        print(f"🏆 Most coherent: {step2_settings(best['config'])}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,35 @@
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from batch_reports import _safe_filename, source_report_specs  # noqa: E402
+
+
+def test_safe_filename_keeps_safe_names():
+    assert _safe_filename('12') == '12'
+    assert _safe_filename('paper_v2.final') == 'paper_v2.final'
+
+
+def test_safe_filename_distinguishes_replaced_characters():
+    names = ['x y', 'x?y', 'x_y', 'x  y', '???']
+    filenames = [_safe_filename(name) for name in names]
+    assert len(set(filenames)) == len(names)
+    assert all(filename == _safe_filename(name) for name, filename in zip(names, filenames))
+
+
+def test_source_reports_do_not_overwrite_each_other():
+    sources = ['x y.pdf', 'x?y.pdf', 'x_y.pdf']
+    columns = {
+        'sentence': np.array([f"Sentence {i}." for i in range(6)], dtype=object),
+        'source': np.array(sources * 2, dtype=object),
+        'page': np.array([1, 1, 1, 2, 2, 2]),
+        'weight': np.ones(6, dtype=np.int64),
+        'topic': np.array([0, 1, -1, 0, 1, 0]),
+    }
+    topic_info = [{'Topic': -1, 'Name': '-1_outliers'}, {'Topic': 0, 'Name': '0_a_b'}, {'Topic': 1, 'Name': '1_c_d'}]
+    specs = source_report_specs(columns, topic_info)
+    assert sorted(spec['title'] for spec in specs) == sorted(sources)
+    assert len({spec['filename'] for spec in specs}) == len(sources)
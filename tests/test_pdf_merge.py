@@ -0,0 +1,88 @@
+import os
+import sys
+
+import pytest
+from pypdf import PdfReader, PdfWriter
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+sys.path.insert(0, os.path.join(REPO_DIR, 'benchmarks'))
+
+import pdf_merge  # noqa: E402
+from pdf_merge import merge_pdfs, validate_pdf  # noqa: E402
+from synthetic_corpus import FOOTER, generate_document, write_pdf  # noqa: E402
+
+
+@pytest.fixture
+def sources(tmp_path):
+    """
+    Three synthetic PDFs: a plain one, one with compressed content streams
+    and one encrypted with an empty user password. Returns (paths, pages).
+    """
+    paths, pages = [], []
+    for doc_index, page_count in ((1, 2), (2, 3), (3, 1)):
+        path = str(tmp_path / f"{doc_index}.pdf")
+        write_pdf(path, generate_document(doc_index, page_count))
+        paths.append(path)
+        pages.append(generate_document(doc_index, page_count))
+
+    writer = PdfWriter(clone_from=paths[1])
+    for page in writer.pages:
+        page.compress_content_streams()
+    with open(paths[1], 'wb') as f:
+        writer.write(f)
+
+    writer = PdfWriter(clone_from=paths[2])
+    writer.encrypt(user_password='', owner_password='owner', algorithm='RC4-128')
+    with open(paths[2], 'wb') as f:
+        writer.write(f)
+    return paths, pages
+
+
+def test_merge_round_trip(sources, tmp_path):
+    paths, pages = sources
+    assert PdfReader(paths[2]).is_encrypted
+    assert all(validate_pdf(path)['error'] is None for path in paths)
+
+    output = str(tmp_path / 'merged.pdf')
+    results = merge_pdfs(paths, output)
+    assert [result['pages'] for result in results] == [len(doc) for doc in pages]
+    assert not os.path.exists(output + '.tmp')
+
+    merged = PdfReader(output)
+    expected = [page for doc in pages for page in doc]
+    assert len(merged.pages) == len(expected)
+    for page, lines in zip(merged.pages, expected):
+        text = page.extract_text()
+        assert lines[2][:40] in text
+        assert lines[-1] in text
+
+
+def test_failing_source_is_skipped(sources, tmp_path, monkeypatch):
+    paths, pages = sources
+    write_object = pdf_merge.StreamingPdfMerger._write_object
+    calls = {'count': 0}
+
+    # Fails the second source after some of its objects were written
+    def failing_write_object(self, object_id, obj):
+        calls['count'] += 1
+        if calls['count'] == 7:
+            raise ValueError("damaged font")
+        write_object(self, object_id, obj)
+
+    monkeypatch.setattr(pdf_merge.StreamingPdfMerger, '_write_object', failing_write_object)
+    output = str(tmp_path / 'merged.pdf')
+    results = merge_pdfs(paths, output)
+    assert [result['error'] is not None for result in results] == [False, True, False]
+
+    merged = PdfReader(output)
+    assert len(merged.pages) == len(pages[0]) + len(pages[2])
+    assert FOOTER.format(page=1) in merged.pages[-1].extract_text()
+
+
+def test_failed_merge_leaves_no_temporary_file(tmp_path):
+    output = str(tmp_path / 'merged.pdf')
+    with pytest.raises(ValueError):
+        merge_pdfs([str(tmp_path / 'missing.pdf')], output)
+    assert not os.path.exists(output)
+    assert not os.path.exists(output + '.tmp')
@@ -0,0 +1,42 @@
+import os
+import sys
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+sys.path.insert(0, os.path.join(REPO_DIR, 'benchmarks'))
+
+from pdf_extraction import iter_pdf_pages  # noqa: E402
+from synthetic_corpus import write_pdf  # noqa: E402
+from text_normalization import PageNormalizer  # noqa: E402
+
+# Last page of one paper, ending in its references heading
+CONCLUSION_PAGE = [
+    "Conclusion",
+    "We showed that brand voice matters for consumer trust in many settings.",
+    "References",
+]
+# First page of the next paper: dense in years, a DOI URL and "et al." citations
+TITLE_PAGE = [
+    "Journal of Marketing Research 58 (2021) 112-130",
+    "https://doi.org/10.1177/0022243721100",
+    "Received 3 March 2020; Accepted 9 January 2021",
+    "Chatbots and customer service quality",
+    "Prior work (Smith et al., 2019) and (Lee et al., 2020) studied chatbots in retail.",
+]
+
+
+def test_references_continue_within_a_document():
+    normalizer = PageNormalizer()
+    assert normalizer.normalize('\n'.join(CONCLUSION_PAGE)).startswith('Conclusion')
+    assert normalizer.normalize('\n'.join(TITLE_PAGE)) == ''
+
+
+def test_merged_pdf_restarts_normalization_at_each_document(tmp_path):
+    pdf_path = str(tmp_path / 'merged.pdf')
+    write_pdf(pdf_path, [CONCLUSION_PAGE, TITLE_PAGE])
+
+    for document_starts in ({1, 2}, set()):
+        records = list(iter_pdf_pages(pdf_path, document_starts=document_starts))
+        assert [record['page'] for record in records] == [1, 2]
+        assert 'Chatbots and customer service quality' in records[1]['text']
+        assert 'Received 3 March 2020' in records[1]['text']
@@ -0,0 +1,114 @@
+"""
+Page text normalization for step 1.
+
+Every extracted page goes through one translate() call (ligatures and
+special spaces) and one pass of a single precompiled regular expression that
+  - rejoins words hyphenated across line breaks ("seg-\\nmentation"),
+  - removes URLs, DOIs and citation markers ("[12]", "[3, 5-7]",
+    "(Smith et al., 2021; Lee, 2019)"),
+  - turns line breaks and runs of whitespace into single spaces.
+References/bibliography and acknowledgements sections are dropped before
+that: from their heading to the end of the page, and on the following
+pages of the same document for as long as they still read like a reference
+list (dense in years, DOIs and "et al."), or until an appendix heading.
+
+Normalization runs inside the extraction workers, so it is spread across
+cores together with the PDF parsing. Removing the reference lists before
+segmentation cuts the sentence count (and the embedding cost) and keeps
+author names and journal titles out of the topics.
+"""
+import re
+
+# Ligatures, soft hyphens and special spaces as PDF text extraction returns them
+_TRANSLATION = str.maketrans({
+    '\ufb00': 'ff', '\ufb01': 'fi', '\ufb02': 'fl', '\ufb03': 'ffi', '\ufb04': 'ffl', '\ufb05': 'st', '\ufb06': 'st',
+    '\u00ad': '', '\u200b': '', '\ufeff': '',
+    '\u00a0': ' ', '\u2009': ' ', '\u202f': ' ',
+})
+
+_AUTHOR = r"[A-Z][A-Za-z'’\-]+"
+_YEAR = r"(?:19|20)\d{2}[a-z]?"
+_AUTHOR_YEAR = rf"{_AUTHOR}(?: et al\.?| (?:and|&) {_AUTHOR})?,? {_YEAR}(?:, {_YEAR})*"
+
+# One alternation, applied in a single pass; the group that matched decides the replacement
+_CLEANUP = re.compile(
+    r"(?P<hyphen>(?<=[A-Za-z])-[ \t]*\n\s*(?=[a-z]))"
+    r"|(?P<url>\s?\b(?:https?://|www\.)\S*[^\s.,;:)\]])"
+    r"|(?P<doi>\s?\b(?:doi:\s*)?10\.\d{4,9}/\S*[^\s.,;:)\]])"
+    r"|(?P<citation>\s?\[\d+(?:\s*[,–\-]\s*\d+)*\]"
+    rf"|\s?\((?:see |e\.g\., )?{_AUTHOR_YEAR}(?:; {_AUTHOR_YEAR})*\))"
+    r"|(?P<space>\s+)"
+)
+_REPLACEMENTS = {'hyphen': '', 'url': '', 'doi': '', 'citation': '', 'space': ' '}
+
+# Section headings on a line of their own (optionally numbered)
+_HEADING_PREFIX = r"^[ \t]*(?:\d{1,2}\.?[ \t]*|[IVX]{1,4}\.[ \t]*)?"
+_DROPPED_SECTION = re.compile(
+    _HEADING_PREFIX + r"(?:references|bibliography|works cited|literature cited|reference list"
+                      r"|acknowledge?ments?)[ \t]*:?[ \t]*$",
+    re.IGNORECASE | re.MULTILINE
+)
+_RESUMED_SECTION = re.compile(_HEADING_PREFIX + r"(?:appendix|appendices|supplementary material)\b.{0,60}$",
+                              re.IGNORECASE | re.MULTILINE)
+_REFERENCE_MARKER = re.compile(rf"\b{_YEAR}\b|\bdoi\b|\bet al\.|https?://", re.IGNORECASE)
+# Reference-list markers per 1,000 characters above which a page continues a references section
+REFERENCE_DENSITY = 4.0
+
+
+def clean_text(text):
+    """
+    Ligature folding, hyphenation repair, URL/DOI/citation removal and
+    whitespace collapsing in one translate() and one regex pass.
+    """
+    text = text.translate(_TRANSLATION)
+    return _CLEANUP.sub(lambda match: _REPLACEMENTS[match.lastgroup], text).strip()
+
+
+def looks_like_references(text):
+    """
+    True if 'text' is dense in years, DOIs, URLs and "et al." like a reference list.
+    """
+    if not text.strip():
+        return False
+    return len(_REFERENCE_MARKER.findall(text)) * 1000 / len(text) >= REFERENCE_DENSITY
+
+
+class PageNormalizer:
+    """
+    Normalizes the pages of one document in order. Keeps track of whether
+    the previous page ended inside a references section.
+    """
+
+    def __init__(self):
+        self.in_references = False
+
+    def normalize(self, text):
+        """
+        Returns the normalized text of the next page ('' if nothing is left).
+        """
+        kept = []
+        if self.in_references:
+            resumed = _RESUMED_SECTION.search(text)
+            if resumed:
+                text = text[resumed.start():]
+                self.in_references = False
+            elif looks_like_references(text):
+                return ''
+            else:
+                self.in_references = False
+
+        # Keep the text up to a dropped section's heading; resume at an appendix heading on the same page
+        while True:
+            dropped = _DROPPED_SECTION.search(text)
+            if not dropped:
+                kept.append(text)
+                break
+            kept.append(text[:dropped.start()])
+            text = text[dropped.end():]
+            resumed = _RESUMED_SECTION.search(text)
+            if resumed:
+                text = text[resumed.start():]
+                continue
+            self.in_references = True
+            break
+        return clean_text(' '.join(kept))
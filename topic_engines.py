@@ -0,0 +1,89 @@
+"""
+Clustering engines for the step 2 topic model.
+
+  - 'umap-hdbscan': UMAP reduction and HDBSCAN clustering, configured as in
+                    BERTopic's defaults (density-based, finds outliers; the
+                    engine for final reports).
+  - 'fast':         PCA reduction and MiniBatchKMeans clustering. Both scale
+                    linearly with the sentence count and run in seconds, but every
+                    sentence is assigned to a topic (no outliers) and the number
+                    of topics is set up front (for quick daily refreshes).
+Both plug into BERTopic as its 'umap_model' and 'hdbscan_model', so the
+c-TF-IDF keywords, saving and fold-in work the same for either engine.
+The reduction and the clustering model are also built separately for the
+parameter sweep (see sweep_topics.py), which caches reductions.
+"""
+TOPIC_ENGINES = ('umap-hdbscan', 'fast')
+
+# BERTopic's UMAP defaults
+UMAP_N_NEIGHBORS = 15
+UMAP_N_COMPONENTS = 5
+# PCA dimensions kept for clustering by the fast engine
+FAST_COMPONENTS = 50
+# Without a configured topic count, the fast engine makes one topic per this many sentences
+SENTENCES_PER_FAST_TOPIC = 150
+MAX_FAST_TOPICS = 200
+
+
+def fast_topic_count(n_sentences, n_topics=None):
+    """
+    Number of k-means clusters for 'n_sentences' sentences ('n_topics' if
+    given, but never more than there are sentences).
+    """
+    if not n_topics:
+        n_topics = min(MAX_FAST_TOPICS, max(2, n_sentences // SENTENCES_PER_FAST_TOPIC))
+    return max(1, min(n_topics, n_sentences))
+
+
+def _check_engine(engine):
+    if engine not in TOPIC_ENGINES:
+        raise ValueError(f"Unknown topic engine '{engine}' (expected one of {', '.join(TOPIC_ENGINES)}).")
+
+
+def reduction_model(engine, n_sentences, n_neighbors=UMAP_N_NEIGHBORS, n_components=UMAP_N_COMPONENTS, seed=None):
+    """
+    Unfitted dimensionality reduction of 'engine'. A 'seed' makes UMAP
+    reproducible (but single-threaded).
+    """
+    _check_engine(engine)
+    if engine == 'umap-hdbscan':
+        from umap import UMAP
+        return UMAP(n_neighbors=n_neighbors, n_components=n_components, min_dist=0.0, metric='cosine',
+                    low_memory=False, random_state=seed)
+
+    from sklearn.decomposition import PCA
+    return PCA(n_components=min(FAST_COMPONENTS, n_sentences), random_state=seed)
+
+
+def clustering_model(engine, n_sentences, min_topic_size, n_topics=None, seed=42):
+    """
+    Unfitted clustering model of 'engine'.
+    """
+    _check_engine(engine)
+    if engine == 'umap-hdbscan':
+        from hdbscan import HDBSCAN
+        return HDBSCAN(min_cluster_size=min_topic_size, metric='euclidean', cluster_selection_method='eom',
+                       prediction_data=True)
+
+    from sklearn.cluster import MiniBatchKMeans
+    return MiniBatchKMeans(n_clusters=fast_topic_count(n_sentences, n_topics), batch_size=4096, n_init=3,
+                           random_state=seed)
+
+
+def engine_models(engine, n_sentences, min_topic_size, n_topics=None, n_neighbors=UMAP_N_NEIGHBORS,
+                  n_components=UMAP_N_COMPONENTS):
+    """
+    Returns the BERTopic keyword arguments that select 'engine' for a fit on
+    'n_sentences' sentences.
+    """
+    return {
+        'umap_model': reduction_model(engine, n_sentences, n_neighbors, n_components),
+        'hdbscan_model': clustering_model(engine, n_sentences, min_topic_size, n_topics),
+    }
+
+
+def engine_stage_names(engine):
+    """
+    (reduction, clustering) names used for the engine's metrics sub-stages.
+    """
+    return ('umap', 'hdbscan') if engine == 'umap-hdbscan' else ('pca', 'kmeans')
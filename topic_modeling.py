@@ -0,0 +1,154 @@
+"""
+Topic model helpers for step 2: persisting the fitted BERTopic model between
+runs and folding newly added sentences into it without a full refit.
+
+State on disk ('topic_model_state' by default):
+    model/              BERTopic model saved with safetensors (no pickle)
+    assignments.npz     sentence keys (see embeddings.sentence_key) and their topics
+    state.json          fit parameters and drift bookkeeping
+The sentence embeddings themselves live in the embedding cache.
+
+The safetensors format does not store the UMAP and HDBSCAN models. A loaded
+(or merged) model therefore cannot place new sentences in the fitted cluster
+space: BERTopic's transform() silently falls back to the cosine similarity
+between each embedding and the topic embeddings, without any minimum
+similarity. Code that assigns sentences to a loaded model calls
+assign_to_nearest_topics instead, which does the same comparison explicitly
+and applies a minimum similarity.
+"""
+import datetime
+import json
+import os
+
+import numpy as np
+
+TOPIC_STATE_DIR = 'topic_model_state'
+
+
+def save_topic_state(state_dir, topic_model, sentence_keys, topics, state):
+    """
+    Saves the fitted model, the sentence -> topic assignments and 'state'
+    (a JSON-serializable dict of fit parameters and drift counters).
+    """
+    os.makedirs(state_dir, exist_ok=True)
+    topic_model.save(os.path.join(state_dir, 'model'), serialization='safetensors',
+                     save_ctfidf=True, save_embedding_model=state['embedding_model'])
+    np.savez(os.path.join(state_dir, 'assignments.npz'),
+             keys=np.array(sentence_keys, dtype='S16'), topics=np.asarray(topics, dtype=np.int32))
+    state = dict(state, updated=datetime.datetime.now().isoformat(timespec='seconds'))
+    with open(os.path.join(state_dir, 'state.json'), 'w') as f:
+        json.dump(state, f, indent=2)
+
+
+def load_topic_state(state_dir, embedding_model):
+    """
+    Loads a saved topic state (without UMAP/HDBSCAN, see the module docstring).
+    Returns (topic_model, (keys, topics), state) with
+    the distinct saved sentence keys sorted (see known_topics_of), or None if there is
+    no complete state in 'state_dir'.
+    """
+    paths = [os.path.join(state_dir, name) for name in ('model', 'assignments.npz', 'state.json')]
+    if not all(os.path.exists(path) for path in paths):
+        return None
+
+    from bertopic import BERTopic
+
+    topic_model = BERTopic.load(paths[0], embedding_model=embedding_model)
+    assignments = np.load(paths[1])
+    keys, rows = np.unique(assignments['keys'], return_index=True)
+    known_topics = (keys, assignments['topics'][rows].astype(np.int64))
+    with open(paths[2], 'r') as f:
+        state = json.load(f)
+    return topic_model, known_topics, state
+
+
+def known_topics_of(known_topics, keys):
+    """
+    Looks up 'keys' (an S16 array) in the (sorted keys, topics) pair of
+    load_topic_state. Returns (topics, known): the saved topic of every key,
+    or -1, and whether the key was saved at all.
+    """
+    known_keys, saved_topics = known_topics
+    topics = np.full(len(keys), -1, dtype=np.int64)
+    if not len(known_keys):
+        return topics, np.zeros(len(keys), dtype=bool)
+    positions = np.minimum(np.searchsorted(known_keys, keys), len(known_keys) - 1)
+    known = known_keys[positions] == keys
+    topics[known] = saved_topics[positions[known]]
+    return topics, known
+
+
+def topic_info_records(topic_info):
+    """
+    Converts BERTopic's topic_info DataFrame into plain JSON-serializable
+    records (Topic, Count, Name, Representation, Representative_Docs).
+    """
+    records = []
+    for row in topic_info.to_dict('records'):
+        records.append({
+            'Topic': int(row['Topic']),
+            'Count': int(row['Count']),
+            'Name': str(row['Name']),
+            'Representation': [str(word) for word in row['Representation']],
+            'Representative_Docs': [str(doc) for doc in row.get('Representative_Docs') or []],
+        })
+    return records
+
+
+def assign_to_nearest_topics(topic_model, embeddings, min_similarity, return_similarity=False):
+    """
+    Assigns each embedding to the most similar existing topic by cosine
+    similarity to the topic embeddings. Sentences whose best match is below
+    'min_similarity' (or is the outlier topic) are returned as -1.
+    With 'return_similarity', returns (topics, similarity to the best match).
+    """
+    topic_ids = np.array(sorted(topic_model.get_topics().keys()))
+    topic_vectors = np.asarray(topic_model.topic_embeddings_, dtype=np.float32)
+    keep = topic_ids != -1
+    topic_ids, topic_vectors = topic_ids[keep], topic_vectors[keep]
+
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    topic_vectors = topic_vectors / (np.linalg.norm(topic_vectors, axis=1, keepdims=True) + 1e-12)
+    embeddings = embeddings / (np.linalg.norm(embeddings, axis=1, keepdims=True) + 1e-12)
+
+    similarity = embeddings @ topic_vectors.T
+    best = similarity.argmax(axis=1)
+    assigned = topic_ids[best]
+    best_similarity = similarity[np.arange(len(best)), best]
+    assigned[best_similarity < min_similarity] = -1
+    if return_similarity:
+        return assigned, best_similarity
+    return assigned
+
+
+def fold_in_new_sentences(topic_model, new_sentences, new_embeddings, min_similarity, merge_min_similarity,
+                          min_topic_size, build_topic_model):
+    """
+    Adds new sentences to a fitted model without refitting the existing topics.
+
+    1. Sentences at least 'min_similarity' similar to an existing topic are
+       assigned to it.
+    2. If enough sentences are left over, a small model is fitted on them alone
+       and merged in with BERTopic.merge_models, so genuinely new themes become
+       new topics. A leftover topic joins an existing one when their topic
+       embeddings are at least 'merge_min_similarity' similar. The leftovers
+       are then matched against the merged topics ('min_similarity' again).
+    'build_topic_model(n_sentences)' creates the unfitted model for the leftovers.
+    Returns (topic_model, new_topics, unmatched_count); 'unmatched_count' is the
+    number of sentences that did not fit any of the previously existing topics.
+    """
+    from bertopic import BERTopic
+
+    new_topics = assign_to_nearest_topics(topic_model, new_embeddings, min_similarity)
+    leftover = np.flatnonzero(new_topics == -1)
+    unmatched_count = len(leftover)
+
+    # UMAP needs a few more points than its neighbourhood size to fit at all
+    if len(leftover) >= 2 * min_topic_size:
+        leftover_model = build_topic_model(len(leftover))
+        leftover_model.fit([new_sentences[i] for i in leftover], embeddings=new_embeddings[leftover])
+        topic_model = BERTopic.merge_models([topic_model, leftover_model], min_similarity=merge_min_similarity,
+                                           embedding_model=topic_model.embedding_model)
+        new_topics[leftover] = assign_to_nearest_topics(topic_model, new_embeddings[leftover], min_similarity)
+
+    return topic_model, new_topics, unmatched_count
@@ -0,0 +1,88 @@
+"""
+Built-in quality metrics of a step 2 topic model, so that runs with different
+engines or settings can be compared on the same corpus:
+
+  - coherence_npmi: mean normalized pointwise mutual information of each
+    topic's keyword pairs, from their co-occurrence in sentences
+    (-1 = never together, 0 = independent, 1 = always together).
+  - diversity:      share of unique words among all topics' keywords
+    (1 = no keyword is shared between topics).
+  - outlier_ratio:  share of sentences not assigned to any topic.
+Coherence is measured on a random sample of sentences, read in batches.
+"""
+import numpy as np
+
+# Keywords per topic that are scored
+QUALITY_TOP_N = 10
+# Sentences scanned for keyword co-occurrence
+QUALITY_SAMPLE_SIZE = 50000
+
+
+def npmi_coherence(sentences, topic_keywords, sample_size=QUALITY_SAMPLE_SIZE, batch_size=10000, seed=42):
+    """
+    Returns {topic: mean NPMI of its keyword pairs} for 'topic_keywords'
+    ({topic: [keywords]}), from sentence-level co-occurrence over a sample of
+    'sentences'. Topics with fewer than two keywords are left out.
+    """
+    from scipy import sparse
+    from sklearn.feature_extraction.text import CountVectorizer
+
+    vocabulary = sorted({word for words in topic_keywords.values() for word in words})
+    if not vocabulary:
+        return {}
+    longest_ngram = max(len(word.split()) for word in vocabulary)
+    vectorizer = CountVectorizer(vocabulary=vocabulary, ngram_range=(1, longest_ngram), binary=True)
+
+    rows = np.arange(len(sentences))
+    if len(rows) > sample_size:
+        rows = np.sort(np.random.default_rng(seed).choice(len(rows), sample_size, replace=False))
+    together = None
+    for start in range(0, len(rows), batch_size):
+        present = vectorizer.transform(sentences.texts(rows[start:start + batch_size])).astype(np.int64)
+        batch_together = present.T @ present
+        together = batch_together if together is None else together + batch_together
+    together = sparse.csr_matrix(together).toarray().astype(np.float64)
+
+    n = float(len(rows))
+    p_word = np.diag(together) / n
+    column_of = {word: column for column, word in enumerate(vocabulary)}
+    scores = {}
+    for topic, words in topic_keywords.items():
+        columns = [column_of[word] for word in words]
+        if len(columns) < 2:
+            continue
+        i, j = np.triu_indices(len(columns), k=1)
+        a, b = np.asarray(columns)[i], np.asarray(columns)[j]
+        p_pair = together[a, b] / n
+        with np.errstate(divide='ignore', invalid='ignore'):
+            npmi = np.log(p_pair / (p_word[a] * p_word[b])) / -np.log(p_pair)
+        # Pairs that never occur together score -1; a pair in every sentence scores 1
+        npmi = np.where(p_pair == 0, -1.0, np.where(p_pair == 1, 1.0, npmi))
+        scores[topic] = float(npmi.mean())
+    return scores
+
+
+def topic_diversity(topic_keywords):
+    """
+    Unique keywords / all keywords across topics.
+    """
+    words = [word for keywords in topic_keywords.values() for word in keywords]
+    return len(set(words)) / len(words) if words else 0.0
+
+
+def topic_quality(sentences, topic_info, topic_sizes, top_n=QUALITY_TOP_N, sample_size=QUALITY_SAMPLE_SIZE):
+    """
+    Computes the quality metrics of a fitted model from its topic_info records
+    and its per-topic sentence counts (index 0 = outliers, as in topic_stats).
+    """
+    topic_keywords = {row['Topic']: row['Representation'][:top_n] for row in topic_info if row['Topic'] != -1}
+    coherence = npmi_coherence(sentences, topic_keywords, sample_size)
+    total = float(np.sum(topic_sizes))
+    return {
+        'topics': len(topic_keywords),
+        'coherence_npmi': round(float(np.mean(list(coherence.values()))), 4) if coherence else None,
+        'diversity': round(topic_diversity(topic_keywords), 4),
+        'outlier_ratio': round(float(topic_sizes[0]) / total, 4) if total else None,
+        'sentences_scored': min(len(sentences), sample_size),
+        'per_topic_coherence': {str(topic): round(score, 4) for topic, score in coherence.items()},
+    }
@@ -0,0 +1,114 @@
+"""
+Paper x topic statistics for steps 2 and 3.
+
+Step 2 aggregates its per-sentence topic assignments into one sparse matrix:
+rows are source papers, columns are topics (column 0 holds the outliers,
+topic -1; column t + 1 holds topic t) and each entry is the number of
+sentences (multiplicity-weighted) of that paper in that topic. Everything the
+reports need per paper or per topic is derived from this matrix with
+vectorized SciPy/NumPy operations, so nothing has to walk the sentences again,
+and its size grows with papers x topics rather than with the corpus.
+"""
+import numpy as np
+
+# A paper counts as discussing a topic when at least this share of its sentences is in it
+PREVALENCE_MIN_SHARE = 0.05
+
+
+def document_topic_matrix(doc_ids, topics, weights=None, n_docs=None, n_topics=None):
+    """
+    Builds the papers x (1 + topics) CSR matrix from per-sentence paper ids,
+    topic ids (-1 for outliers) and optional sentence weights. 'n_docs' and
+    'n_topics' default to the largest ids present.
+    """
+    from scipy import sparse
+
+    doc_ids = np.asarray(doc_ids, dtype=np.int64)
+    columns = np.asarray(topics, dtype=np.int64) + 1
+    weights = np.ones(len(doc_ids), dtype=np.int64) if weights is None else np.asarray(weights, dtype=np.int64)
+    n_docs = int(doc_ids.max()) + 1 if n_docs is None else n_docs
+    n_columns = (int(columns.max()) if len(columns) else 0) + 1 if n_topics is None else n_topics + 1
+    # Duplicate (paper, topic) pairs are summed when converting to CSR
+    return sparse.coo_matrix((weights, (doc_ids, columns)), shape=(n_docs, n_columns)).tocsr()
+
+
+def topic_ids(matrix):
+    """
+    Topic id of every matrix column (-1, 0, 1, ...).
+    """
+    return np.arange(matrix.shape[1]) - 1
+
+
+def paper_topic_shares(matrix, include_outliers=False):
+    """
+    Row-normalized matrix: the share of each paper's sentences per topic.
+    Without outliers, shares are relative to the paper's non-outlier sentences
+    (and column 0 is all zeros).
+    """
+    from scipy import sparse
+
+    if not include_outliers:
+        matrix = matrix.copy()
+        matrix.data[matrix.indices == 0] = 0
+        matrix.eliminate_zeros()
+    totals = np.asarray(matrix.sum(axis=1)).ravel().astype(np.float64)
+    scale = np.divide(1.0, totals, out=np.zeros_like(totals), where=totals > 0)
+    return sparse.diags(scale) @ matrix
+
+
+def dominant_topics(matrix):
+    """
+    Each paper's main (non-outlier) topic and its share of the paper's
+    non-outlier sentences. Papers without any topic get (-1, 0.0).
+    """
+    shares = paper_topic_shares(matrix)
+    columns = np.asarray(shares.argmax(axis=1)).ravel()
+    best = np.asarray(shares.max(axis=1).todense()).ravel()
+    topics = np.where(best > 0, columns - 1, -1)
+    return topics, best
+
+
+def topic_prevalence(matrix, min_share=PREVALENCE_MIN_SHARE):
+    """
+    Per topic column: how many papers discuss it (share >= min_share, which
+    must be positive to keep the comparison sparse) and its mean share across
+    all papers.
+    """
+    shares = paper_topic_shares(matrix)
+    papers = np.asarray((shares >= min_share).sum(axis=0)).ravel()
+    mean_share = np.asarray(shares.mean(axis=0)).ravel()
+    return papers, mean_share
+
+
+def topic_cooccurrence(matrix, min_share=PREVALENCE_MIN_SHARE):
+    """
+    Topics x topics matrix (without outliers) of how many papers discuss both
+    topics; the diagonal is each topic's paper count.
+    """
+    present = (paper_topic_shares(matrix) >= min_share).astype(np.int32)[:, 1:]
+    return np.asarray((present.T @ present).todense())
+
+
+def top_cooccurring_pairs(cooccurrence, limit=10):
+    """
+    The topic pairs that share the most papers, as (topic_a, topic_b, papers).
+    """
+    upper = np.triu(cooccurrence, k=1)
+    flat = np.argsort(upper, axis=None)[::-1][:limit]
+    rows, cols = np.unravel_index(flat, upper.shape)
+    return [(int(a), int(b), int(upper[a, b])) for a, b in zip(rows, cols) if upper[a, b] > 0]
+
+
+def paper_breakdown(matrix, sources):
+    """
+    One record per paper for the report: sentences, topics discussed and the
+    dominant topic with its share.
+    """
+    totals = np.asarray(matrix.sum(axis=1)).ravel()
+    topics_discussed = np.asarray((paper_topic_shares(matrix) >= PREVALENCE_MIN_SHARE).sum(axis=1)).ravel()
+    dominant, share = dominant_topics(matrix)
+    return [
+        {'source': str(source), 'sentences': int(total), 'topics': int(n_topics),
+         'dominant_topic': int(topic), 'dominant_share': round(float(topic_share), 4)}
+        for source, total, n_topics, topic, topic_share in zip(sources, totals, topics_discussed, dominant, share)
+    ]
@@ -0,0 +1,153 @@
+"""
+Bounded vocabulary for the step 2 topic representations (c-TF-IDF keywords).
+
+BERTopic vectorizes one document per topic (all of its sentences joined), so
+a plain CountVectorizer with bigrams builds a dictionary of every distinct
+unigram and bigram in the corpus, and the analyzer materializes every n-gram
+of the largest topic at once, before any pruning applies. Two vectorizers are
+available (TOPIC_VECTORIZER in step 2; 'auto' hashes in large-corpus mode):
+
+  - 'count':   scikit-learn's CountVectorizer, as before, with the vocabulary
+               pruned to VOCAB_MAX_FEATURES terms by total frequency (and to
+               VOCAB_MIN_DF topics) after the fit.
+  - 'hashing': HashedTermVectorizer. Terms are hashed into a fixed space of
+               HASH_FEATURES buckets while counting, so the fit never holds
+               more than the bucket arrays, the sparse counts and one slice of
+               a document's n-grams; the kept buckets are then named after
+               the term that dominates them and pruned like the vocabulary
+               above. Its vocabulary_ is an ordinary term -> column dict, so a
+               saved model reloads as a plain CountVectorizer.
+
+Keywords stay comparable with the unpruned vocabulary: c-TF-IDF normalizes
+every topic row, so dropping rare terms rescales a row rather than
+reordering it, and top keywords are frequent terms by construction.
+
+This module imports scikit-learn, so step 2 only imports it once the topic
+libraries are loaded (see import_topic_libraries).
+"""
+from collections import Counter
+import zlib
+
+import numpy as np
+from sklearn.feature_extraction.text import CountVectorizer
+
+# Fits on fewer sentences than this keep every term (small fold-in fits would otherwise prune everything)
+MIN_PRUNED_FIT = 5000
+# Hashed term space: 2M buckets keep collisions rare among the terms that survive pruning
+HASH_FEATURES = 2 ** 21
+# Longer documents (whole topics) are analyzed in slices of about this many characters
+DOCUMENT_SLICE_CHARS = 1000000
+
+
+def make_vectorizer(kind, n_sentences, ngram_range, min_df, max_features):
+    """
+    The vectorizer for a topic model fitted on 'n_sentences' sentences:
+    'count' or 'hashing', keeping terms in at least 'min_df' topics and at
+    most 'max_features' terms (0 = no limit).
+    """
+    if n_sentences < MIN_PRUNED_FIT:
+        min_df = 1
+    vectorizer = HashedTermVectorizer if kind == 'hashing' else CountVectorizer
+    return vectorizer(stop_words="english", ngram_range=ngram_range, min_df=min_df,
+                      max_features=max_features or None, dtype=np.int32)
+
+
+def _slices(document, size=DOCUMENT_SLICE_CHARS):
+    """
+    Splits a long document at whitespace into pieces of about 'size' characters.
+    """
+    start = 0
+    while len(document) - start > size:
+        end = document.find(' ', start + size)
+        if end < 0:
+            break
+        yield document[start:end]
+        start = end + 1
+    yield document[start:]
+
+
+class HashedTermVectorizer(CountVectorizer):
+    """
+    CountVectorizer with a hashed, bounded fit (see the module docstring).
+    Takes CountVectorizer's parameters; min_df, max_df and max_features prune
+    the hashed buckets.
+    """
+
+    def _hashed_rows(self, raw_documents, candidates=None, votes=None):
+        """
+        CSR matrix of bucket counts (documents x HASH_FEATURES). With
+        'candidates'/'votes', also runs a weighted majority vote per bucket
+        for the term that names it.
+        """
+        from scipy import sparse
+
+        if isinstance(raw_documents, str):
+            raise ValueError("Iterable over raw text documents expected, string object received.")
+        analyzer = self.build_analyzer()
+        indptr, indices, data = [0], [], []
+        for document in raw_documents:
+            # A whole topic is summed into a dense bucket array; a sentence into a small dict
+            row = np.zeros(HASH_FEATURES, dtype=np.int64) if len(document) > DOCUMENT_SLICE_CHARS else Counter()
+            for piece in _slices(document):
+                terms = Counter(analyzer(piece))
+                buckets = [zlib.crc32(term.encode('utf-8')) % HASH_FEATURES for term in terms]
+                if candidates is not None:
+                    for term, count, bucket in zip(terms, terms.values(), buckets):
+                        held = votes[bucket]
+                        if candidates[bucket] == term:
+                            votes[bucket] = held + count
+                        elif held > count:
+                            votes[bucket] = held - count
+                        else:
+                            candidates[bucket], votes[bucket] = term, count - held
+                if isinstance(row, Counter):
+                    for bucket, count in zip(buckets, terms.values()):
+                        row[bucket] += count
+                else:
+                    np.add.at(row, np.asarray(buckets, dtype=np.int64), np.fromiter(terms.values(), dtype=np.int64))
+            if isinstance(row, Counter):
+                indices.append(np.fromiter(row.keys(), dtype=np.int32, count=len(row)))
+                data.append(np.fromiter(row.values(), dtype=self.dtype, count=len(row)))
+            else:
+                indices.append(np.flatnonzero(row).astype(np.int32))
+                data.append(row[indices[-1]].astype(self.dtype))
+            indptr.append(indptr[-1] + len(indices[-1]))
+        matrix = sparse.csr_matrix((np.concatenate(data or [np.zeros(0, dtype=self.dtype)]),
+                                    np.concatenate(indices or [np.zeros(0, dtype=np.int32)]),
+                                    np.asarray(indptr, dtype=np.int64)), shape=(len(indptr) - 1, HASH_FEATURES))
+        matrix.sort_indices()
+        return matrix
+
+    def fit(self, raw_documents, y=None):
+        self.fit_transform(raw_documents)
+        return self
+
+    def fit_transform(self, raw_documents, y=None):
+        candidates = [None] * HASH_FEATURES
+        votes = [0] * HASH_FEATURES
+        counts = self._hashed_rows(raw_documents, candidates, votes)
+        n_documents = counts.shape[0]
+
+        document_frequency = np.bincount(counts.indices, minlength=HASH_FEATURES)
+        min_df = self.min_df if isinstance(self.min_df, int) else self.min_df * n_documents
+        max_df = self.max_df if isinstance(self.max_df, int) else self.max_df * n_documents
+        keep = (document_frequency >= max(min_df, 1)) & (document_frequency <= max_df)
+        if self.max_features and keep.sum() > self.max_features:
+            frequency = np.asarray(counts.sum(axis=0)).ravel()
+            kept = np.flatnonzero(keep)
+            keep[:] = False
+            keep[kept[np.argsort(-frequency[kept], kind='stable')[:self.max_features]]] = True
+        buckets = np.flatnonzero(keep)
+        if not len(buckets):
+            raise ValueError("After pruning, no terms remain. Try a lower min_df or a higher max_df.")
+
+        # Columns in term order, as CountVectorizer's
+        names = [candidates[bucket] for bucket in buckets]
+        order = sorted(range(len(buckets)), key=names.__getitem__)
+        self.buckets_ = buckets[order]
+        self.vocabulary_ = {names[i]: column for column, i in enumerate(order)}
+        return counts[:, self.buckets_].tocsr()
+
+    def transform(self, raw_documents):
+        self._check_vocabulary()
+        return self._hashed_rows(raw_documents)[:, self.buckets_].tocsr()